@@ -0,0 +1,303 @@
+"""
+asyncio version of the CCW client, built on aiohttp.
+
+AsyncCCW offers the same API methods as CCW (as coroutines) and returns the same
+Order/Estimate objects. All HTTP requests of one instance share a bounded
+semaphore, so any number of lookups can be scheduled at once (e.g. with
+asyncio.gather) while at most `concurrency` requests hit the Cisco API at a time.
+
+    async with AsyncCCW(**get_params(), concurrency=10) as ccw:
+        orders = await asyncio.gather(*[ccw.get_order_status(so) for so in sales_orders])
+"""
+import asyncio
+import sys
+
+import aiohttp
+
+from CCW import CCWBase
+from Session import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from utils import json_loads
+
+
+class AsyncCCW(CCWBase):
+    """
+    Implements the CCW API methods as coroutines.
+
+    concurrency limits the number of requests in flight, limit_per_host the
+    number of pooled connections per host. The object must be opened (and thereby
+    authenticated) before use, either with `await ccw.open()` or by using it
+    as async context manager.
+
+    With pipelined=True (default), get_order_status() retrieves the order and its
+    serial numbers at the same time. See CCWBase for the token, cache and rate
+    limiter arguments.
+    """
+    def __init__(self, cco_username, cco_password, ccw_clientid, ccw_clientsecret, base_url=None,
+                 concurrency=10, limit_per_host=None,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 pipelined=True, **kwargs):
+        super().__init__(cco_username, cco_password, ccw_clientid, ccw_clientsecret, base_url=base_url, **kwargs)
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+        self.concurrency = concurrency
+        self.limit_per_host = limit_per_host or concurrency
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.pipelined = pipelined
+        self.session = None
+        self._semaphore = None
+
+    async def open(self):
+        """
+        Create the connection pool and retrieve a token
+        """
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.limit_per_host)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        # a still valid token might have been loaded from the token cache
+        if not self.tokens.valid and not await self.get_token():
+            raise Exception(
+                'Cannot authenticate to CCW, incorrect credentials?')
+        return self
+
+    async def close(self):
+        """
+        Close all pooled connections
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _send_once(self, method, url, received=None, **kwargs):
+        """
+        Send a single request (limited by the concurrency semaphore), return the response
+        with its body already read. The body size is appended to the list received, if given
+        (the response can't be read again once it is released)
+        """
+        async with self._semaphore:
+            async with self.session.request(method, url, **kwargs) as response:
+                body = await response.read()
+                if received is not None:
+                    received.append(len(body))
+                return response
+
+    async def _send(self, method, url, **kwargs):
+        """
+        Send a request, through the rate limiter if one is set
+        """
+        if not self.metrics.enabled:
+            if self.rate_limiter is None:
+                return await self._send_once(method, url, **kwargs)
+            return await self.rate_limiter.acall(self._send_once, method, url, **kwargs)
+
+        attempts = []
+        received = []
+
+        async def send(*send_args, **send_kwargs):
+            attempts.append(1)
+            return await self._send_once(*send_args, received=received, **send_kwargs)
+
+        endpoint = self._endpoint(url)
+        with self.metrics.span('http.' + endpoint):
+            if self.rate_limiter is None:
+                response = await send(method, url, **kwargs)
+            else:
+                response = await self.rate_limiter.acall(send, method, url, **kwargs)
+        self._count_request(endpoint, kwargs.get('data'), received[-1], len(attempts))
+        return response
+
+    async def _request(self, method, url, authenticate=True, headers=None, **kwargs):
+        """
+        Send a request and return the response body as text. Unless authenticate is False,
+        a valid token is added (refreshed if it is about to expire), and the request is
+        retried once with a new token if the API rejects the token with 401.
+        Raises aiohttp.ClientResponseError if the request was not successful
+        """
+        if authenticate:
+            headers = dict(headers or {})
+            token = await self.tokens.aget(self._fetch_token)
+            headers['Authorization'] = 'Bearer ' + token
+            response = await self._send(method, url, headers=headers, **kwargs)
+            if response.status == 401:
+                self.metrics.add('retries.401')
+                self.tokens.invalidate(token)
+                headers['Authorization'] = 'Bearer ' + await self.tokens.aget(self._fetch_token)
+                response = await self._send(method, url, headers=headers, **kwargs)
+        else:
+            response = await self._send(method, url, headers=headers, **kwargs)
+
+        text = await response.text()
+        if response.status >= 400:
+            print(text, file=sys.stderr)
+            response.raise_for_status()
+        return text
+
+    async def _fetch_token(self):
+        """
+        Run the SSO password grant, return the decoded response
+        """
+        headers, payload = self._token_request()
+        self.metrics.add('token_refreshes')
+        return json_loads(await self._request("POST", self.sso_url, authenticate=False, headers=headers, data=payload))
+
+    async def get_token(self):
+        """
+        Retrieve a (new) token and store within the object
+        """
+        await self.tokens.arefresh(self._fetch_token)
+        return self.token is not None
+
+    async def _coalesced(self, key, func, *args, **kwargs):
+        """
+        Return await func(*args, **kwargs), sharing the result with concurrent calls with the same key
+        """
+        if self.single_flight is None:
+            return await func(*args, **kwargs)
+        result, shared = await self.single_flight.ado(key, func, *args, **kwargs)
+        if shared:
+            self.metrics.add('coalesced')
+        return result
+
+    async def send_hello(self):
+        url = self.base_url + 'hello'
+        await self._request("GET", url)
+        return True
+
+    async def get_order_status(self, sales_order, toplevel_only=True, add_serials=True, pipelined=None):
+        """
+        Retrieve the order details and (if set) the serial numbers
+        By default, only the toplevel line items (1.0, 2.0, etc.) are returned
+
+        In pipelined mode (default, see constructor) the serial numbers are requested
+        concurrently with the order itself.
+        """
+        return await self._coalesced(('order', str(sales_order), toplevel_only, add_serials),
+                                     self._get_order_status, sales_order, toplevel_only, add_serials, pipelined)
+
+    async def _get_order_status(self, sales_order, toplevel_only, add_serials, pipelined):
+        if pipelined is None:
+            pipelined = self.pipelined
+
+        if not add_serials:
+            return await self._get_order(sales_order, toplevel_only)
+
+        if pipelined:
+            serials = asyncio.ensure_future(self.get_serials(sales_order))
+            try:
+                order = await self._get_order(sales_order, toplevel_only)
+            except BaseException:
+                serials.cancel()
+                raise
+        else:
+            order = await self._get_order(sales_order, toplevel_only)
+            serials = self.get_serials(sales_order)
+
+        # retrieve Serials
+        try:
+            serialdata = await serials
+            with self.metrics.span('add_serial_data'):
+                order.add_serial_data(serialdata)
+        except Exception as e:
+            order.serials_error = e
+            print('ERROR adding serial number information to order {}:\n{}'.format(
+                sales_order, str(e)
+            ), file=sys.stderr)
+        return order
+
+    async def _get_order(self, sales_order, toplevel_only):
+        """
+        Retrieve the order details and return Order object (without serials)
+        """
+        text = self._cached('order', sales_order)
+        if text is not None:
+            return self._parse_order(sales_order, text, toplevel_only, cached=True)
+
+        url, headers, query = self._order_status_request(sales_order)
+        text = await self._request("POST", url, headers=headers, data=query)
+
+        return self._parse_order(sales_order, text, toplevel_only)
+
+    async def _get_serial_page(self, sales_order, page):
+        """
+        Retrieve a single getSerialNumbers page, return decoded response
+        """
+        url, headers, query = self._serials_request(sales_order, page)
+        data = json_loads(await self._request("POST", url, headers=headers, data=query))
+        self.metrics.add('serial_pages')
+        return data
+
+    async def get_serials(self, sales_order):
+        """
+        Retrieve serials for a given sales order.
+        Return dict with line number as keys with serials and shipset number
+        """
+        text = self._cached('serials', sales_order)
+        if text is not None:
+            return json_loads(text)
+
+        results = await self._fetch_serials(sales_order)
+        if self.cache is not None:
+            self.cache.set_json('serials', sales_order, results)
+        return results
+
+    async def _fetch_serials(self, sales_order):
+        """
+        Retrieve all getSerialNumbers pages and merge them
+        """
+        # fetch the first page to learn the number of pages, then all remaining
+        # pages concurrently (bounded by the request semaphore) and merge them
+        # in page order
+        results = {}
+        total_pages = self._add_serial_page(await self._get_serial_page(sales_order, 1), results)
+        if total_pages > 1:
+            pages = await asyncio.gather(
+                *[self._get_serial_page(sales_order, page) for page in range(2, total_pages + 1)]
+            )
+            for page_data in pages:
+                self._add_serial_page(page_data, results)
+
+        return results
+
+    async def get_estimate(self, estimate_id, **kwargs):
+        """
+        Retrieve details for an Estimate/BOM, kwargs are passed to Estimate (e.g. keep_raw=True).
+        Return Estimate object
+        """
+        return await self._coalesced(('estimate', str(estimate_id), tuple(sorted(kwargs.items()))),
+                                     self._get_estimate, estimate_id, **kwargs)
+
+    async def _get_estimate(self, estimate_id, **kwargs):
+        text = self._cached('estimate', estimate_id)
+        if text is not None:
+            return self._parse_estimate(estimate_id, text, cached=True, **kwargs)
+
+        url, headers, query = self._estimate_request(estimate_id)
+        text = await self._request("POST", url, headers=headers, data=query)
+
+        # parse XML into our own Estimate object
+        return self._parse_estimate(estimate_id, text, **kwargs)
+
+    async def get_estimates(self, estimate_ids, **kwargs):
+        """
+        Retrieve several estimates concurrently (bounded by concurrency). Async generator
+        yielding (estimate_id, Estimate object or exception) as the lookups complete
+        """
+        async def get_estimate(estimate_id):
+            try:
+                return estimate_id, await self.get_estimate(estimate_id, **kwargs)
+            except Exception as e:
+                return estimate_id, e
+
+        tasks = [asyncio.ensure_future(get_estimate(e)) for e in dict.fromkeys(estimate_ids)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -1,9 +1,143 @@
+import copy
 import json
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
-import requests
 from Estimate import Estimate
 from Order import Order
+from Session import PooledSession, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from Metrics import NULL_METRICS
+from SingleFlight import SingleFlight
+from Token import TokenManager
+from utils import BytesTemplate, json_dumps, json_loads, json_value, xml_value
+
+
+# request bodies, encoded once. Only the sales order number, page number, timestamp
+# and estimate ID are substituted per request (see utils.BytesTemplate)
+ORDER_STATUS_QUERY = {
+    "GetPurchaseOrder": {
+        "value": {
+            "DataArea": {
+                "PurchaseOrder": [
+                    {
+                        "PurchaseOrderHeader": {
+                            "ID": {
+                                "value": ""
+                            },
+                            "DocumentReference": [
+                                {
+                                    "ID": {
+                                        "value": ""
+                                    }
+                                }
+                            ],
+                            "SalesOrderReference": [
+                                {
+                                    "ID": {
+                                        "value": "{sales_order}"
+                                    }
+                                }
+                            ],
+                            "Description": [
+                                {
+                                    "value": "Yes",
+                                    "typeCode": "details"
+                                }
+                            ]
+                        }
+                    }
+                ]
+            },
+            "ApplicationArea": {
+                "CreationDateTime": "datetime",
+                "BODID": {
+                    "value": "BoDID-test",
+                    "schemeVersionID": "V1"
+                }
+            }
+        }
+    }
+}
+ORDER_STATUS_TEMPLATE = BytesTemplate(json.dumps(ORDER_STATUS_QUERY), sales_order='"{sales_order}"')
+
+# checkOrderStatus request for several sales orders: one PurchaseOrder element per sales order
+PURCHASE_ORDER_TEMPLATE = BytesTemplate(
+    json.dumps(ORDER_STATUS_QUERY['GetPurchaseOrder']['value']['DataArea']['PurchaseOrder'][0]),
+    sales_order='"{sales_order}"'
+)
+_query = copy.deepcopy(ORDER_STATUS_QUERY)
+_query['GetPurchaseOrder']['value']['DataArea']['PurchaseOrder'] = '{purchase_orders}'
+ORDER_STATUSES_TEMPLATE = BytesTemplate(json.dumps(_query), purchase_orders='"{purchase_orders}"')
+del _query
+
+SERIALS_TEMPLATE = BytesTemplate(
+    json.dumps({"serialNumberRequest": {"salesOrderNumber": "{sales_order}", "pageNumber": "{page}"}}),
+    sales_order='"{sales_order}"', page='"{page}"'
+)
+
+ESTIMATE_REQUEST = '''<?xml version="1.0" encoding="UTF-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+    <s:Header>
+        <h:Messaging xmlns:h="http://docs.oasis-open.org/ebxml-msg/ebms/v3.0/ns/core/200704/"
+            xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+            xmlns="http://docs.oasis-open.org/ebxml-msg/ebms/v3.0/ns/core/200704/"
+            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+            <UserMessage>
+                <MessageInfo>
+                    <Timestamp>{timestamp}</Timestamp>
+                    <MessageId>urn:uuid:20180213131730@eB2BPSTestTool.cisco.com</MessageId>
+                </MessageInfo>
+                <PartyInfo>
+                    <From>
+                        <PartyId>XYZ</PartyId>
+                        <Role>http://example.org/roles/Buyer</Role>
+                    </From>
+                    <To>
+                        <PartyId>ESTlistEstimateService.cisco.com</PartyId>
+                        <Role>http://example.org/roles/Seller</Role>
+                    </To>
+                </PartyInfo>
+                <CollaborationInfo/>
+                <MessageProperties/>
+                <PayloadInfo>
+                    <PartInfo href="id:part@example.com">
+                        <Schema location="http://www.cisco.com/assets/wsx_xsd/QWS/root.xsd" version="2.0"/>
+                        <PartProperties>
+                            <Property name="Description">WS Test Tool by Partner Services</Property>
+                            <Property name="MimeType">application/xml</Property>
+                        </PartProperties>
+                    </PartInfo>
+                </PayloadInfo>
+            </UserMessage>
+        </h:Messaging>
+    </s:Header>
+    <s:Body>
+        <ProcessQuote releaseID="2014" versionID="1.0" systemEnvironmentCode="Production" languageCode="en-US"
+            xmlns="http://www.openapplications.org/oagis/10">
+            <ApplicationArea>
+                <Sender>
+                    <ComponentID schemeAgencyID="Cisco">B2B-3.0</ComponentID>
+                </Sender>
+                <CreationDateTime>2018-02-13</CreationDateTime>
+                <BODID schemeAgencyID="Cisco">urn:uuid:20180213131730@eB2BPSTestTool.cisco.com</BODID>
+                <Extension>
+                    <Code typeCode="Estimate">Estimate</Code>
+                </Extension>
+            </ApplicationArea>
+            <DataArea>
+                <Quote>
+                    <QuoteHeader>
+                        <ID typeCode="Estimate ID">{estimate_id}</ID>
+                        <Extension>
+                        </Extension>
+                    </QuoteHeader>
+                </Quote>
+            </DataArea>
+        </ProcessQuote>
+    </s:Body>
+</s:Envelope>'''
+ESTIMATE_TEMPLATE = BytesTemplate(ESTIMATE_REQUEST, timestamp='{timestamp}', estimate_id='{estimate_id}')
 
 
 def get_timestamp():
@@ -13,27 +147,45 @@ def get_timestamp():
     return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
 
 
-class CCW:
+class CCWBase(object):
     """
-    Implements basic CCW API methods.
+    Credentials, token, cache and request/response handling shared by CCW and AsyncCCW.
     """
     sso_url = 'https://cloudsso.cisco.com/as/token.oauth2'
-    token = None
 
-    def __init__(self, cco_username, cco_password, ccw_clientid, ccw_clientsecret, base_url=None):
+    def __init__(self, cco_username, cco_password, ccw_clientid, ccw_clientsecret, base_url=None,
+                 token_cache=None, refresh_margin=60, cache=None, rate_limiter=None, sso_url=None,
+                 keep_response=True, metrics=None, coalesce=False, lazy_orders=False):
         self.cco_username = cco_username
         self.cco_password = cco_password
         self.ccw_clientid = ccw_clientid
         self.ccw_clientsecret = ccw_clientsecret
         self.base_url = base_url or 'https://api.cisco.com/'
-
-        if not self.get_token():
-            raise Exception(
-                'Cannot authenticate to CCW, incorrect credentials?')
-
-    def get_token(self):
+        self.sso_url = sso_url or self.sso_url
+        self.tokens = TokenManager(
+            refresh_margin=refresh_margin, cache_file=token_cache,
+            cache_id='{} {} {}'.format(self.sso_url, self.ccw_clientid, self.cco_username)
+        )
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.keep_response = keep_response
+        self.lazy_orders = lazy_orders
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        if coalesce is True:
+            coalesce = SingleFlight()
+        self.single_flight = coalesce or None
+
+    @property
+    def token(self):
+        return self.tokens.token
+
+    @token.setter
+    def token(self, token):
+        self.tokens.set_token(token)
+
+    def _token_request(self):
         """
-        Retrieve a (new) token and store within the object
+        Return headers and payload for the SSO password grant
         """
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded',
@@ -42,257 +194,526 @@ class CCW:
         payload = 'client_id={}&client_secret={}&grant_type=password&username={}&password={}'.format(
             self.ccw_clientid, self.ccw_clientsecret, self.cco_username, self.cco_password
         )
+        return headers, payload
+
+    @staticmethod
+    def _headers(content_type='application/json'):
+        # the Authorization header is added when the request is sent
+        return {
+            'Content-Type': content_type,
+            'Accept': content_type,
+        }
 
-        response = requests.request(
-            "POST", self.sso_url, headers=headers, data=payload)
-        if response.ok:
-            self.token = response.json()['access_token']
+    def _order_status_request(self, sales_order):
+        """
+        Return url, headers and body of the checkOrderStatus request for a sales order
+        """
+        body = ORDER_STATUS_TEMPLATE.render(sales_order=json_value(sales_order))
+        return self._order_status_url(), self._headers(), body
+
+    def _order_statuses_request(self, sales_orders):
+        """
+        Return url, headers and body of one checkOrderStatus request for several sales orders
+        """
+        purchase_orders = b','.join(PURCHASE_ORDER_TEMPLATE.render(sales_order=json_value(so)) for so in sales_orders)
+        body = ORDER_STATUSES_TEMPLATE.render(purchase_orders=b'[' + purchase_orders + b']')
+        return self._order_status_url(), self._headers(), body
+
+    def _order_status_url(self):
+        # API documentation https://www.cisco.com/E-Learning/gbo-ccw/cdc_bulk/Cisco_Commerce_B2B_Implementation_Guides/Notifications/Order_Status_API/Order_Status_API_IG.pdf
+
+        if 'api-test' in self.base_url:
+            return self.base_url + 'commerce/ORDER/POE/v2/sync/checkOrderStatus'
         else:
+            return self.base_url + 'commerce/ORDER/v2/sync/checkOrderStatus'
+
+    def _serials_request(self, sales_order, page):
+        """
+        Return url, headers and body of the getSerialNumbers request for one page of a sales order
+        """
+        # API DOcumentation at https://www.cisco.com/E-Learning/gbo-ccw/cdc_bulk/Cisco_Commerce_B2B_Implementation_Guides/Notifications/Get_SerialNumber_API/Get_Serial_Number_Details_API_IG.pdf
+        url = self.base_url + 'commerce/ORDER/sync/getSerialNumbers'
+
+        body = SERIALS_TEMPLATE.render(sales_order=json_value(sales_order), page=str(int(page)))
+        return url, self._headers(), body
+
+    @staticmethod
+    def _add_serial_page(data, results):
+        """
+        Merge one getSerialNumbers response page into results (dict keyed by line number).
+        Return the total number of pages reported by the API
+        """
+        if data['serialNumberResponse']['responseHeader']['result'] != 'SUCCESS':
+            raise Exception(data['serialNumberResponse']['responseHeader']['errorCode'] +
+                            ':' + data['serialNumberResponse']['responseHeader']['message'])
+
+        # extract serials
+        for line in data['serialNumberResponse']['serialDetails']['lines']:
+            if line['lineNumber'] not in results:
+                results[line['lineNumber']] = {
+                    'serials': line['serialNumbers'],
+                    'shipset': line.get('shipSetNumber'),
+                    'sku': line['partNumber'],
+                    'quantity': line['quantity'],
+                }
+            else:
+                results[line['lineNumber']]['serials'] += line['serialNumbers']
+
+        return int(data['serialNumberResponse']['responseHeader']['totalPages'])
+
+    @staticmethod
+    def _endpoint(url):
+        # name of the API endpoint for metrics, i.e. the last element of the url path
+        return url.rstrip('/').rsplit('/', 1)[-1]
+
+    def _count_request(self, endpoint, data, received, attempts):
+        """
+        Update the request counters after a request (attempts > 1 if it was retried)
+        """
+        metrics = self.metrics
+        metrics.add('requests')
+        metrics.add('requests.' + endpoint)
+        if attempts > 1:
+            metrics.add('retries', attempts - 1)
+        metrics.add('bytes_sent', len(data) if data else 0)
+        metrics.add('bytes_received', received)
+
+    def _coalesced(self, key, func, *args, **kwargs):
+        """
+        Return func(*args, **kwargs), sharing the result with concurrent calls with the same key
+        """
+        if self.single_flight is None:
+            return func(*args, **kwargs)
+        result, shared = self.single_flight.do(key, func, *args, **kwargs)
+        if shared:
+            self.metrics.add('coalesced')
+        return result
+
+    def _cached(self, endpoint, id):
+        """
+        Return cached response text for endpoint/id, None if not cached (or caching is disabled)
+        """
+        if self.cache is None:
+            return None
+        return self.cache.get(endpoint, id)
+
+    def _parse_order(self, sales_order, text, toplevel_only, cached=False):
+        """
+        Parse checkOrderStatus response text into an Order object and cache the response,
+        using a longer TTL for closed orders
+        """
+        with self.metrics.span('parse.order'):
+            order = Order(checkorder_response=json_loads(text), toplevel_only=toplevel_only, keep_response=self.keep_response,
+                          lazy=self.lazy_orders)
+        if self.cache is not None and not cached:
+            self.cache.set('order', sales_order, text, 'order_closed' if order.is_closed else 'order')
+        return order
+
+    @staticmethod
+    def _split_order_response(data):
+        """
+        Split a checkOrderStatus response for several sales orders into one response (with a
+        single PurchaseOrder element) per sales order. Return dict sales order -> response
+        """
+        value = data['ShowPurchaseOrder']['value']
+        responses = {}
+        for po in value['DataArea']['PurchaseOrder']:
+            sales_order = str(po['PurchaseOrderHeader']['SalesOrderReference'][0]['ID']['value'])
+            part = dict(value, DataArea=dict(value['DataArea'], PurchaseOrder=[po]))
+            responses[sales_order] = {'ShowPurchaseOrder': dict(data['ShowPurchaseOrder'], value=part)}
+        return responses
+
+    def _parse_orders(self, text, toplevel_only):
+        """
+        Parse checkOrderStatus response text for several sales orders, return dict sales order ->
+        Order object. The part of the response of each order is cached on its own
+        """
+        with self.metrics.span('parse.order'):
+            responses = self._split_order_response(json_loads(text))
+            orders = {
+                so: Order(checkorder_response=response, toplevel_only=toplevel_only, keep_response=self.keep_response,
+                          lazy=self.lazy_orders)
+                for so, response in responses.items()
+            }
+        if self.cache is not None:
+            for so, order in orders.items():
+                self.cache.set('order', so, json_dumps(responses[so]), 'order_closed' if order.is_closed else 'order')
+        return orders
+
+    def _parse_estimate(self, estimate_id, text, cached=False, **kwargs):
+        """
+        Parse acquireEstimate response text into an Estimate object (kwargs as for Estimate, e.g.
+        keep_raw) and cache the response (only if it could be parsed)
+        """
+        with self.metrics.span('parse.estimate'):
+            estimate = Estimate(text, estimate_id=estimate_id, **kwargs)
+        if self.cache is not None and not cached:
+            self.cache.set('estimate', estimate_id, text)
+        return estimate
+
+    def _estimate_request(self, estimate_id):
+        """
+        Return url, headers and SOAP body of the acquireEstimate request for an estimate
+        """
+        # API Documentation at https://www.cisco.com/E-Learning/gbo-ccw/cdc_bulk/Cisco_Commerce_B2B_Implementation_Guides/Estimate/Manage_Estimate_Web_Services/Manage_Estimate_Web_Services_IG.pdf
+        url = self.base_url + 'commerce/EST/v2/async/acquireEstimate'
+
+        body = ESTIMATE_TEMPLATE.render(timestamp=get_timestamp(), estimate_id=xml_value(estimate_id))
+        return url, self._headers('application/xml'), body
+
+
+class CCW(CCWBase):
+    """
+    Implements basic CCW API methods.
+    """
+    def __init__(self, cco_username, cco_password, ccw_clientid, ccw_clientsecret, base_url=None,
+                 session=None, pool_connections=4, pool_maxsize=10, pool_block=False,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 page_workers=4, pipelined=True, **kwargs):
+        super().__init__(cco_username, cco_password, ccw_clientid, ccw_clientsecret, base_url=base_url, **kwargs)
+        self.page_workers = page_workers
+        self.pipelined = pipelined
+        self.session = session or PooledSession(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block,
+            connect_timeout=connect_timeout, read_timeout=read_timeout
+        )
+
+        # a still valid token might have been loaded from the token cache
+        if not self.tokens.valid and not self.get_token():
+            raise Exception(
+                'Cannot authenticate to CCW, incorrect credentials?')
+
+    def _fetch_token(self):
+        """
+        Run the SSO password grant, return the decoded response
+        """
+        headers, payload = self._token_request()
+
+        self.metrics.add('token_refreshes')
+        response = self._request(
+            "POST", self.sso_url, authenticate=False, headers=headers, data=payload)
+        if not response.ok:
             response.raise_for_status()
+        return json_loads(response.content)
+
+    def get_token(self):
+        """
+        Retrieve a (new) token and store within the object
+        """
+        self.tokens.refresh(self._fetch_token)
         return self.token is not None
 
+    def _request(self, method, url, authenticate=True, headers=None, **kwargs):
+        """
+        Send a request through the pooled session. Unless authenticate is False, a valid
+        token is added (refreshed if it is about to expire), and the request is retried
+        once with a new token if the API rejects the token with 401.
+        """
+        if not authenticate:
+            return self._send(method, url, headers=headers, **kwargs)
+
+        headers = dict(headers or {})
+        token = self.tokens.get(self._fetch_token)
+        headers['Authorization'] = 'Bearer ' + token
+        response = self._send(method, url, headers=headers, **kwargs)
+        if response.status_code == 401:
+            self.metrics.add('retries.401')
+            self.tokens.invalidate(token)
+            headers['Authorization'] = 'Bearer ' + self.tokens.get(self._fetch_token)
+            response = self._send(method, url, headers=headers, **kwargs)
+        return response
+
+    def _send(self, method, url, **kwargs):
+        """
+        Send a single request, through the rate limiter if one is set
+        """
+        if not self.metrics.enabled:
+            if self.rate_limiter is None:
+                return self.session.request(method, url, **kwargs)
+            return self.rate_limiter.call(self.session.request, method, url, **kwargs)
+
+        attempts = []
+
+        def send(*send_args, **send_kwargs):
+            attempts.append(1)
+            return self.session.request(*send_args, **send_kwargs)
+
+        endpoint = self._endpoint(url)
+        with self.metrics.span('http.' + endpoint):
+            if self.rate_limiter is None:
+                response = send(method, url, **kwargs)
+            else:
+                response = self.rate_limiter.call(send, method, url, **kwargs)
+        self._count_request(endpoint, kwargs.get('data'), len(response.content), len(attempts))
+        return response
+
+    @property
+    def connection_stats(self):
+        """
+        Return dict with number of requests sent and connections created/reused by the pool
+        (only available with the default PooledSession)
+        """
+        stats = getattr(self.session, 'stats', None)
+        return stats.as_dict() if stats is not None else {}
+
+    def close(self):
+        """
+        Close all pooled connections
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     def send_hello(self):
         url = self.base_url + 'hello'
-        headers = {
-            'Authorization': 'Bearer ' + self.token,
-        }
 
-        response = requests.request("GET", url, headers=headers)
+        response = self._request("GET", url)
         if response.ok:
             return True
         else:
             response.raise_for_status()
 
-    def get_order_status(self, sales_order, toplevel_only=True, add_serials=True):
+    def get_order_status(self, sales_order, toplevel_only=True, add_serials=True, pipelined=None):
         """
         Retrieve the order details and (if set) the serial numbers
         By default, only the toplevel line items (1.0, 2.0, etc.) are returned
-        """
-        # API documentation https://www.cisco.com/E-Learning/gbo-ccw/cdc_bulk/Cisco_Commerce_B2B_Implementation_Guides/Notifications/Order_Status_API/Order_Status_API_IG.pdf
 
-        if 'api-test' in self.base_url:
-            url = self.base_url + 'commerce/ORDER/POE/v2/sync/checkOrderStatus'
+        In pipelined mode (default, see constructor) the serial numbers are requested
+        in a background thread while the order itself is retrieved, as the serial
+        lookup only needs the sales order number.
+        """
+        return self._coalesced(('order', str(sales_order), toplevel_only, add_serials),
+                               self._get_order_status, sales_order, toplevel_only, add_serials, pipelined)
+
+    def _get_order_status(self, sales_order, toplevel_only, add_serials, pipelined):
+        if pipelined is None:
+            pipelined = self.pipelined
+
+        if add_serials and pipelined:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                serials = executor.submit(self.get_serials, sales_order)
+                order = self._get_order(sales_order, toplevel_only)
+                self._add_serials(order, sales_order, serials.result)
         else:
-            url = self.base_url + 'commerce/ORDER/v2/sync/checkOrderStatus'
+            order = self._get_order(sales_order, toplevel_only)
+            # retrieve Serials
+            if add_serials:
+                self._add_serials(order, sales_order, lambda: self.get_serials(sales_order))
+        return order
 
-        headers = {
-            'Authorization': 'Bearer ' + self.token,
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-        }
+    def _get_order(self, sales_order, toplevel_only):
+        """
+        Retrieve the order details and return Order object (without serials)
+        """
+        text = self._cached('order', sales_order)
+        if text is not None:
+            return self._parse_order(sales_order, text, toplevel_only, cached=True)
 
-        query = {
-            "GetPurchaseOrder": {
-                "value": {
-                    "DataArea": {
-                        "PurchaseOrder": [
-                            {
-                                "PurchaseOrderHeader": {
-                                    "ID": {
-                                        "value": ""
-                                    },
-                                    "DocumentReference": [
-                                        {
-                                            "ID": {
-                                                "value": ""
-                                            }
-                                        }
-                                    ],
-                                    "SalesOrderReference": [
-                                        {
-                                            "ID": {
-                                                "value": str(sales_order)
-                                            }
-                                        }
-                                    ],
-                                    "Description": [
-                                        {
-                                            "value": "Yes",
-                                            "typeCode": "details"
-                                        }
-                                    ]
-                                }
-                            }
-                        ]
-                    },
-                    "ApplicationArea": {
-                        "CreationDateTime": "datetime",
-                        "BODID": {
-                            "value": "BoDID-test",
-                            "schemeVersionID": "V1"
-                        }
-                    }
-                }
-            }
-        }
+        url, headers, query = self._order_status_request(sales_order)
 
-        response = requests.request(
-            "POST", url, headers=headers, data=json.dumps(query))
+        response = self._request(
+            "POST", url, headers=headers, data=query)
         if not response.ok:
-            print(response.text)
+            print(response.text, file=sys.stderr)
             response.raise_for_status()
 
-        orderdata = response.json()
-
         # TODO: Verify success
 
-        order = Order(checkorder_response=orderdata, toplevel_only=toplevel_only)
-        # retrieve Serials
-        if add_serials:
+        return self._parse_order(sales_order, response.text, toplevel_only)
+
+    def get_order_statuses(self, sales_orders, toplevel_only=True, add_serials=True, batch_size=20, max_workers=4):
+        """
+        Retrieve several orders with one checkOrderStatus request per batch of batch_size
+        sales orders. Yield (sales order, Order object or exception) in the order given.
+        If a batch request fails (or a sales order is missing in its response), the orders
+        of the batch are retrieved one by one, so an error for one sales order does not
+        affect the others. The serial numbers are still retrieved per order, with at most
+        max_workers orders at a time (while the batch is retrieved, in pipelined mode).
+        """
+        sales_orders = [str(so) for so in dict.fromkeys(sales_orders)]
+        executor = ThreadPoolExecutor(max_workers=max(max_workers, 1)) if add_serials else None
+        serials = {}
+        try:
+            for i in range(0, len(sales_orders), max(batch_size, 1)):
+                batch = sales_orders[i:i + max(batch_size, 1)]
+                if add_serials and self.pipelined:
+                    serials = {so: executor.submit(self.get_serials, so) for so in batch}
+                results = self._get_order_batch(batch, toplevel_only)
+                if add_serials and not self.pipelined:
+                    serials = {so: executor.submit(self.get_serials, so) for so, order in results
+                               if not isinstance(order, Exception)}
+                for so, order in results:
+                    if add_serials and not isinstance(order, Exception):
+                        self._add_serials(order, so, serials[so].result)
+                    yield so, order
+        finally:
+            if executor is not None:
+                # don't retrieve the serials of the remaining orders if the caller stops early
+                for future in serials.values():
+                    future.cancel()
+                executor.shutdown(wait=True)
+
+    def _get_order_batch(self, sales_orders, toplevel_only):
+        """
+        Retrieve the orders of a batch (from the cache or with a single request), return list
+        of (sales order, Order object or exception)
+        """
+        orders = {}
+        for so in sales_orders:
+            text = self._cached('order', so)
+            if text is not None:
+                orders[so] = self._parse_order(so, text, toplevel_only, cached=True)
+        missing = [so for so in sales_orders if so not in orders]
+        if len(missing) > 1:
             try:
-                serialdata = self.get_serials(sales_order)
-                order.add_serial_data(serialdata)
+                orders.update(self._fetch_orders(missing, toplevel_only))
             except Exception as e:
-                print('ERROR adding serial number information to order {}:\n{}'.format(
-                    sales_order, str(e)
-                ))
-        return order
+                print('Error retrieving {} orders in one request, retrieving them one by one: {}'.format(
+                    len(missing), str(e)), file=sys.stderr)
+                self.metrics.add('batch_fallbacks')
+
+        results = []
+        for so in sales_orders:
+            order = orders.get(so)
+            if order is None:
+                try:
+                    order = self._get_order(so, toplevel_only)
+                except Exception as e:
+                    order = e
+            results.append((so, order))
+        return results
 
-    def get_serials(self, sales_order):
+    def _fetch_orders(self, sales_orders, toplevel_only):
+        """
+        Retrieve several orders with one request, return dict sales order -> Order object (without serials)
+        """
+        url, headers, query = self._order_statuses_request(sales_orders)
+
+        response = self._request(
+            "POST", url, headers=headers, data=query)
+        if not response.ok:
+            print(response.text, file=sys.stderr)
+            response.raise_for_status()
+
+        return self._parse_orders(response.text, toplevel_only)
+
+    def _add_serials(self, order, sales_order, get_serialdata):
+        """
+        Add serial data returned by get_serialdata() to the order, errors are reported but not raised
+        (the exception is kept as order.serials_error)
+        """
+        try:
+            serialdata = get_serialdata()
+            with self.metrics.span('add_serial_data'):
+                order.add_serial_data(serialdata)
+        except Exception as e:
+            order.serials_error = e
+            print('ERROR adding serial number information to order {}:\n{}'.format(
+                sales_order, str(e)
+            ), file=sys.stderr)
+
+    def _get_serial_page(self, sales_order, page):
+        """
+        Retrieve a single getSerialNumbers page, return decoded response
+        """
+        url, headers, query = self._serials_request(sales_order, page)
+        response = self._request(
+            "POST", url, headers=headers, data=query)
+        if not response.ok:
+            print(response.text, file=sys.stderr)
+            response.raise_for_status()
+        self.metrics.add('serial_pages')
+        return json_loads(response.content)
+
+    def get_serials(self, sales_order, page_workers=None):
         """
         Retrieve serials for a given sales order.
         Return dict with line number as keys with serials and shipset number
         """
-        # API DOcumentation at https://www.cisco.com/E-Learning/gbo-ccw/cdc_bulk/Cisco_Commerce_B2B_Implementation_Guides/Notifications/Get_SerialNumber_API/Get_Serial_Number_Details_API_IG.pdf
-        url = self.base_url + 'commerce/ORDER/sync/getSerialNumbers'
-        headers = {
-            'Authorization': 'Bearer ' + self.token,
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-        }
+        text = self._cached('serials', sales_order)
+        if text is not None:
+            return json_loads(text)
 
-        query = {
-            "serialNumberRequest":
-            {
-                "salesOrderNumber": str(sales_order),
-                "pageNumber": 1
-            }
-        }
+        results = self._fetch_serials(sales_order, page_workers)
+        if self.cache is not None:
+            self.cache.set_json('serials', sales_order, results)
+        return results
 
-        # response might be split across multiple pages, so keep track
-        # on current page and execute the request multiple times when
-        # needed
-        total_pages = None
-        current_page = 1
+    def _fetch_serials(self, sales_order, page_workers):
+        """
+        Retrieve all getSerialNumbers pages and merge them
+        """
+        # response might be split across multiple pages. The first page tells us
+        # how many there are, the remaining ones are then fetched in parallel
+        # (up to page_workers at a time) and merged in page order, so the
+        # result is the same as fetching them one after another
         results = {}
-        while True:
-            query['serialNumberRequest']['pageNumber'] = current_page
-            response = requests.request(
-                "POST", url, headers=headers, data=json.dumps(query))
-            if not response.ok:
-                print(response.text)
-                response.raise_for_status()
-
-            data = response.json()
-
-            if data['serialNumberResponse']['responseHeader']['result'] != 'SUCCESS':
-                raise Exception(data['serialNumberResponse']['responseHeader']['errorCode'] +
-                                ':' + data['serialNumberResponse']['responseHeader']['message'])
-
-            if total_pages is None:
-                total_pages = int(
-                    data['serialNumberResponse']['responseHeader']['totalPages'])
-            # extract serials
-            for l in data['serialNumberResponse']['serialDetails']['lines']:
-                # only collect toplevel serial
-
-                if l['lineNumber'] not in results:
-                    results[l['lineNumber']] = {
-                        'serials': l['serialNumbers'],
-                        'shipset': l.get('shipSetNumber'),
-                        'sku': l['partNumber'],
-                        'quantity': l['quantity'],
-                    }
-                else:
-                    results[l['lineNumber']]['serials'] += l['serialNumbers']
-
-            if current_page == total_pages:
-                break
-            current_page += 1
+        total_pages = self._add_serial_page(self._get_serial_page(sales_order, 1), results)
+        if total_pages <= 1:
+            return results
+
+        page_workers = page_workers or self.page_workers
+        pages = range(2, total_pages + 1)
+        if page_workers <= 1:
+            data = (self._get_serial_page(sales_order, page) for page in pages)
+            for page_data in data:
+                self._add_serial_page(page_data, results)
+        else:
+            with ThreadPoolExecutor(max_workers=min(page_workers, len(pages))) as executor:
+                for page_data in executor.map(lambda page: self._get_serial_page(sales_order, page), pages):
+                    self._add_serial_page(page_data, results)
 
         return results
 
     def get_estimate(self, estimate_id, **kwargs):
         """
-        Retrieve details for an Estimate/BOM.
+        Retrieve details for an Estimate/BOM, kwargs are passed to Estimate (e.g. keep_raw=True).
         Return Estimate object
         """
-        # API Documentation at https://www.cisco.com/E-Learning/gbo-ccw/cdc_bulk/Cisco_Commerce_B2B_Implementation_Guides/Estimate/Manage_Estimate_Web_Services/Manage_Estimate_Web_Services_IG.pdf
-        url = self.base_url + 'commerce/EST/v2/async/acquireEstimate'
-        headers = {
-            'Authorization': 'Bearer ' + self.token,
-            'Content-Type': 'application/xml',
-            'Accept': 'application/xml',
-        }
+        return self._coalesced(('estimate', str(estimate_id), tuple(sorted(kwargs.items()))),
+                               self._get_estimate, estimate_id, **kwargs)
 
-        query = f'''<?xml version="1.0" encoding="UTF-8"?>
-<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
-    <s:Header>
-        <h:Messaging xmlns:h="http://docs.oasis-open.org/ebxml-msg/ebms/v3.0/ns/core/200704/"
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema"
-            xmlns="http://docs.oasis-open.org/ebxml-msg/ebms/v3.0/ns/core/200704/"
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
-            <UserMessage>
-                <MessageInfo>
-                    <Timestamp>{get_timestamp()}</Timestamp>
-                    <MessageId>urn:uuid:20180213131730@eB2BPSTestTool.cisco.com</MessageId>
-                </MessageInfo>
-                <PartyInfo>
-                    <From>
-                        <PartyId>XYZ</PartyId>
-                        <Role>http://example.org/roles/Buyer</Role>
-                    </From>
-                    <To>
-                        <PartyId>ESTlistEstimateService.cisco.com</PartyId>
-                        <Role>http://example.org/roles/Seller</Role>
-                    </To>
-                </PartyInfo>
-                <CollaborationInfo/>
-                <MessageProperties/>
-                <PayloadInfo>
-                    <PartInfo href="id:part@example.com">
-                        <Schema location="http://www.cisco.com/assets/wsx_xsd/QWS/root.xsd" version="2.0"/>
-                        <PartProperties>
-                            <Property name="Description">WS Test Tool by Partner Services</Property>
-                            <Property name="MimeType">application/xml</Property>
-                        </PartProperties>
-                    </PartInfo>
-                </PayloadInfo>
-            </UserMessage>
-        </h:Messaging>
-    </s:Header>
-    <s:Body>
-        <ProcessQuote releaseID="2014" versionID="1.0" systemEnvironmentCode="Production" languageCode="en-US"
-            xmlns="http://www.openapplications.org/oagis/10">
-            <ApplicationArea>
-                <Sender>
-                    <ComponentID schemeAgencyID="Cisco">B2B-3.0</ComponentID>
-                </Sender>
-                <CreationDateTime>2018-02-13</CreationDateTime>
-                <BODID schemeAgencyID="Cisco">urn:uuid:20180213131730@eB2BPSTestTool.cisco.com</BODID>
-                <Extension>
-                    <Code typeCode="Estimate">Estimate</Code>
-                </Extension>
-            </ApplicationArea>
-            <DataArea>
-                <Quote>
-                    <QuoteHeader>
-                        <ID typeCode="Estimate ID">{estimate_id}</ID>
-                        <Extension>
-                        </Extension>
-                    </QuoteHeader>
-                </Quote>
-            </DataArea>
-        </ProcessQuote>
-    </s:Body>
-</s:Envelope>'''
+    def _get_estimate(self, estimate_id, **kwargs):
+        text = self._cached('estimate', estimate_id)
+        if text is not None:
+            return self._parse_estimate(estimate_id, text, cached=True, **kwargs)
 
-        response = requests.request(
+        url, headers, query = self._estimate_request(estimate_id)
+
+        response = self._request(
             "POST", url, headers=headers, data=query)
         if not response.ok:
-            print(response.text)
+            print(response.text, file=sys.stderr)
             response.raise_for_status()
             # NOTREACHED
 
         # parse XML into our own Estimate object
-        return Estimate(response.text, estimate_id=estimate_id)
+        return self._parse_estimate(estimate_id, response.text, **kwargs)
+
+    def get_estimates(self, estimate_ids, max_workers=8, **kwargs):
+        """
+        Retrieve several estimates concurrently (at most max_workers requests at a time).
+        Yield (estimate_id, Estimate object or exception) as the lookups complete, so an
+        EstimateError (or any other error) for one ID does not stop the others.
+        For requests to be sent over pooled connections, pool_maxsize should be at
+        least max_workers.
+        """
+        estimate_ids = list(dict.fromkeys(estimate_ids))
+        futures = {}
+        executor = ThreadPoolExecutor(max_workers=max(min(max_workers, len(estimate_ids)), 1))
+        try:
+            futures = {executor.submit(self.get_estimate, e, **kwargs): e for e in estimate_ids}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    yield futures[future], e
+        finally:
+            # don't start the remaining lookups if the caller stops early
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
@@ -0,0 +1,253 @@
+"""
+Response cache for the CCW clients: ResponseCache with a MemoryCache (LRU) or DiskCache backend.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils import json_dumps, json_loads
+
+
+# TTLs in seconds, 'order_closed' is used for orders with closed status
+DEFAULT_TTLS = {
+    'order': 15 * 60,
+    'order_closed': 24 * 60 * 60,
+    'serials': 60 * 60,
+    'estimate': 15 * 60,
+}
+
+
+class CacheStats(object):
+    '''
+    hit/miss/eviction counters per endpoint
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def count(self, endpoint, event):
+        with self._lock:
+            counters = self.counters.setdefault(endpoint, {'hits': 0, 'misses': 0})
+            counters[event] = counters.get(event, 0) + 1
+
+    def as_dict(self):
+        with self._lock:
+            result = {k: dict(v) for k, v in self.counters.items()}
+        total_hits = sum(v['hits'] for v in result.values())
+        total_misses = sum(v['misses'] for v in result.values())
+        result['total'] = {
+            'hits': total_hits,
+            'misses': total_misses,
+            'hit_ratio': total_hits / (total_hits + total_misses) if total_hits + total_misses else 0.0,
+        }
+        return result
+
+
+class MemoryCache(object):
+    '''
+    In-memory cache backend. Entries are evicted in least-recently-used order once
+    the total size of the stored values (UTF-8 encoded) exceeds max_bytes.
+    '''
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    @staticmethod
+    def _size(value):
+        # the number of characters is the number of bytes for ASCII text (the usual case)
+        return len(value) if value.isascii() else len(value.encode())
+
+    def set(self, key, value, ttl):
+        size = self._size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + ttl, value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self.size -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache(object):
+    '''
+    On-disk cache backend, storing one file per entry in directory. The file's
+    modification time is updated on every hit, entries with the oldest modification
+    time are evicted once the directory holds more than max_bytes.
+    '''
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self.size = sum(os.path.getsize(p) for p in self._files())
+
+    def _files(self):
+        return [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.cache')]
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.cache')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at = float(f.readline())
+                value = f.read()
+        except (OSError, ValueError):
+            return None
+        if expires_at < time.time():
+            self.delete(key)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value.decode()
+
+    def set(self, key, value, ttl):
+        data = '{}\n'.format(time.time() + ttl).encode() + value.encode()
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmpfile = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        with self._lock:
+            self._unlink(path)
+            with open(tmpfile, 'wb') as f:
+                f.write(data)
+            os.replace(tmpfile, path)
+            self.size += len(data)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            self._unlink(self._path(key))
+
+    def clear(self):
+        with self._lock:
+            for path in self._files():
+                self._unlink(path)
+            self.size = 0
+
+    def _unlink(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+            self.size -= size
+        except OSError:
+            pass
+
+    def _evict(self):
+        # other processes might share the directory, so re-check the actual size
+        files = []
+        for path in self._files():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        self.size = sum(f[1] for f in files)
+        for _, _, path in sorted(files):
+            if self.size <= self.max_bytes:
+                break
+            self._unlink(path)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._files())
+
+
+class ResponseCache(object):
+    '''
+    Cache for raw API responses, keyed by endpoint ('order', 'serials', 'estimate')
+    and ID. backend defaults to a MemoryCache, ttls updates DEFAULT_TTLS.
+    '''
+    def __init__(self, backend=None, ttls=None):
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self._stats = CacheStats()
+
+    @staticmethod
+    def _key(endpoint, id):
+        return '{}:{}'.format(endpoint, id)
+
+    def get(self, endpoint, id):
+        '''
+        Return cached response text or None
+        '''
+        value = self.backend.get(self._key(endpoint, id))
+        self._stats.count(endpoint, 'misses' if value is None else 'hits')
+        return value
+
+    def set(self, endpoint, id, value, ttl_name=None):
+        '''
+        Store response text, using the TTL configured for ttl_name (default: endpoint)
+        '''
+        ttl = self.ttls.get(ttl_name or endpoint, 0)
+        if ttl > 0:
+            self.backend.set(self._key(endpoint, id), value, ttl)
+
+    def get_json(self, endpoint, id):
+        value = self.get(endpoint, id)
+        return json_loads(value) if value is not None else None
+
+    def set_json(self, endpoint, id, data, ttl_name=None):
+        self.set(endpoint, id, json_dumps(data), ttl_name)
+
+    def invalidate(self, endpoint, id):
+        self.backend.delete(self._key(endpoint, id))
+
+    def clear(self):
+        self.backend.clear()
+
+    @property
+    def stats(self):
+        '''
+        Return dict with hits/misses per endpoint and in total, plus backend size and evictions
+        '''
+        result = self._stats.as_dict()
+        result['total'].update({
+            'entries': len(self.backend),
+            'bytes': self.backend.size,
+            'evictions': self.backend.evictions,
+        })
+        return result
@@ -1,9 +1,12 @@
 """
 class definition for CCW estimates
+
+xmltodict, lxml and natsort are only imported when the first estimate is parsed
 """
 
-import xmltodict
-from natsort import natsorted
+import io
+
+from LineItem import QuoteLine
 
 from typing import List
 
@@ -25,6 +28,38 @@ def find_attribute(itemlist, attribute):
         return None
 
 
+def find_element_attribute(elements, attribute):
+    '''
+    Same as find_attribute(), for a list of lxml elements
+    '''
+    for element in elements:
+        attr = element.get('typeCode') or element.get('name')
+        if attr == attribute:
+            return element.text
+    else:
+        return None
+
+
+def _local(path):
+    '''
+    convert a path like 'Item/ID' into a namespace agnostic lxml path ('{*}Item/{*}ID')
+    '''
+    return '/'.join('{*}' + p for p in path.split('/'))
+
+
+# element paths used when parsing a QuoteHeader/QuoteLine element
+HEADER_MESSAGE = _local('Message/Description')
+HEADER_ID = _local('ID')
+HEADER_STATUS = _local('Status/Reason')
+HEADER_VALUES = _local('Extension/ValueText')
+LINE_ITEM = _local('Item')
+LINE_ID = _local('LineNumberID')
+ITEM_ID = _local('ID')
+ITEM_DESCRIPTION = _local('Description')
+ITEM_QUANTITY = _local('Extension/Quantity')
+ITEM_PROPERTIES = _local('Specification/Property/NameValue')
+
+
 class EstimateError(Exception):
     pass
 
@@ -32,12 +67,40 @@ class EstimateError(Exception):
 class Estimate(object):
     '''
     Estimate object attributes:
-     <todo>
+    - estimate_id
+    - estimate_name
+    - status
+    - quotelines (dict of QuoteLine objects (see LineItem.py, these behave like dicts), key'ed by CCW line number)
+        sku
+        description
+        quantity
+        _lineid
+        lineitem
     '''
-    def __init__(self, xml_response, **kwargs):
+    def __init__(self, xml_response, keep_raw=False, **kwargs):
         """
         Set up a CCW Estimate object based on API data retrieved from CCW acquireEstimate API response (passed as XML string).
+
+        By default the response is parsed incrementally, each QuoteLine is discarded once its
+        attributes are extracted. With keep_raw=True, the whole response is converted into a
+        dictionary which is kept as _estimate_response.
         """
+        if keep_raw:
+            items = self._parse_tree(xml_response, kwargs.get('estimate_id'))
+        else:
+            self._estimate_response = None
+            items = self._parse_stream(xml_response, kwargs.get('estimate_id'))
+
+        # sort the dict by lineitem in natural order
+        from natsort import natsorted
+        self.quotelines = {k: items[k] for k in natsorted(items)}
+
+    def _parse_tree(self, xml_response, estimate_id):
+        """
+        parse the response via xmltodict, keeping the resulting dict. Return dict of line items
+        """
+        import xmltodict
+
         # comvert xml response to dictionary to make parsing easier...
         self._estimate_response = xmltodict.parse(xml_response, dict_constructor=dict)
         quote_dict = self._estimate_response['soapenv:Envelope']['soapenv:Body']['AcknowledgeQuote']['DataArea']['Quote']
@@ -49,7 +112,7 @@ class Estimate(object):
             # if the quote lookup was not successful, reason is found in descrption
             message = quote_dict['QuoteHeader']['Message']['Description']
             if message:
-                raise EstimateError(f"Error retrieving quote {kwargs.get('estimate_id')}:  {message}")
+                raise EstimateError(f"Error retrieving quote {estimate_id}:  {message}")
         except KeyError:
             pass
 
@@ -77,17 +140,80 @@ class Estimate(object):
             if not lineitem:
                 continue
 
-            item = {
-                'sku': v['Item']['ID']['#text'],
-                'description': v['Item'].get('Description', ''),
-                'quantity': int(v['Item']['Extension']['Quantity']['#text']),
-                '_lineid': v['LineNumberID'],
-                'lineitem': lineitem,
-            }
+            item = QuoteLine(
+                sku=v['Item']['ID']['#text'],
+                description=v['Item'].get('Description', ''),
+                quantity=int(v['Item']['Extension']['Quantity']['#text']),
+                _lineid=v['LineNumberID'],
+                lineitem=lineitem,
+            )
             items[lineitem] = item
+        return items
 
-        # sort the dict by lineitem in natural order
-        self.quotelines = {k: items[k] for k in natsorted(items)}
+    def _parse_header(self, header, estimate_id):
+        """
+        set estimate attributes from the QuoteHeader element
+        """
+        # if the quote lookup was not successful, reason is found in descrption
+        message = header.findtext(HEADER_MESSAGE)
+        if message:
+            raise EstimateError(f"Error retrieving quote {estimate_id}:  {message}")
+
+        self.estimate_id = header.findtext(HEADER_ID)
+        self.status = header.findtext(HEADER_STATUS)
+        values = header.findall(HEADER_VALUES)
+        self.estimate_name = find_element_attribute(values, 'Estimate Name') if values else None
+
+    @staticmethod
+    def _parse_line(line):
+        """
+        return QuoteLine for a QuoteLine element (None if it has no CCW line number)
+        """
+        item = line.find(LINE_ITEM)
+        if item is None:
+            return None
+        lineitem = find_element_attribute(item.iterfind(ITEM_PROPERTIES), 'CCWLineNumber')
+        if not lineitem:
+            return None
+
+        description = item.find(ITEM_DESCRIPTION)
+        return QuoteLine(
+            sku=item.findtext(ITEM_ID),
+            description=description.text if description is not None else '',
+            quantity=int(item.findtext(ITEM_QUANTITY)),
+            _lineid=line.findtext(LINE_ID),
+            lineitem=lineitem,
+        )
+
+    def _parse_stream(self, xml_response, estimate_id):
+        """
+        parse the response incrementally, return dict of line items
+        """
+        from lxml import etree
+
+        if isinstance(xml_response, str):
+            xml_response = xml_response.encode()
+
+        items = {}
+        header_found = False
+        for _, element in etree.iterparse(io.BytesIO(xml_response), events=('end',),
+                                          tag=('{*}QuoteHeader', '{*}QuoteLine')):
+            if etree.QName(element).localname == 'QuoteHeader':
+                self._parse_header(element, estimate_id)
+                header_found = True
+            else:
+                item = self._parse_line(element)
+                if item:
+                    items[item['lineitem']] = item
+
+            # free the memory of the processed element and its predecessors
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+        if not header_found:
+            raise EstimateError(f"Error retrieving quote {estimate_id}: unexpected response, no QuoteHeader found")
+        return items
 
     @property
     def get_quotelines(self) -> List:
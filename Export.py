@@ -0,0 +1,315 @@
+"""
+Columnar export of order details.
+
+Order.return_order_details() returns one dict per line item. For large reports
+the functions below build the same table column by column instead, one
+pandas DataFrame (or Arrow table) per batch of orders, and convert the date
+columns with a single vectorized pd.to_datetime() call per column.
+
+    for frame in iter_order_frames(orders, batch_size=500):
+        ...
+    table = order_details_table(orders)     # needs pyarrow
+
+The writers (CsvWriter, ExcelWriter, ParquetWriter) append the details of each
+order to a file as soon as it is available:
+
+    with CsvWriter('orders.csv') as writer:
+        for order in orders:
+            writer.write_orders([order])
+"""
+import sys
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from LineItem import OrderLine
+
+
+# columns taken from the order header: (column name, Order attribute)
+HEADER_COLUMNS = (
+    ('SO Number', 'salesorder'),
+    ('SO Name', 'ordername'),
+    ('SO Date', 'orderdate'),
+)
+
+# columns taken from the line items: (column name, line item key)
+LINE_COLUMNS = (
+    ('Quantity', 'quantity'),
+    ('Item Name', 'sku'),
+    ('Item Description', 'description'),
+    ('Line Status', 'status'),
+    ('Requested Delivery', 'requesteddelivery'),
+    ('Promised Delivery', 'promiseddelivery'),
+    ('Ship Date', 'shipdate'),
+    ('Shipset', 'shipset'),
+)
+
+# ship-to columns following the line item columns
+SHIPTO_COLUMNS = (
+    ('Ship-To Name', 'shiptoname'),
+    ('Ship-To Address', 'shiptoaddress'),
+    ('Ship-To Contact', 'shiptocontactname'),
+    ('Ship-To Contact Phone', 'shiptocontactphone'),
+    ('Ship-To Contact Email', 'shiptocontactemail'),
+)
+
+DATE_COLUMNS = ('SO Date', 'Requested Delivery', 'Promised Delivery', 'Ship Date')
+
+# line item keys with their own column, all other keys are appended as columns named like the key
+KNOWN_KEYS = frozenset([key for _, key in LINE_COLUMNS] + ['serials'])
+
+# all columns of the order details of parsed orders, in the order of order_details_columns()
+DETAIL_COLUMNS = (
+    [name for name, _ in HEADER_COLUMNS] + ['Line Number'] + [name for name, _ in LINE_COLUMNS] + ['Serial Numers'] +
+    [name for name, _ in SHIPTO_COLUMNS] + [key for key, _ in OrderLine._fields if key not in KNOWN_KEYS]
+)
+
+# format='ISO8601' (mixed ISO 8601 strings) is only known to pandas >= 2.0, older versions parse these by default
+_ISO8601 = {'format': 'ISO8601'} if int(pd.__version__.split('.')[0]) >= 2 else {}
+
+
+def convert_dates(values, dateformat='pandas'):
+    '''
+    Vectorized version of Order._convert_date() for a sequence of time strings (2021-09-14T06:11:16Z).
+    Returns a datetime64 Series for dateformat 'pandas' (NaT for empty/invalid values), an object
+    Series of datetime.datetime (None) for 'datetime' or of 14-Sep-2021 strings ('') for 'text'
+    '''
+    dateformat = dateformat.lower()
+    if dateformat not in ('text', 'datetime', 'pandas'):
+        raise ValueError('Unknown dateformat passed')
+
+    # dates repeat a lot (e.g. all lines of an order), so only the distinct values are converted.
+    # missing values get code -1, which picks the empty value appended at the end
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    strings = pd.Series(uniques, dtype=object).str.replace(r'Z$', '', regex=True)
+    dates = pd.to_datetime(strings, errors='coerce', **_ISO8601)
+    if dateformat == 'pandas':
+        converted = np.append(dates.to_numpy(), np.datetime64('NaT'))
+    elif dateformat == 'text':
+        converted = np.append(dates.dt.strftime('%d-%b-%Y').fillna('').to_numpy(dtype=object), '')
+    else:
+        converted = np.array([None if pd.isna(d) else d.to_pydatetime() for d in dates] + [None], dtype=object)
+    return pd.Series(converted[codes], index=getattr(values, 'index', None))
+
+
+def order_details_columns(orders):
+    '''
+    Return the order details of all orders (same content as Order.return_order_details(), dates
+    not converted) as dict of column name -> list of values
+    '''
+    columns = {name: [] for name, _ in HEADER_COLUMNS}
+    columns['Line Number'] = []
+    columns.update((name, []) for name, _ in LINE_COLUMNS)
+    columns['Serial Numers'] = []
+    columns.update((name, []) for name, _ in SHIPTO_COLUMNS)
+    extra = {}
+    rows = 0
+
+    for order in orders:
+        lines = list(order.lineitems.values())
+        count = len(lines)
+        for name, attr in HEADER_COLUMNS + SHIPTO_COLUMNS:
+            columns[name] += [getattr(order, attr)] * count
+        columns['Line Number'] += order.lineitems.keys()
+        for name, key in LINE_COLUMNS:
+            columns[name] += [v.get(key, '') for v in lines]
+        columns['Serial Numers'] += [' '.join(v.get('serials') or []) for v in lines]
+
+        # remaining keys in the order they appear, missing values are None
+        for i, v in enumerate(lines):
+            for key in v:
+                if key in KNOWN_KEYS:
+                    continue
+                values = extra.setdefault(key, [])
+                values += [None] * (rows + i - len(values))
+                values.append(v[key])
+        rows += count
+        for values in extra.values():
+            values += [None] * (rows - len(values))
+
+    columns.update(extra)
+    return columns
+
+
+def order_details_frame(orders, dateformat='pandas'):
+    '''
+    Return the order details of all orders as one DataFrame (columns as in Order.return_order_details())
+    '''
+    frame = pd.DataFrame(order_details_columns(orders))
+    for name in DATE_COLUMNS:
+        frame[name] = convert_dates(frame[name], dateformat=dateformat)
+    return frame
+
+
+def iter_order_frames(orders, batch_size=500, dateformat='pandas'):
+    '''
+    Yield one DataFrame per batch of batch_size orders, orders can be any iterable (e.g. a generator)
+    '''
+    orders = iter(orders)
+    while True:
+        batch = list(islice(orders, batch_size))
+        if not batch:
+            return
+        yield order_details_frame(batch, dateformat=dateformat)
+
+
+def order_details_table(orders):
+    '''
+    Return the order details of all orders as pyarrow Table (requires pyarrow)
+    '''
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError('pyarrow is required for Arrow tables, install it with pip install pyarrow') from None
+    return pa.Table.from_pandas(order_details_frame(orders), preserve_index=False)
+
+
+class FrameWriter(object):
+    '''
+    Base class of the streaming writers below: order details DataFrames (e.g. one per order)
+    are appended to the output file as they come in, so memory use does not grow with the
+    number of orders. The columns are DETAIL_COLUMNS plus other columns of the first
+    non-empty frame, later frames are aligned to these (other columns are dropped).
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.columns = None
+        self.rows = 0
+        self._dropped = set()
+
+    def write(self, frame):
+        if self.columns is None:
+            if frame.empty:
+                return
+            self.columns = DETAIL_COLUMNS + [name for name in frame.columns if name not in DETAIL_COLUMNS]
+            missing = [name for name in self.columns if name not in frame.columns]
+            frame = frame.reindex(columns=self.columns)
+            # the columns missing in the first frame get None values (not float NaN, which would make them numeric)
+            for name in missing:
+                frame[name] = pd.Series([None] * len(frame), index=frame.index, dtype=object)
+            self._open(frame)
+        else:
+            dropped = set(frame.columns).difference(self.columns, self._dropped)
+            if dropped:
+                print('Warning: column(s) {} not written to {}'.format(', '.join(sorted(dropped)), self.path),
+                      file=sys.stderr)
+                self._dropped |= dropped
+            frame = frame.reindex(columns=self.columns)
+        self._write(frame)
+        self.rows += len(frame)
+
+    def write_orders(self, orders):
+        self.write(order_details_frame(orders))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open(self, frame):
+        pass
+
+    def _write(self, frame):
+        raise NotImplementedError
+
+
+class CsvWriter(FrameWriter):
+    '''
+    Append order details to a CSV file, the file is flushed after every frame
+    '''
+    def _open(self, frame):
+        self._file = open(self.path, 'w', newline='', encoding='utf-8')
+        frame.iloc[:0].to_csv(self._file, index=False)
+
+    def _write(self, frame):
+        frame.to_csv(self._file, index=False, header=False)
+        self._file.flush()
+
+    def close(self):
+        if self.columns is not None:
+            self._file.close()
+
+
+class ExcelWriter(FrameWriter):
+    '''
+    Append order details to an xlsx file, using the write-only mode of openpyxl (rows are
+    streamed to a temporary file and not kept in memory). The file is created by close().
+    '''
+    def __init__(self, path):
+        super().__init__(path)
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise ImportError('openpyxl is required for Excel output, install it with pip install openpyxl') from None
+        self._workbook = Workbook(write_only=True)
+
+    def _open(self, frame):
+        self._sheet = self._workbook.create_sheet()
+        self._sheet.append(self.columns)
+
+    def _write(self, frame):
+        # missing values (NaN/NaT) are written as empty cells
+        for row in frame.astype(object).where(frame.notna(), None).itertuples(index=False):
+            self._sheet.append(row)
+
+    def close(self):
+        if self.columns is not None:
+            self._workbook.save(self.path)
+
+
+class ParquetWriter(FrameWriter):
+    '''
+    Append order details to a Parquet file (requires pyarrow). Frames are buffered until
+    row_group_size rows are collected and then written as one row group. The file is only
+    complete (readable) after close().
+    '''
+    def __init__(self, path, row_group_size=50000):
+        super().__init__(path)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('pyarrow is required for Parquet output, install it with pip install pyarrow') from None
+        self._pa = pa
+        self._pq = pq
+        self.row_group_size = row_group_size
+        self._buffer = []
+        self._buffered = 0
+
+    def _open(self, frame):
+        pa = self._pa
+        # columns without any value in the first frame would get the null type, use strings instead
+        schema = pa.Schema.from_pandas(frame, preserve_index=False)
+        self._string_columns = []
+        for i, field in enumerate(schema):
+            if pa.types.is_null(field.type):
+                schema = schema.set(i, pa.field(field.name, pa.string()))
+                self._string_columns.append(field.name)
+        self._schema = schema
+        self._writer = self._pq.ParquetWriter(self.path, schema)
+
+    def _write(self, frame):
+        self._buffer.append(frame)
+        self._buffered += len(frame)
+        if self._buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        frame = pd.concat(self._buffer, ignore_index=True)
+        for name in self._string_columns:
+            frame[name] = frame[name].astype(object).where(frame[name].isna(), frame[name].astype(str))
+        self._writer.write_table(self._pa.Table.from_pandas(frame, schema=self._schema, preserve_index=False))
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self):
+        if self.columns is not None:
+            self.flush()
+            self._writer.close()
@@ -0,0 +1,143 @@
+"""
+Compact line item objects for Order.lineitems and Estimate.quotelines.
+
+A line item keeps its values in __slots__ instead of a per-line dict, which
+cuts the memory of large orders/estimates considerably. For backward
+compatibility it behaves like a dict: item['sku'], item.get('shipset', ''),
+item['serials'] = [...], dict(item), 'status' in item all work as before.
+Keys which are not known fields (e.g. added later by callers) are kept in a
+small extra dict.
+
+Line items are Mappings but not dict instances: isinstance(line, dict) is False
+and json.dumps() doesn't encode them. Use line.to_dict() (or isinstance(line,
+Mapping)) where a plain dict is needed.
+
+    line = order.lineitems['1.0']
+    line['sku'] == line.sku
+    json.dumps({k: v.to_dict() for k, v in order.lineitems.items()})
+"""
+from collections.abc import MutableMapping
+
+
+class LineItem(MutableMapping):
+    '''
+    Base class, subclasses set _fields to a tuple of (key, attribute name) pairs
+    and __slots__ to the attribute names
+    '''
+    __slots__ = ('_extra',)
+    _fields = ()
+    _attributes = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._attributes = dict(cls._fields)
+
+    def __init__(self, values=(), **kwargs):
+        self._extra = None
+        if isinstance(values, dict):
+            values = values.items()
+        for key, value in values:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        attr = self._attributes.get(key)
+        if attr is not None:
+            try:
+                return getattr(self, attr)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        attr = self._attributes.get(key)
+        if attr is not None:
+            setattr(self, attr, value)
+        elif self._extra is None:
+            self._extra = {key: value}
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        attr = self._attributes.get(key)
+        if attr is not None:
+            try:
+                delattr(self, attr)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __contains__(self, key):
+        attr = self._attributes.get(key)
+        if attr is not None:
+            return hasattr(self, attr)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key, attr in self._fields:
+            if hasattr(self, attr):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, dict(self))
+
+    def copy(self):
+        return type(self)(self.items())
+
+    def to_dict(self):
+        '''
+        Return the line item as plain dict (e.g. for JSON encoding)
+        '''
+        return dict(self)
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+
+class OrderLine(LineItem):
+    '''
+    Line item of an Order
+    '''
+    _fields = (
+        ('sku', 'sku'),
+        ('description', 'description'),
+        ('quantity', 'quantity'),
+        ('amount', 'amount'),
+        ('promiseddelivery', 'promiseddelivery'),
+        ('requesteddelivery', 'requesteddelivery'),
+        ('status', 'status'),
+        ('shipdate', 'shipdate'),
+        ('Tracking Number', 'tracking_number'),
+        ('Tracking URL', 'tracking_url'),
+        ('serials', 'serials'),
+        ('shipset', 'shipset'),
+    )
+    __slots__ = tuple(attr for _, attr in _fields)
+
+
+class QuoteLine(LineItem):
+    '''
+    Line item of an Estimate
+    '''
+    _fields = (
+        ('sku', 'sku'),
+        ('description', 'description'),
+        ('quantity', 'quantity'),
+        ('_lineid', 'lineid'),
+        ('lineitem', 'lineitem'),
+    )
+    __slots__ = tuple(attr for _, attr in _fields)
@@ -0,0 +1,170 @@
+"""
+Timing spans and counters for the CCW clients.
+"""
+import json
+import re
+import threading
+import time
+
+
+class _Span(object):
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullMetrics(object):
+    '''
+    Metrics interface which records nothing
+    '''
+    enabled = False
+
+    def span(self, name):
+        return _NULL_SPAN
+
+    def observe(self, name, seconds):
+        pass
+
+    def add(self, name, value=1):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class Metrics(NullMetrics):
+    '''
+    Thread-safe collection of timing spans (count, total and max seconds per name)
+    and counters. Spans can be nested, each one is recorded on its own. callback is called
+    with (kind, name, value) for every recorded value, kind being 'span' or 'counter'.
+    '''
+    enabled = True
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.spans = {}
+        self.counters = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        '''
+        Return context manager timing the enclosed block as span name
+        '''
+        return _Span(self, name)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            span = self.spans.get(name)
+            if span is None:
+                self.spans[name] = [1, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                if seconds > span[2]:
+                    span[2] = seconds
+        if self.callback is not None:
+            self.callback('span', name, seconds)
+
+    def add(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        if self.callback is not None:
+            self.callback('counter', name, value)
+
+    def reset(self):
+        with self._lock:
+            self.spans = {}
+            self.counters = {}
+            self.started = time.time()
+
+    def merge(self, data):
+        '''
+        Add the values of another Metrics object's as_dict() (e.g. from a worker process)
+        '''
+        with self._lock:
+            for name, span in data.get('spans', {}).items():
+                current = self.spans.setdefault(name, [0, 0.0, 0.0])
+                current[0] += span['count']
+                current[1] += span['total']
+                current[2] = max(current[2], span['max'])
+            for name, value in data.get('counters', {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'spans': {
+                    name: {'count': count, 'total': total, 'max': maximum, 'avg': total / count}
+                    for name, (count, total, maximum) in self.spans.items()
+                },
+                'counters': dict(self.counters),
+            }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def to_prometheus(self, prefix='ccw'):
+        '''
+        Return the metrics in the Prometheus text exposition format
+        '''
+        data = self.as_dict()
+        lines = [
+            '# HELP {}_span_seconds Time spent per call/stage'.format(prefix),
+            '# TYPE {}_span_seconds summary'.format(prefix),
+        ]
+        for name, span in sorted(data['spans'].items()):
+            lines.append('{}_span_seconds_count{{span="{}"}} {}'.format(prefix, name, span['count']))
+            lines.append('{}_span_seconds_sum{{span="{}"}} {:.6f}'.format(prefix, name, span['total']))
+        lines.append('# TYPE {}_span_max_seconds gauge'.format(prefix))
+        for name, span in sorted(data['spans'].items()):
+            lines.append('{}_span_max_seconds{{span="{}"}} {:.6f}'.format(prefix, name, span['max']))
+        for name, value in sorted(data['counters'].items()):
+            metric = '{}_{}_total'.format(prefix, re.sub(r'[^a-zA-Z0-9_]', '_', name))
+            lines.append('# TYPE {} counter'.format(metric))
+            lines.append('{} {}'.format(metric, value))
+        return '\n'.join(lines) + '\n'
+
+    def report(self):
+        '''
+        Return a table of all spans (sorted by total time) and counters. % is the share of the
+        wall clock time since the metrics were started/reset, with concurrent requests the
+        spans overlap and the shares can add up to more than 100%
+        '''
+        data = self.as_dict()
+        elapsed = time.time() - self.started
+        format_string = '{:32} {:>8} {:>10} {:>10} {:>10} {:>7}\n'
+        message = 'Profile ({:.2f}s elapsed)\n'.format(elapsed)
+        message += format_string.format('Span', 'Count', 'Total s', 'Avg ms', 'Max ms', '%')
+        for name, span in sorted(data['spans'].items(), key=lambda i: -i[1]['total']):
+            message += format_string.format(
+                name, span['count'], '{:.3f}'.format(span['total']), '{:.1f}'.format(span['avg'] * 1000),
+                '{:.1f}'.format(span['max'] * 1000), '{:.1f}'.format(100 * span['total'] / elapsed if elapsed else 0)
+            )
+        if data['counters']:
+            message += '\n{:32} {:>12}\n'.format('Counter', 'Value')
+            for name, value in sorted(data['counters'].items()):
+                message += '{:32} {:>12}\n'.format(name, value)
+        return message
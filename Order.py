@@ -3,7 +3,19 @@
 import re
 from datetime import datetime
 
-import pandas as pd
+from LineItem import OrderLine
+
+# order/line status values after which nothing changes anymore
+CLOSED_STATUSES = ('closed', 'cancelled')
+
+TOPLEVEL_LINE = re.compile(r'\d+\.0$')
+MAJOR_LINE = re.compile(r'(\d+\.)')
+
+# header attributes of an Order (besides lineitems)
+HEADER_ATTRIBUTES = (
+    'salesorder', 'ordername', 'orderdate', 'status', 'billtoparty', 'party', 'shiptoname', 'shiptoaddress',
+    'shiptocontactname', 'shiptocontactphone', 'shiptocontactemail', 'amount', 'currencycode',
+)
 
 
 class Order(object):
@@ -14,7 +26,8 @@ class Order(object):
     - status
     - salesorder
     - shiptoname
-    - lineitems  (list of dicts, key'ed by linenumber (i.e. 1.0, 2.0, 2.0.1, etc.))
+    - is_closed (True if the order status is closed or cancelled)
+    - lineitems  (dict of OrderLine objects (see LineItem.py, these behave like dicts), key'ed by linenumber (i.e. 1.0, 2.0, 2.0.1, etc.))
         sku
         description
         quantity
@@ -22,20 +35,28 @@ class Order(object):
         promiseddelivery
         serials: (list of serial numbers, only filled for toplevel items)
         shipset
+    - serials_error (exception if the serial numbers could not be retrieved, serials/shipset are empty then)
 
+    - iter_lineitems()
+        yields (linenumber, line item), without building all of them at once in lazy mode
     - display_order_detail()
         prints order details in a table on the screen
     '''
-    def __init__(self, checkorder_response, toplevel_only=True):    # noqa, C901
+    def __init__(self, checkorder_response, toplevel_only=True, keep_response=True, lazy=False):    # noqa, C901
         '''
         Set up a CCW Order object based on API data retrieved from CCW checkOrderStatus API response (passed as dict/json).
         By default we only track toplevel line items (i.e. 1.0, 2.0, 3.0), so the object only holds those. You can set
         toplevel_only arg to False to change this.
+        The response is kept as checkorder_response, unless keep_response is False (then it is None).
+        With lazy=True, only the header is parsed here and the line items when lineitems is first used
+        (e.g. if only status/is_closed/amount are needed), see also iter_lineitems().
         Note: Serial numbers are only retrieved for top-level line items at the moment.
         '''
-        self.checkorder_response = checkorder_response
+        self.checkorder_response = checkorder_response if keep_response else None
+        self.toplevel_only = toplevel_only
+        self.serials_error = None
 
-        po_header = self.checkorder_response['ShowPurchaseOrder']['value']['DataArea']['PurchaseOrder'][0]['PurchaseOrderHeader']
+        po_header = checkorder_response['ShowPurchaseOrder']['value']['DataArea']['PurchaseOrder'][0]['PurchaseOrderHeader']
 
         self.billtoparty = po_header['BillToParty']['Name'][0]['value']
         self.party = po_header['Party'][0]['Name'][0]['value']
@@ -81,75 +102,158 @@ class Order(object):
 
         self.amount = po_header['TotalAmount']['value']
         self.currencycode = po_header['TotalAmount']['currencyCode']
-        # add all the lineitems
-        lineitems = self.checkorder_response['ShowPurchaseOrder']['value']['DataArea']['PurchaseOrder'][0]['PurchaseOrderLine']
+        # add all the lineitems (when they are first used in lazy mode)
+        self._raw_lines = checkorder_response['ShowPurchaseOrder']['value']['DataArea']['PurchaseOrder'][0]['PurchaseOrderLine']
+        self._lineitems = None
+        self._line_index = None
+        if not lazy:
+            self.lineitems = dict(self._parse_lines())
+            self._build_line_index()
 
-        self.lineitems = {}
-        for l in lineitems:
+    @property
+    def lineitems(self):
+        if self._lineitems is None:
+            self.lineitems = dict(self._parse_lines())
+        return self._lineitems
+
+    @lineitems.setter
+    def lineitems(self, lineitems):
+        self._lineitems = lineitems
+        self._raw_lines = None
+        self._line_index = None
+
+    def iter_lineitems(self):
+        '''
+        Yield (line number, OrderLine) for all line items. In lazy mode, as long as lineitems was
+        not used, the lines are parsed one by one and not kept (changes to them are lost), so large
+        orders can be filtered without building all line items at once
+        '''
+        if self._lineitems is not None:
+            yield from self._lineitems.items()
+        else:
+            yield from self._parse_lines()
+
+    def _parse_lines(self):
+        '''
+        Parse the PurchaseOrderLine elements of the response, yield (line number, OrderLine)
+        '''
+        for l in self._raw_lines or ():
             linenumber = l['SalesOrderReference']['LineNumberID']['value']
 
-            is_toplevel = (re.match(r'\d+\.0$', linenumber) is not None)
-            if toplevel_only and not is_toplevel:
+            if self.toplevel_only and TOPLEVEL_LINE.match(linenumber) is None:
                 continue
-            item = {'sku': l['Item']['ID']['value'],
-                    'description': l['Item']['Description'][0]['value'],
-                    'quantity': l['Item']['Lot'][0]['Quantity']['value'],
-                    'amount': l['ExtendedAmount']['value'],
-                    'promiseddelivery': l.get('PromisedDeliveryDateTime', ''),
-                    }
-            try:
-                item['requesteddelivery'] = l['FulfillmentTerm'][0]['RequestedDeliveryDate']
-            except KeyError:
-                item['requesteddelivery'] = ''
+            yield linenumber, self._parse_line(l)
+
+    @staticmethod
+    def _parse_line(l):    # noqa, C901
+        '''
+        Return OrderLine for a PurchaseOrderLine element
+        '''
+        item = {'sku': l['Item']['ID']['value'],
+                'description': l['Item']['Description'][0]['value'],
+                'quantity': l['Item']['Lot'][0]['Quantity']['value'],
+                'amount': l['ExtendedAmount']['value'],
+                'promiseddelivery': l.get('PromisedDeliveryDateTime', ''),
+                }
+        try:
+            item['requesteddelivery'] = l['FulfillmentTerm'][0]['RequestedDeliveryDate']
+        except KeyError:
+            item['requesteddelivery'] = ''
+        try:
+            item['status'] = l['Status'][0]['Code']['value']
+        except KeyError:
+            item['status'] = ''
+
+        if item['status'] == 'Closed':
             try:
-                item['status'] = l['Status'][0]['Code']['value']
+                if l['Status'][0]['Extension'][0]['typeCode'] == 'ShipmentDate':
+                    item['shipdate'] = l['Status'][0]['Extension'][0]['DateTime'][0]['value']
             except KeyError:
-                item['status'] = ''
-
-            if item['status'] == 'Closed':
-                try:
-                    if l['Status'][0]['Extension'][0]['typeCode'] == 'ShipmentDate':
-                        item['shipdate'] = l['Status'][0]['Extension'][0]['DateTime'][0]['value']
-                except KeyError:
-                    item['shipdate'] = 'not found'
-
-                item['Tracking Number'] = item['Tracking URL'] = ''
-                for step in l.get('TransportStep', []):
-                    for t in step['TransportationTerm'][0]['Description']:
-                        if t.get('typeCode', '') == 'Tracking Number':
-                            item['Tracking Number'] = t.get('value', '')
-                        if t.get('typeCode', '') == 'Tracking URL':
-                            item['Tracking URL'] = t.get('value', '')
-                            break
-                    if item['Tracking URL']:
+                item['shipdate'] = 'not found'
+
+            item['Tracking Number'] = item['Tracking URL'] = ''
+            for step in l.get('TransportStep', []):
+                for t in step['TransportationTerm'][0]['Description']:
+                    if t.get('typeCode', '') == 'Tracking Number':
+                        item['Tracking Number'] = t.get('value', '')
+                    if t.get('typeCode', '') == 'Tracking URL':
+                        item['Tracking URL'] = t.get('value', '')
                         break
-            else:
-                item['Tracking Number'] = item['Tracking URL'] = ''
-                item['shipdate'] = ''
+                if item['Tracking URL']:
+                    break
+        else:
+            item['Tracking Number'] = item['Tracking URL'] = ''
+            item['shipdate'] = ''
 
-            # set keys we might set later
-            item.update({
-                'serials': [],
-                'shipset': '',
-            })
+        # set keys we might set later
+        item.update({
+            'serials': [],
+            'shipset': '',
+        })
 
-            self.lineitems[linenumber] = item
+        return OrderLine(item)
+
+    @property
+    def is_closed(self):
+        '''
+        True if the order as a whole is closed (or cancelled)
+        '''
+        return self.status.lower() in CLOSED_STATUSES
+
+    @property
+    def open_lineitems(self):
+        '''
+        Return line numbers of all line items which are not closed (or cancelled) yet
+        '''
+        return [k for k, v in self.iter_lineitems() if v['status'].lower() not in CLOSED_STATUSES]
+
+    @classmethod
+    def from_stored(cls, header, lineitems, toplevel_only=True):
+        '''
+        Re-create an Order object from its header attributes (dict with the keys listed in
+        HEADER_ATTRIBUTES) and lineitems, e.g. as kept in a local OrderStore.
+        checkorder_response is None for such objects.
+        '''
+        order = cls.__new__(cls)
+        order.checkorder_response = None
+        order.toplevel_only = toplevel_only
+        order.serials_error = None
+        for attr in HEADER_ATTRIBUTES:
+            setattr(order, attr, header[attr])
+        order.lineitems = {k: v if isinstance(v, OrderLine) else OrderLine(v) for k, v in lineitems.items()}
+        return order
+
+    def _build_line_index(self):
+        '''
+        Index the line items by (major line number prefix, sku, quantity) and by (sku, quantity),
+        keeping the first line number for each key, so _search_lineitem() is a dict lookup.
+        Needs to be rebuilt if lineitems are changed.
+        '''
+        by_major = {}
+        by_sku = {}
+        for k, v in self.lineitems.items():
+            m = MAJOR_LINE.match(k)
+            key = (v['sku'], str(v['quantity']))
+            if m:
+                by_major.setdefault((m.group(1),) + key, k)
+            by_sku.setdefault(key, k)
+        self._line_index = (by_major, by_sku)
 
     def _search_lineitem(self, linenumber, sku, quantity):
         '''
         retrieve a  product lineID based on the major line number, SKU and quantity.
         Return product lineID
         '''
-        m = re.match(r'(\d+\.)', linenumber)
+        if getattr(self, '_line_index', None) is None:
+            self._build_line_index()
+        by_major, by_sku = self._line_index
+
+        # a line item matches if it starts with the same major line number (i.e. "3."),
+        # or any line item if the line number has no major line number
+        m = MAJOR_LINE.match(linenumber)
         if not m:
-            start_match = ''
-        else:
-            start_match = m.group(1)
-        for k, v in self.lineitems.items():
-            if k.startswith(start_match) and v['sku'] == sku and str(v['quantity']) == str(quantity):
-                return k
-        else:
-            return None
+            return by_sku.get((sku, str(quantity)))
+        return by_major.get((m.group(1), sku, str(quantity)))
 
     @staticmethod
     def _convert_date(datestring, dateformat='text'):
@@ -181,6 +285,8 @@ class Order(object):
         elif dateformat.lower() == 'datetime':
             return d
         elif dateformat.lower() == 'pandas':
+            # pandas is only imported when it is needed, it takes longer to import than the rest together
+            import pandas as pd
             return pd.Timestamp(d)
         else:
             assert False, "we shouldn't end here"
@@ -0,0 +1,219 @@
+"""
+Local SQLite store for parsed orders.
+
+OrderStore keeps the header, line items, shipsets and serial numbers of every
+Order saved to it, indexed by sales order and serial number. Orders can be
+loaded back as Order objects (without any API call), and refresh() re-queries
+only those orders which still have line items that are not closed.
+
+    store = OrderStore('orders.db')
+    store.save(ccw.get_order_status('1234567890'))
+    ...
+    store.refresh(ccw)
+    lines = store.order_details(dateformat='pandas')
+"""
+import sqlite3
+import threading
+import time
+
+from Order import Order, CLOSED_STATUSES, HEADER_ATTRIBUTES
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS orders (
+    salesorder TEXT PRIMARY KEY,
+    ordername, orderdate, status, billtoparty, party, shiptoname, shiptoaddress,
+    shiptocontactname, shiptocontactphone, shiptocontactemail, amount, currencycode,
+    toplevel_only INTEGER,
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS lineitems (
+    salesorder TEXT NOT NULL REFERENCES orders(salesorder) ON DELETE CASCADE,
+    linenumber TEXT NOT NULL,
+    position INTEGER,
+    sku, description, quantity, amount, promiseddelivery, requesteddelivery, status, shipdate,
+    tracking_number, tracking_url, shipset,
+    PRIMARY KEY (salesorder, linenumber)
+);
+CREATE TABLE IF NOT EXISTS serials (
+    serial TEXT NOT NULL,
+    salesorder TEXT NOT NULL,
+    linenumber TEXT NOT NULL,
+    position INTEGER,
+    FOREIGN KEY (salesorder, linenumber) REFERENCES lineitems(salesorder, linenumber) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS serials_serial ON serials(serial);
+CREATE INDEX IF NOT EXISTS serials_order ON serials(salesorder, linenumber);
+CREATE INDEX IF NOT EXISTS lineitems_status ON lineitems(status);
+'''
+
+# lineitem dict keys and the corresponding lineitems table columns
+LINE_COLUMNS = (
+    ('sku', 'sku'),
+    ('description', 'description'),
+    ('quantity', 'quantity'),
+    ('amount', 'amount'),
+    ('promiseddelivery', 'promiseddelivery'),
+    ('requesteddelivery', 'requesteddelivery'),
+    ('status', 'status'),
+    ('shipdate', 'shipdate'),
+    ('Tracking Number', 'tracking_number'),
+    ('Tracking URL', 'tracking_url'),
+    ('shipset', 'shipset'),
+)
+# position of the shipset in the lineitems rows written by OrderStore.save()
+SHIPSET_COLUMN = 3 + [key for key, _ in LINE_COLUMNS].index('shipset')
+
+
+class OrderStore(object):
+    '''
+    SQLite backed store of Order objects. The store can be shared between threads.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA foreign_keys = ON')
+        self._db.execute('PRAGMA journal_mode = WAL')
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def save(self, order):
+        '''
+        Add or replace an order (including line items and serials). If the serial numbers of the
+        order could not be retrieved (order.serials_error), the stored serials and shipsets are kept
+        '''
+        header = [getattr(order, attr) for attr in HEADER_ATTRIBUTES]
+        lines = []
+        serials = []
+        for position, (linenumber, item) in enumerate(order.lineitems.items()):
+            lines.append([order.salesorder, linenumber, position] + [item.get(key, '') for key, _ in LINE_COLUMNS])
+            serials += [(serial, order.salesorder, linenumber, i) for i, serial in enumerate(item.get('serials') or [])]
+
+        with self._lock, self._db:
+            if order.serials_error is not None:
+                serials = self._keep_serials(order.salesorder, lines)
+            self._db.execute('DELETE FROM orders WHERE salesorder = ?', (order.salesorder,))
+            self._db.execute(
+                'INSERT INTO orders ({}, toplevel_only, updated) VALUES ({})'.format(
+                    ', '.join(HEADER_ATTRIBUTES), ', '.join('?' * (len(HEADER_ATTRIBUTES) + 2))),
+                header + [int(order.toplevel_only), time.time()]
+            )
+            self._db.executemany(
+                'INSERT INTO lineitems (salesorder, linenumber, position, {}) VALUES ({})'.format(
+                    ', '.join(c for _, c in LINE_COLUMNS), ', '.join('?' * (len(LINE_COLUMNS) + 3))),
+                lines
+            )
+            self._db.executemany(
+                'INSERT INTO serials (serial, salesorder, linenumber, position) VALUES (?, ?, ?, ?)', serials
+            )
+
+    def _keep_serials(self, sales_order, lines):
+        '''
+        Set the stored shipsets in the new lineitems rows, return the stored serials rows of these lines
+        '''
+        shipsets = dict(self._db.execute('SELECT linenumber, shipset FROM lineitems WHERE salesorder = ?',
+                                         (sales_order,)))
+        for line in lines:
+            line[SHIPSET_COLUMN] = shipsets.get(line[1], line[SHIPSET_COLUMN])
+        linenumbers = {line[1] for line in lines}
+        return [row for row in self._db.execute(
+            'SELECT serial, salesorder, linenumber, position FROM serials WHERE salesorder = ?', (sales_order,))
+            if row[2] in linenumbers]
+
+    def delete(self, sales_order):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM orders WHERE salesorder = ?', (str(sales_order),))
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def sales_orders(self):
+        '''
+        Return all sales order numbers in the store
+        '''
+        return [r[0] for r in self._query('SELECT salesorder FROM orders ORDER BY salesorder')]
+
+    def open_orders(self):
+        '''
+        Return sales order numbers of all orders which still have line items that are not closed
+        (or which have no line items and are not closed)
+        '''
+        closed = ', '.join('?' * len(CLOSED_STATUSES))
+        sql = '''SELECT salesorder FROM orders o
+                 WHERE EXISTS (SELECT 1 FROM lineitems l WHERE l.salesorder = o.salesorder
+                               AND lower(l.status) NOT IN ({closed}))
+                    OR (NOT EXISTS (SELECT 1 FROM lineitems l WHERE l.salesorder = o.salesorder)
+                        AND lower(o.status) NOT IN ({closed}))
+                 ORDER BY salesorder'''.format(closed=closed)
+        return [r[0] for r in self._query(sql, CLOSED_STATUSES * 2)]
+
+    def get_order(self, sales_order):
+        '''
+        Load an order from the store, return Order object. Raises KeyError if the order is not stored
+        '''
+        rows = self._query('SELECT toplevel_only, {} FROM orders WHERE salesorder = ?'.format(', '.join(HEADER_ATTRIBUTES)),
+                           (str(sales_order),))
+        if not rows:
+            raise KeyError('order {} not found in store'.format(sales_order))
+        header = dict(zip(HEADER_ATTRIBUTES, rows[0][1:]))
+
+        serials = {}
+        for linenumber, serial in self._query(
+                'SELECT linenumber, serial FROM serials WHERE salesorder = ? ORDER BY linenumber, position',
+                (str(sales_order),)):
+            serials.setdefault(linenumber, []).append(serial)
+
+        lineitems = {}
+        for row in self._query(
+                'SELECT linenumber, {} FROM lineitems WHERE salesorder = ? ORDER BY position'.format(
+                    ', '.join(c for _, c in LINE_COLUMNS)), (str(sales_order),)):
+            item = dict(zip([k for k, _ in LINE_COLUMNS], row[1:]))
+            item['serials'] = serials.get(row[0], [])
+            lineitems[row[0]] = item
+
+        return Order.from_stored(header, lineitems, toplevel_only=bool(rows[0][0]))
+
+    def find_serial(self, serial):
+        '''
+        Return list of (sales order, line number, sku, shipset) the serial number was found in
+        '''
+        return self._query(
+            '''SELECT s.salesorder, s.linenumber, l.sku, l.shipset FROM serials s
+               JOIN lineitems l ON l.salesorder = s.salesorder AND l.linenumber = s.linenumber
+               WHERE s.serial = ?''', (serial,))
+
+    def order_details(self, sales_orders=None, dateformat='text'):
+        '''
+        Return the details of the given (default: all) stored orders as list of dicts,
+        see Order.return_order_details()
+        '''
+        result = []
+        for so in sales_orders or self.sales_orders():
+            result += self.get_order(so).return_order_details(dateformat=dateformat)
+        return result
+
+    def refresh(self, ccw, add_serials=True):
+        '''
+        Re-query all orders which still have open line items through the CCW object and
+        update the store. Return list of (sales order, Order object or exception)
+        '''
+        toplevel = dict(self._query('SELECT salesorder, toplevel_only FROM orders'))
+        results = []
+        for so in self.open_orders():
+            try:
+                order = ccw.get_order_status(so, toplevel_only=bool(toplevel.get(so, 1)), add_serials=add_serials)
+                self.save(order)
+                results.append((so, order))
+            except Exception as e:
+                results.append((so, e))
+        return results
@@ -0,0 +1,268 @@
+"""
+Watch open orders for changes.
+
+OrderWatcher polls a set of sales orders through one CCW object and compares
+the line items of every new Order with the last snapshot, emitting only the
+changes (status, ship date, tracking number and serials by default) as events.
+The orders are kept in a heap ordered by the time of their next poll: orders
+with a promised delivery date close by (or overdue) are polled every
+min_interval seconds, orders due within near_days every interval seconds and
+the others every max_interval seconds. Closed orders drop out.
+
+    with CCW(**params) as ccw:
+        watcher = OrderWatcher(ccw, callback=print)
+        watcher.add(['1234567890', '1234567891'])
+        watcher.run()
+
+Each event is a dict like
+
+    {'time': '2021-09-14T06:11:16Z', 'event': 'changed', 'salesorder': '1234567890',
+     'line': '1.0', 'field': 'shipdate', 'old': '', 'new': '2021-09-14T00:00:00Z'}
+
+with event 'changed', 'added' or 'removed' (line items), 'closed' (no open line
+items left, the order is not polled anymore) or 'error' (the order could not be
+retrieved, it is polled again after interval seconds; 'new' is the error message).
+If only the serial numbers of an order could not be retrieved, its serials and
+shipsets are not compared (the last known values are kept) until they are
+available again.
+If an OrderStore is given, the stored orders are the first snapshots (so changes
+since the last run are reported) and every retrieved order is saved to it.
+"""
+import heapq
+import threading
+import time
+from datetime import datetime, timezone
+
+from Order import Order
+
+WATCHED_FIELDS = ('status', 'shipdate', 'Tracking Number', 'serials')
+# line item fields filled from the serial number data
+SERIAL_FIELDS = ('serials', 'shipset')
+# snapshot value of a serial field which was never retrieved
+_UNKNOWN = object()
+
+
+def is_open(order):
+    '''
+    True if the order still has line items which are not closed (or no line items and is not closed),
+    same as OrderStore.open_orders()
+    '''
+    if order.lineitems:
+        return bool(order.open_lineitems)
+    return not order.is_closed
+
+
+def days_to_delivery(order, now):
+    '''
+    Return the number of days from now (timestamp) to the earliest promised delivery of the open
+    line items (negative if overdue), None if no open line item has a promised delivery date
+    '''
+    dates = []
+    for linenumber in order.open_lineitems:
+        d = Order._convert_date(order.lineitems[linenumber].get('promiseddelivery'), dateformat='datetime')
+        if d is not None:
+            dates.append(d.replace(tzinfo=timezone.utc).timestamp())
+    if not dates:
+        return None
+    return (min(dates) - now) / 86400
+
+
+class OrderWatcher(object):
+    '''
+    Poll orders through ccw and call callback(event) for every change, see module description
+    '''
+    def __init__(self, ccw, callback, interval=900, min_interval=300, max_interval=4 * 3600, near_days=2,
+                 far_days=14, fields=WATCHED_FIELDS, toplevel_only=True, add_serials=True, store=None):
+        self.ccw = ccw
+        self.callback = callback
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.near_days = near_days
+        self.far_days = far_days
+        self.fields = tuple(fields)
+        self.toplevel_only = toplevel_only
+        self.add_serials = add_serials
+        self.store = store
+        # heap of (next poll time, sequence number, sales order). Entries whose sequence number
+        # is not the current one of the order (in _entries) are outdated and skipped
+        self._schedule = []
+        self._sequence = 0
+        self._entries = {}
+        self._snapshots = {}
+        self._stopped = threading.Event()
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def __contains__(self, sales_order):
+        return sales_order in self._snapshots
+
+    def add(self, sales_orders, when=None):
+        '''
+        Start watching sales orders (first poll at when, default now). Orders already watched are ignored
+        '''
+        when = time.time() if when is None else when
+        for so in sales_orders:
+            if so in self._snapshots:
+                continue
+            self._snapshots[so] = self._stored_snapshot(so)
+            self._push(when, so)
+
+    def remove(self, sales_order):
+        '''
+        Stop watching a sales order
+        '''
+        self._snapshots.pop(sales_order, None)
+        self._entries.pop(sales_order, None)
+
+    def next_poll(self):
+        '''
+        Return time of the next poll, None if no order is watched
+        '''
+        self._drop_removed()
+        return self._schedule[0][0] if self._schedule else None
+
+    def next_interval(self, order, now):
+        '''
+        Return seconds until the order is polled again, depending on its earliest promised delivery
+        '''
+        days = days_to_delivery(order, now)
+        if days is None:
+            return self.interval
+        if days <= self.near_days:
+            return self.min_interval
+        if days <= self.far_days:
+            return self.interval
+        return self.max_interval
+
+    def poll(self, now=None):
+        '''
+        Poll all orders which are due (each one once), return number of orders polled
+        '''
+        now = time.time() if now is None else now
+        due = []
+        while self.next_poll() is not None and self._schedule[0][0] <= now:
+            due.append(heapq.heappop(self._schedule)[2])
+            del self._entries[due[-1]]
+        for so in due:
+            if so in self._snapshots:
+                self.poll_order(so)
+        return len(due)
+
+    def poll_order(self, sales_order):
+        '''
+        Retrieve an order, emit the changes since the last snapshot and schedule its next poll
+        '''
+        now = time.time()
+        try:
+            order = self.ccw.get_order_status(sales_order, toplevel_only=self.toplevel_only,
+                                              add_serials=self.add_serials)
+        except Exception as e:
+            self._emit(now, 'error', sales_order, new=str(e))
+            self._push(now + self.interval, sales_order)
+            return None
+
+        if self.store is not None:
+            self.store.save(order)
+        snapshot = self.snapshot(order)
+        previous = self._snapshots.get(sales_order)
+        if order.serials_error is not None:
+            snapshot = self._keep_serials(previous or {}, snapshot)
+        if previous is not None:
+            self._emit_changes(now, sales_order, previous, snapshot)
+
+        if is_open(order):
+            self._snapshots[sales_order] = snapshot
+            self._push(now + self.next_interval(order, now), sales_order)
+        else:
+            self._emit(now, 'closed', sales_order, new=order.status)
+            self.remove(sales_order)
+        return order
+
+    def run(self, until=None):
+        '''
+        Poll the orders until no order is left, stop() is called or the time until is reached
+        '''
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            next_poll = self.next_poll()
+            if next_poll is None:
+                return
+            if until is not None and next_poll > until:
+                self._stopped.wait(max(until - time.time(), 0))
+                return
+            if self._stopped.wait(max(next_poll - time.time(), 0)):
+                return
+            self.poll()
+
+    def stop(self):
+        self._stopped.set()
+
+    def snapshot(self, order):
+        '''
+        Return dict of line number -> tuple of the watched field values
+        '''
+        return {
+            linenumber: tuple(tuple(v) if isinstance(v, list) else v for v in (item.get(f) for f in self.fields))
+            for linenumber, item in order.lineitems.items()
+        }
+
+    def _keep_serials(self, previous, snapshot):
+        '''
+        Return snapshot with the serial field values of previous (unknown for new lines), for orders
+        whose serial numbers are missing because they could not be retrieved
+        '''
+        positions = [i for i, field in enumerate(self.fields) if field in SERIAL_FIELDS]
+        if not positions:
+            return snapshot
+        result = {}
+        for linenumber, values in snapshot.items():
+            old_values = previous.get(linenumber)
+            values = list(values)
+            for i in positions:
+                values[i] = old_values[i] if old_values is not None else _UNKNOWN
+            result[linenumber] = tuple(values)
+        return result
+
+    def _stored_snapshot(self, sales_order):
+        if self.store is None:
+            return None
+        try:
+            return self.snapshot(self.store.get_order(sales_order))
+        except KeyError:
+            return None
+
+    def _push(self, when, sales_order):
+        self._sequence += 1
+        self._entries[sales_order] = self._sequence
+        heapq.heappush(self._schedule, (when, self._sequence, sales_order))
+
+    def _drop_removed(self):
+        while self._schedule and self._entries.get(self._schedule[0][2]) != self._schedule[0][1]:
+            heapq.heappop(self._schedule)
+
+    def _emit_changes(self, now, sales_order, previous, snapshot):
+        for linenumber, values in snapshot.items():
+            old_values = previous.get(linenumber)
+            if old_values is None:
+                new = {f: None if v is _UNKNOWN else list(v) if isinstance(v, tuple) else v
+                       for f, v in zip(self.fields, values)}
+                self._emit(now, 'added', sales_order, linenumber, new=new)
+                continue
+            if old_values == values:
+                continue
+            for field, old, new in zip(self.fields, old_values, values):
+                if old != new and old is not _UNKNOWN:
+                    self._emit(now, 'changed', sales_order, linenumber, field, old, new)
+        for linenumber in previous.keys() - snapshot.keys():
+            self._emit(now, 'removed', sales_order, linenumber)
+
+    def _emit(self, now, event, sales_order, line=None, field=None, old=None, new=None):
+        if isinstance(old, tuple):
+            old = list(old)
+        if isinstance(new, tuple):
+            new = list(new)
+        timestamp = datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.callback({'time': timestamp, 'event': event, 'salesorder': sales_order, 'line': line,
+                       'field': field, 'old': old, 'new': new})
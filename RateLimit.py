@@ -0,0 +1,254 @@
+"""
+Client side rate limiting, retries with backoff and circuit breaker for the Cisco APIs.
+"""
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class TokenBucket(object):
+    '''
+    Token bucket allowing rate requests per second on average, and bursts of up to burst requests
+    '''
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        '''
+        Take a token, return the number of seconds the caller has to wait before using it
+        '''
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    async def aacquire(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+
+class CircuitBreaker(object):
+    '''
+    Opens after failure_threshold consecutive failed requests. While open, requests fail
+    immediately with CircuitOpenError. After reset_timeout seconds a single trial
+    request is let through, which closes the circuit again if it succeeds.
+    '''
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # token of the trial request while the circuit is half-open
+        self._trial = None
+        self._lock = threading.Lock()
+
+    @property
+    def trial_running(self):
+        return self._trial is not None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_request(self):
+        '''
+        Raise CircuitOpenError if no request may be sent. Return token to pass to end_request()
+        (not None if the request is the trial request)
+        '''
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return None
+            if state == 'half-open' and self._trial is None:
+                self._trial = object()
+                return self._trial
+        raise CircuitOpenError('circuit open after {} consecutive failures, not sending request'.format(self.failures))
+
+    def end_request(self, token):
+        '''
+        Called when a request is finished, whatever the outcome: if it was the trial request and
+        neither success nor failure was recorded (e.g. another exception), the next request is the trial
+        '''
+        if token is None:
+            return
+        with self._lock:
+            if self._trial is token:
+                self._trial = None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = None
+
+
+def parse_retry_after(value):
+    '''
+    Return Retry-After header value (seconds or HTTP date) in seconds, None if not parseable
+    '''
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def response_status(response):
+    '''
+    Return status code of a requests or aiohttp response
+    '''
+    status = getattr(response, 'status_code', None)
+    return status if status is not None else response.status
+
+
+class RateLimiter(object):
+    '''
+    Rate limit, retry and circuit breaker settings for API requests:
+    - requests_per_second/burst: token bucket settings, no rate limit if requests_per_second is None
+    - max_retries: number of retries for responses with a status in retry_statuses or connection errors
+      (a request which still fails after these, or gets another 5xx status, counts as one failure for
+      the circuit breaker)
+    - backoff_base/backoff_max: the n-th retry waits a random time between 0 and
+      min(backoff_max, backoff_base * 2**n) seconds, or as long as requested by Retry-After
+    - failure_threshold/reset_timeout: circuit breaker settings
+    '''
+    def __init__(self, requests_per_second=None, burst=None, max_retries=4, backoff_base=0.5, backoff_max=60,
+                 failure_threshold=5, reset_timeout=30, retry_statuses=RETRY_STATUSES):
+        self.bucket = TokenBucket(requests_per_second, burst) if requests_per_second else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = retry_statuses
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0, 'waited': 0.0}
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def retry_delay(self, attempt, retry_after=None):
+        '''
+        Return the time to wait before retry number attempt (starting at 0)
+        '''
+        delay = parse_retry_after(retry_after)
+        if delay is not None:
+            return min(delay, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _check(self, attempt, response=None, error=None):
+        '''
+        Record the outcome of a request, return delay before the next attempt or None if the
+        result should be returned (or the error raised)
+        '''
+        if error is None and response_status(response) not in self.retry_statuses:
+            # server errors count as failures for the circuit breaker, also if they are not retried
+            if response_status(response) >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return None
+        if error is None and response_status(response) == 429:
+            self._count('throttled')
+        if attempt >= self.max_retries:
+            self.breaker.record_failure()
+            return None
+        self._count('retries')
+        return self.retry_delay(attempt, response.headers.get('Retry-After') if response is not None else None)
+
+    def call(self, send, *args, **kwargs):
+        '''
+        Call send(*args, **kwargs) (returning a response) applying rate limit, retries and circuit breaker
+        '''
+        token = self.breaker.before_request()
+        try:
+            attempt = 0
+            while True:
+                if self.bucket:
+                    self._count('waited', self.bucket.acquire())
+                self._count('requests')
+                try:
+                    response = send(*args, **kwargs)
+                except (OSError, asyncio.TimeoutError) as e:
+                    delay = self._check(attempt, error=e)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._check(attempt, response=response)
+                    if delay is None:
+                        return response
+                time.sleep(delay)
+                attempt += 1
+        finally:
+            self.breaker.end_request(token)
+
+    async def acall(self, send, *args, **kwargs):
+        '''
+        Same as call(), for a send coroutine function (aiohttp connection errors are retried as well)
+        '''
+        import aiohttp
+
+        token = self.breaker.before_request()
+        try:
+            attempt = 0
+            while True:
+                if self.bucket:
+                    self._count('waited', await self.bucket.aacquire())
+                self._count('requests')
+                try:
+                    response = await send(*args, **kwargs)
+                except (OSError, asyncio.TimeoutError, aiohttp.ClientError) as e:
+                    delay = self._check(attempt, error=e)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._check(attempt, response=response)
+                    if delay is None:
+                        return response
+                await asyncio.sleep(delay)
+                attempt += 1
+        finally:
+            self.breaker.end_request(token)
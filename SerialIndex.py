@@ -0,0 +1,156 @@
+"""
+Reverse index from serial numbers to the order lines they were shipped with.
+
+SerialIndex maps every serial number to its location (sales order, line
+number, SKU and shipset) with a dict, so a lookup takes constant time
+regardless of the number of orders. Orders are added (or replaced) as they are
+retrieved, either as Order objects with serial data or directly from the
+results of CCW.get_serials():
+
+    index = SerialIndex.load('serials.idx')       # or SerialIndex() for a new one
+    index.add_order(ccw.get_order_status('1234567890'))
+    index.add_serials('1234567891', ccw.get_serials('1234567891'))
+    index.lookup('FOC12345678')   # [SerialLocation(salesorder='1234567890', linenumber='1.0', ...)]
+    index.save('serials.idx')
+
+The index file is a text file with one tab-separated line per order line
+(sales order, line number, SKU, shipset and its serial numbers, the serial
+numbers separated by spaces), gzip compressed if the file name ends with .gz. A serial number shipped with more
+than one order line (e.g. a returned and re-shipped unit) has all of them as
+locations. See find_serial.py for the command line lookup.
+"""
+import gzip
+import os
+from collections import namedtuple
+from itertools import repeat
+
+FILE_HEADER = '# ccw serial index v1'
+
+SerialLocation = namedtuple('SerialLocation', ('salesorder', 'linenumber', 'sku', 'shipset'))
+
+
+class SerialIndex(object):
+    '''
+    Serial number -> list of SerialLocation, updated per sales order
+    '''
+    def __init__(self):
+        # (sales order, line number, sku, shipset) and serial numbers by location id, None for removed ones
+        self._locations = []
+        self._members = []
+        # serial -> location id, or tuple of location ids if the serial has several locations
+        self._serials = {}
+        # sales order -> location ids
+        self._orders = {}
+
+    def __len__(self):
+        return len(self._serials)
+
+    def __contains__(self, serial):
+        return serial in self._serials
+
+    def lookup(self, serial):
+        '''
+        Return list of SerialLocation of a serial number (empty list if it is not indexed)
+        '''
+        ids = self._serials.get(serial)
+        if ids is None:
+            return []
+        if isinstance(ids, tuple):
+            return [SerialLocation._make(self._locations[i]) for i in ids]
+        return [SerialLocation._make(self._locations[ids])]
+
+    def sales_orders(self):
+        '''
+        Return the sales orders in the index
+        '''
+        return list(self._orders)
+
+    def add_order(self, order):
+        '''
+        Add (or replace) the serial numbers of an Order object, i.e. after its serial data was
+        added (CCW.get_order_status() with add_serials=True, or orders from an OrderStore).
+        Orders whose serial numbers could not be retrieved (order.serials_error) are skipped, so
+        their serial numbers indexed before are kept
+        '''
+        if order.serials_error is not None:
+            return
+        sales_order = str(order.salesorder)
+        self.remove_order(sales_order)
+        for linenumber, item in order.iter_lineitems():
+            serials = [s for s in item.get('serials') or () if s]
+            if serials:
+                self._add((sales_order, linenumber, item.get('sku') or '', str(item.get('shipset') or '')),
+                          serials)
+
+    def add_serials(self, sales_order, serialdata):
+        '''
+        Add (or replace) the serial numbers of a sales order from the result of CCW.get_serials(),
+        the line numbers are the ones reported by the getSerialNumbers API
+        '''
+        sales_order = str(sales_order)
+        self.remove_order(sales_order)
+        for linenumber, line in serialdata.items():
+            serials = [e['serialNumber'] for e in line['serials'] if e.get('serialNumber')]
+            if serials:
+                self._add((sales_order, linenumber, line.get('sku') or '', str(line.get('shipset') or '')),
+                          serials)
+
+    def remove_order(self, sales_order):
+        '''
+        Remove all serial numbers of a sales order
+        '''
+        for i in self._orders.pop(str(sales_order), ()):
+            for serial in self._members[i]:
+                ids = self._serials.get(serial)
+                if ids == i:
+                    del self._serials[serial]
+                elif isinstance(ids, tuple):
+                    ids = tuple(j for j in ids if j != i)
+                    self._serials[serial] = ids[0] if len(ids) == 1 else ids
+            self._locations[i] = None
+            self._members[i] = None
+
+    def _add(self, location, serials):
+        i = len(self._locations)
+        self._locations.append(location)
+        self._members.append(serials)
+        self._orders.setdefault(location[0], []).append(i)
+
+        known = self._serials
+        if known.keys().isdisjoint(serials):
+            # all serials are new (the common case), add them in one go
+            known.update(zip(serials, repeat(i)))
+            return
+        previous = {serial: known[serial] for serial in serials if serial in known}
+        known.update(zip(serials, repeat(i)))
+        for serial, ids in previous.items():
+            known[serial] = (ids if isinstance(ids, tuple) else (ids,)) + (i,)
+
+    def save(self, path):
+        '''
+        Write the index to path (atomically, gzip compressed if path ends with .gz)
+        '''
+        opener = gzip.open if path.endswith('.gz') else open
+        tmpfile = '{}.{}.tmp'.format(path, os.getpid())
+        with opener(tmpfile, 'wt', encoding='utf-8', newline='\n') as f:
+            f.write(FILE_HEADER + '\n')
+            f.writelines(
+                '\t'.join(location + (' '.join(serials),)) + '\n'
+                for location, serials in zip(self._locations, self._members) if location is not None
+            )
+        os.replace(tmpfile, path)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Read an index written by save()
+        '''
+        opener = gzip.open if path.endswith('.gz') else open
+        index = cls()
+        with opener(path, 'rt', encoding='utf-8', newline='\n') as f:
+            if f.readline().rstrip('\n') != FILE_HEADER:
+                raise ValueError('{} is not a serial index file'.format(path))
+            for line in f:
+                *location, serials = line.rstrip('\n').split('\t')
+                index._add(tuple(location), serials.split(' ') if serials else [])
+        return index
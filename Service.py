@@ -0,0 +1,266 @@
+"""
+Local HTTP lookup service.
+
+LookupService keeps one authenticated CCW object (with pooled connections, and
+typically a response cache and coalescing of concurrent lookups) and serves
+orders, serial numbers and estimates as JSON to local tools, which then don't
+need to import the CCW modules, authenticate and open connections themselves:
+
+    GET  /orders/{so}            order header and lines (as Order.return_order_details())
+                                 ?sublevels=1 includes non-toplevel lines, ?serials=0 skips serials
+    GET  /orders/{so}/serials    serial data per line number (as CCW.get_serials())
+    GET  /estimates/{id}         estimate header and lines (Estimate.quotelines)
+    POST /batch                  {"orders": [...], "serials": [...], "estimates": [...]}, returns
+                                 the same structure with a result (or {"error": ...}) per ID
+    GET  /health                 status, cache and connection statistics
+
+Dates are returned as ISO 8601 strings. Errors are returned as {"error": message}
+with status 404 (unknown path, estimate not found), 405 (method not supported by the
+path), 400 (invalid request) or 502 (the CCW API request failed).
+
+    with CCW(**params, cache=ResponseCache(MemoryCache()), coalesce=True) as ccw:
+        LookupService(ccw, port=8000).serve_forever()
+
+See ccw_service.py for the command line entry point.
+"""
+import re
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from Estimate import EstimateError
+from Order import HEADER_ATTRIBUTES
+from utils import json_dumps, json_loads
+
+
+def json_default(obj):
+    '''
+    JSON encoding of the values which are not supported by default (dates, line items)
+    '''
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError('{} is not JSON serializable'.format(type(obj).__name__))
+
+
+def order_json(order):
+    '''
+    Return dict with the header attributes and line details of an order
+    '''
+    result = {attr: getattr(order, attr) for attr in HEADER_ATTRIBUTES}
+    result['lines'] = order.return_order_details(dateformat='datetime')
+    return result
+
+
+def estimate_json(estimate):
+    '''
+    Return dict with the header attributes and lines of an estimate
+    '''
+    return {
+        'estimate_id': estimate.estimate_id,
+        'estimate_name': estimate.estimate_name,
+        'status': estimate.status,
+        'lines': [line.to_dict() for line in estimate.quotelines.values()],
+    }
+
+
+class RequestError(Exception):
+    '''
+    Invalid request, answered with status (default 400) and the message
+    '''
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def error_status(e):
+    '''
+    Return the HTTP status for an error raised by a lookup
+    '''
+    if isinstance(e, RequestError):
+        return e.status
+    if isinstance(e, EstimateError):
+        return 404
+    return 502
+
+
+def query_flag(query, name, default):
+    values = query.get(name)
+    if not values:
+        return default
+    return values[-1].lower() not in ('0', 'false', 'no', '')
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    # (method, path pattern, handler method name)
+    routes = (
+        ('GET', re.compile(r'^/orders/([^/]+)$'), 'get_order'),
+        ('GET', re.compile(r'^/orders/([^/]+)/serials$'), 'get_serials'),
+        ('GET', re.compile(r'^/estimates/([^/]+)$'), 'get_estimate'),
+        ('POST', re.compile(r'^/batch$'), 'post_batch'),
+        ('GET', re.compile(r'^/health$'), 'get_health'),
+    )
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        allowed = []
+        for route_method, pattern, name in self.routes:
+            m = pattern.match(url.path)
+            if m and route_method == method:
+                break
+            if m:
+                allowed.append(route_method)
+        else:
+            if allowed:
+                return self._reply(405, {'error': 'method not allowed'}, headers={'Allow': ', '.join(allowed)})
+            return self._reply(404, {'error': 'not found'})
+
+        try:
+            result = getattr(self, name)(*[unquote(g) for g in m.groups()], query=parse_qs(url.query), body=body)
+        except Exception as e:
+            return self._reply(error_status(e), {'error': str(e)})
+        self._reply(200, result)
+
+    def _reply(self, status, data, headers=None):
+        body = json_dumps(data, default=json_default).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def get_order(self, sales_order, query, body):
+        order = self.server.ccw.get_order_status(
+            sales_order, toplevel_only=not query_flag(query, 'sublevels', False),
+            add_serials=query_flag(query, 'serials', True)
+        )
+        return order_json(order)
+
+    def get_serials(self, sales_order, query, body):
+        return self.server.ccw.get_serials(sales_order)
+
+    def get_estimate(self, estimate_id, query, body):
+        return estimate_json(self.server.ccw.get_estimate(estimate_id))
+
+    def post_batch(self, query, body):
+        try:
+            request = json_loads(body)
+        except ValueError:
+            raise RequestError('invalid JSON') from None
+        if not isinstance(request, dict):
+            raise RequestError('expected a JSON object with orders, serials and/or estimates')
+        ids = {}
+        for key in ('orders', 'serials', 'estimates'):
+            values = request.get(key) or []
+            if not isinstance(values, list):
+                raise RequestError('{} must be a list'.format(key))
+            ids[key] = list(dict.fromkeys(str(v) for v in values))
+        count = sum(len(v) for v in ids.values())
+        if count > self.server.max_batch:
+            raise RequestError('at most {} IDs per batch'.format(self.server.max_batch))
+        return self.server.batch(ids, toplevel_only=not query_flag(query, 'sublevels', False))
+
+    def get_health(self, query, body):
+        ccw = self.server.ccw
+        return {
+            'status': 'ok',
+            'cache': ccw.cache.stats if ccw.cache is not None else None,
+            'connections': ccw.connection_stats,
+        }
+
+
+class LookupService(ThreadingHTTPServer):
+    '''
+    Threaded HTTP server answering lookups through ccw. Each request is handled in its own
+    thread, batches are retrieved with batch_size orders per request and max_workers
+    concurrent serial and estimate lookups. port 0 picks a free port.
+    '''
+    daemon_threads = True
+
+    def __init__(self, ccw, host='127.0.0.1', port=8000, batch_size=20, max_workers=8, max_batch=1000,
+                 verbose=False):
+        super().__init__((host, port), LookupHandler)
+        self.ccw = ccw
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_batch = max_batch
+        self.verbose = verbose
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(*self.server_address[:2])
+
+    def batch(self, ids, toplevel_only=True):
+        '''
+        Look up dict with lists of orders, serials and estimates, return dict with the same keys
+        and a dict of ID -> result (or {'error': message}) each
+        '''
+        result = {'orders': {}, 'serials': {}, 'estimates': {}}
+        if ids.get('orders'):
+            orders = self.ccw.get_order_statuses(ids['orders'], toplevel_only=toplevel_only,
+                                                 batch_size=self.batch_size, max_workers=self.max_workers)
+            for so, order in orders:
+                result['orders'][so] = {'error': str(order)} if isinstance(order, Exception) else order_json(order)
+        if ids.get('serials'):
+            with ThreadPoolExecutor(max_workers=max(min(self.max_workers, len(ids['serials'])), 1)) as executor:
+                serials = dict(zip(ids['serials'], executor.map(self._get_serials, ids['serials'])))
+            result['serials'] = serials
+        if ids.get('estimates'):
+            estimates = dict(self.ccw.get_estimates(ids['estimates'], max_workers=self.max_workers))
+            for estimate_id in ids['estimates']:
+                estimate = estimates[estimate_id]
+                result['estimates'][estimate_id] = (
+                    {'error': str(estimate)} if isinstance(estimate, Exception) else estimate_json(estimate)
+                )
+        return result
+
+    def _get_serials(self, sales_order):
+        try:
+            return self.ccw.get_serials(sales_order)
+        except Exception as e:
+            return {'error': str(e)}
+
+    def start(self):
+        '''
+        Serve in a background thread, return self
+        '''
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,103 @@
+"""
+Pooled HTTP session used by the CCW client.
+
+A single PooledSession keeps TCP/TLS connections to cloudsso.cisco.com and
+api.cisco.com alive between API calls, so consecutive requests (and all pages
+of a getSerialNumbers lookup) reuse the same connection instead of doing a new
+handshake each time.
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 120
+
+
+class ConnectionStats(object):
+    '''
+    Thread-safe counters on how often the pool had to open a new connection
+    versus reusing an existing one.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    @property
+    def reused(self):
+        return max(self.requests - self.connections, 0)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'connections_created': self.connections,
+                'connections_reused': max(self.requests - self.connections, 0),
+            }
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    '''
+    HTTPAdapter which reports every newly created connection to a ConnectionStats instance
+    '''
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.stats
+
+        class _HTTPConnectionPool(HTTPConnectionPool):
+            def _new_conn(self):
+                stats.count_connection()
+                return super()._new_conn()
+
+        class _HTTPSConnectionPool(HTTPSConnectionPool):
+            def _new_conn(self):
+                stats.count_connection()
+                return super()._new_conn()
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _HTTPConnectionPool,
+            'https': _HTTPSConnectionPool,
+        }
+
+
+class PooledSession(requests.Session):
+    '''
+    requests.Session with a configurable keep-alive connection pool and default timeouts.
+
+    - pool_connections: number of per-host pools to keep (i.e. how many different hosts are cached)
+    - pool_maxsize: maximum number of connections kept per host
+    - pool_block: if True, block when all pool_maxsize connections to a host are in use
+      instead of opening (and later discarding) an extra connection
+    - connect_timeout/read_timeout: used for every request which does not pass its own timeout
+    '''
+    def __init__(self, pool_connections=4, pool_maxsize=10, pool_block=False,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+        super().__init__()
+        self.stats = ConnectionStats()
+        self.timeout = (connect_timeout, read_timeout)
+        adapter = CountingHTTPAdapter(self.stats, pool_connections=pool_connections,
+                                      pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.headers['Connection'] = 'keep-alive'
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        self.stats.count_request()
+        return super().request(method, url, **kwargs)
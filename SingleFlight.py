@@ -0,0 +1,73 @@
+"""
+Coalescing of duplicate in-flight lookups, see coalesce in CCW/AsyncCCW.
+"""
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight(object):
+    '''
+    Run only one call per key at a time, concurrent calls with the same key share its outcome
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        '''
+        Return (func(*args, **kwargs), shared). If a call with the same key is already in
+        progress, wait for it and return its result (shared is True) or raise its exception
+        '''
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = Future()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+        future.set_result(result)
+        return result, False
+
+    async def ado(self, key, func, *args, **kwargs):
+        '''
+        Same as do(), for a coroutine function func (all callers must run in the same event loop).
+        If the task running the call is cancelled, one of the waiting callers takes over
+        '''
+        import asyncio
+
+        while key in self._async_calls:
+            future = self._async_calls[key]
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                # if the leading call was cancelled (and not this one), try again
+                if not future.cancelled():
+                    raise
+
+        future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # the exception is raised here, don't log it as never retrieved if nobody was waiting
+            future.exception()
+            raise
+        finally:
+            del self._async_calls[key]
+        future.set_result(result)
+        return result, False
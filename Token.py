@@ -0,0 +1,179 @@
+"""
+Token lifecycle handling for the CCW clients.
+
+TokenManager keeps the current access token together with its expiry time,
+refreshes it ahead of expiry (only one refresh at a time, other callers wait
+for its result) and can persist it in a local cache file which is only
+readable by the current user, so that back-to-back script runs don't need a
+new SSO round trip. Processes sharing a cache file also share the token: before
+fetching a new token, the cache file is checked for a token another process
+has refreshed in the meantime.
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+
+class TokenManager(object):
+    '''
+    Track an access token and its expiry.
+
+    - refresh_margin: number of seconds before the expiry when the token is considered
+      stale and is refreshed
+    - cache_file: optional path to store the token in (created with mode 0600, a cache
+      file readable by others is ignored)
+    - cache_id: identifies the credentials the token belongs to, a cached token is only
+      used if it was stored for the same credentials
+
+    The actual token retrieval is passed in as fetch function (coroutine for the async
+    methods) which returns the decoded SSO response, i.e. a dict with access_token and
+    expires_in.
+    '''
+    def __init__(self, refresh_margin=60, cache_file=None, cache_id=''):
+        self.refresh_margin = refresh_margin
+        self.cache_file = os.path.expanduser(cache_file) if cache_file else None
+        self.cache_id = hashlib.sha256(cache_id.encode()).hexdigest()
+        self.token = None
+        self.expires_at = None
+        self._lock = threading.Lock()
+        self._async_lock = None
+        if self.cache_file:
+            self._load_cache()
+
+    @property
+    def valid(self):
+        '''
+        True if we have a token which does not expire within refresh_margin seconds
+        '''
+        if self.token is None:
+            return False
+        return self.expires_at is None or time.time() < self.expires_at - self.refresh_margin
+
+    def set_token(self, token, expires_in=None):
+        '''
+        Store a token. Without expires_in, the token is used until the API rejects it
+        '''
+        self.token = token
+        self.expires_at = time.time() + int(expires_in) if expires_in is not None else None
+
+    def update(self, response):
+        '''
+        Store the token from a decoded SSO token response and update the cache file
+        '''
+        self.set_token(response['access_token'], response.get('expires_in'))
+        if self.cache_file:
+            self._save_cache()
+
+    def invalidate(self, token):
+        '''
+        Mark token as expired (e.g. after a 401 response). Nothing is done if the token was
+        already replaced, so concurrent failures only cause a single refresh
+        '''
+        with self._lock:
+            if token == self.token:
+                self.expires_at = 0
+
+    def get(self, fetch):
+        '''
+        Return a valid token, calling fetch() to retrieve a new one when needed
+        '''
+        if self.valid:
+            return self.token
+        with self._lock:
+            # another thread (or process) might have refreshed the token while we waited
+            if not self.valid and not self._reload_cache():
+                self.update(fetch())
+            return self.token
+
+    def refresh(self, fetch):
+        '''
+        Retrieve a new token through fetch(), regardless of the current token's expiry
+        '''
+        with self._lock:
+            self.update(fetch())
+            return self.token
+
+    async def aget(self, fetch):
+        '''
+        Same as get(), for a fetch coroutine function
+        '''
+        if self.valid:
+            return self.token
+        async with self._get_async_lock():
+            if not self.valid and not self._reload_cache():
+                self.update(await fetch())
+            return self.token
+
+    async def arefresh(self, fetch):
+        '''
+        Same as refresh(), for a fetch coroutine function
+        '''
+        async with self._get_async_lock():
+            self.update(await fetch())
+            return self.token
+
+    def _get_async_lock(self):
+        if self._async_lock is None:
+            # asyncio is only needed (and imported) for AsyncCCW
+            import asyncio
+            self._async_lock = asyncio.Lock()
+        return self._async_lock
+
+    def _read_cache(self):
+        '''
+        Return (token, expires_at) from the cache file, None if there is no usable cached token
+        '''
+        try:
+            if os.stat(self.cache_file).st_mode & 0o077:
+                print('WARNING: ignoring token cache {}, it is accessible by other users'.format(self.cache_file), file=sys.stderr)
+                return None
+            with open(self.cache_file) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('id') != self.cache_id or not data.get('access_token'):
+            return None
+        return data['access_token'], data.get('expires_at')
+
+    def _load_cache(self):
+        cached = self._read_cache()
+        if cached is None:
+            return
+        self.token, self.expires_at = cached
+        if not self.valid:
+            self.token = self.expires_at = None
+
+    def _reload_cache(self):
+        '''
+        Use a token from the cache file if it differs from the current (stale or rejected) one
+        and is valid. Return True if the cached token was taken over
+        '''
+        if not self.cache_file:
+            return False
+        cached = self._read_cache()
+        if cached is None or cached[0] == self.token:
+            return False
+        token, expires_at = self.token, self.expires_at
+        self.token, self.expires_at = cached
+        if self.valid:
+            return True
+        self.token, self.expires_at = token, expires_at
+        return False
+
+    def _save_cache(self):
+        data = {
+            'id': self.cache_id,
+            'access_token': self.token,
+            'expires_at': self.expires_at,
+        }
+        tmpfile = '{}.{}.tmp'.format(self.cache_file, os.getpid())
+        try:
+            fd = os.open(tmpfile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmpfile, self.cache_file)
+        except OSError as e:
+            print('WARNING: cannot write token cache {}: {}'.format(self.cache_file, str(e)), file=sys.stderr)
@@ -0,0 +1,152 @@
+"""
+Directory based work queue, used by bulk_order_status.py to distribute sales
+orders across processes and hosts.
+"""
+import os
+import socket
+import time
+
+STATES = ('pending', 'running', 'done', 'failed')
+
+
+class Shard(object):
+    '''
+    A claimed shard: name (e.g. shard-000001), items (list of strings) and number of
+    previous attempts
+    '''
+    def __init__(self, name, path, items, attempts=0):
+        self.name = name
+        self.path = path
+        self.items = items
+        self.attempts = attempts
+
+    def __repr__(self):
+        return 'Shard({}, {} items, attempt {})'.format(self.name, len(self.items), self.attempts + 1)
+
+
+class WorkQueue(object):
+    '''
+    Work queue in directory. A shard which failed is put back to pending/ until it
+    failed max_attempts times, then it is moved to failed/.
+    '''
+    def __init__(self, directory, max_attempts=3):
+        self.directory = directory
+        self.max_attempts = max_attempts
+        for state in STATES + ('output',):
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+
+    def _path(self, state, name=''):
+        return os.path.join(self.directory, state, name)
+
+    def output_path(self, shard_name, suffix):
+        '''
+        Return path of an output file of a shard, e.g. output/shard-000001.csv
+        '''
+        return self._path('output', shard_name + suffix)
+
+    @staticmethod
+    def _write(path, items, attempts=0):
+        tmpfile = '{}.{}.{}.tmp'.format(path, socket.gethostname(), os.getpid())
+        with open(tmpfile, 'w') as f:
+            f.write('# attempts: {}\n'.format(attempts))
+            f.writelines(str(item) + '\n' for item in items)
+        os.replace(tmpfile, path)
+
+    @staticmethod
+    def _read(path):
+        attempts = 0
+        items = []
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('# attempts:'):
+                    attempts = int(line.split(':', 1)[1])
+                elif line and not line.startswith('#'):
+                    items.append(line)
+        return items, attempts
+
+    def _names(self, state):
+        return sorted(n for n in os.listdir(self._path(state)) if n.endswith('.txt'))
+
+    def add(self, items, shard_size=200):
+        '''
+        Split items into shards of shard_size items and add them to pending/. Shards are
+        numbered after all existing ones. Return number of shards added
+        '''
+        existing = [n for state in STATES for n in self._names(state)]
+        number = max([int(n[6:12]) for n in existing if n.startswith('shard-')] or [0])
+        items = list(items)
+        count = 0
+        for i in range(0, len(items), shard_size):
+            number += 1
+            count += 1
+            self._write(self._path('pending', 'shard-{:06d}.txt'.format(number)), items[i:i + shard_size])
+        return count
+
+    def claim(self):
+        '''
+        Move the next pending shard to running/ and return it, None if no shard is pending
+        '''
+        for name in self._names('pending'):
+            path = self._path('running', name)
+            try:
+                os.rename(self._path('pending', name), path)
+            except FileNotFoundError:
+                # claimed by another worker
+                continue
+            os.utime(path)
+            items, attempts = self._read(path)
+            return Shard(name[:-4], path, items, attempts)
+        return None
+
+    def heartbeat(self, shard):
+        '''
+        Mark a running shard as alive (see requeue_stale())
+        '''
+        try:
+            os.utime(shard.path)
+        except OSError:
+            pass
+
+    def complete(self, shard):
+        os.replace(shard.path, self._path('done', shard.name + '.txt'))
+
+    def fail(self, shard):
+        '''
+        Put a shard back to pending/, or move it to failed/ after max_attempts attempts.
+        Return the new state
+        '''
+        attempts = shard.attempts + 1
+        state = 'pending' if attempts < self.max_attempts else 'failed'
+        self._write(shard.path, shard.items, attempts)
+        os.replace(shard.path, self._path(state, shard.name + '.txt'))
+        return state
+
+    def requeue_stale(self, max_age):
+        '''
+        Move shards which are running but had no heartbeat for max_age seconds (e.g. because
+        the worker was killed) back to pending/. Return number of shards requeued
+        '''
+        count = 0
+        now = time.time()
+        for name in self._names('running'):
+            path = self._path('running', name)
+            try:
+                if now - os.stat(path).st_mtime > max_age:
+                    os.rename(path, self._path('pending', name))
+                    count += 1
+            except FileNotFoundError:
+                continue
+        return count
+
+    def status(self):
+        '''
+        Return dict with the number of shards per state
+        '''
+        return {state: len(self._names(state)) for state in STATES}
+
+    def done_shards(self):
+        '''
+        Return names of all completed shards, in shard order
+        '''
+        return [n[:-4] for n in self._names('done')]
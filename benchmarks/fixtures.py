@@ -0,0 +1,169 @@
+"""
+Synthetic CCW API responses, shaped like the real checkOrderStatus, getSerialNumbers
+and acquireEstimate responses (only containing the fields Order/Estimate parse).
+"""
+import json
+
+
+def _line_status(line, closed_ratio):
+    # close every n-th major line, so the ratio of closed lines is roughly closed_ratio
+    if closed_ratio <= 0:
+        return False
+    return line % max(int(round(1 / closed_ratio)), 1) == 0
+
+
+def order_line(sales_order, linenumber, major, quantity, closed, description_size=40):
+    """
+    Return a single PurchaseOrderLine
+    """
+    line = {
+        'SalesOrderReference': {'LineNumberID': {'value': linenumber}},
+        'Item': {
+            'ID': {'value': 'SKU-{}-{}'.format(major, linenumber.replace('.', '-'))},
+            'Description': [{'value': ('Line {} of {} '.format(linenumber, sales_order) * description_size)[:description_size]}],
+            'Lot': [{'Quantity': {'value': quantity}}],
+        },
+        'ExtendedAmount': {'value': 1234.5 * quantity},
+        'PromisedDeliveryDateTime': '2021-09-14T06:11:16Z',
+        'FulfillmentTerm': [{'RequestedDeliveryDate': '2021-09-10T00:00:00Z'}],
+        'Status': [{
+            'Code': {'value': 'Closed' if closed else 'Booked'},
+            'Extension': [{'typeCode': 'ShipmentDate', 'DateTime': [{'value': '2021-09-20T10:00:00Z'}]}] if closed else [],
+        }],
+    }
+    if closed:
+        line['TransportStep'] = [{
+            'TransportationTerm': [{
+                'Description': [
+                    {'typeCode': 'Carrier', 'value': 'Carrier Inc.'},
+                    {'typeCode': 'Tracking Number', 'value': 'TRK{}{}'.format(sales_order, major)},
+                    {'typeCode': 'Tracking URL', 'value': 'https://track.example.com/TRK{}{}'.format(sales_order, major)},
+                ]
+            }]
+        }]
+    return line
+
+
+def purchase_order(sales_order, lines=10, sublines=2, closed_ratio=0.5, description_size=40):
+    """
+    Return a single PurchaseOrder element with lines major lines (1.0, 2.0, ...) each
+    having sublines sub lines (1.0.1, 1.0.2, ...)
+    """
+    polines = []
+    closed_lines = 0
+    for major in range(1, lines + 1):
+        closed = _line_status(major, closed_ratio)
+        closed_lines += closed
+        quantity = major % 5 + 1
+        polines.append(order_line(sales_order, '{}.0'.format(major), major, quantity, closed, description_size))
+        for sub in range(1, sublines + 1):
+            polines.append(order_line(sales_order, '{}.0.{}'.format(major, sub), major, quantity, closed, description_size))
+
+    header = {
+        'ID': {'value': 'PO-{}'.format(sales_order)},
+        'BillToParty': {'Name': [{'value': 'Bill-To Customer'}]},
+        'Party': [{'Name': [{'value': 'End Customer'}]}],
+        'Status': [{'Description': {'value': 'Closed' if lines and closed_lines == lines else 'Booked'}}],
+        'SalesOrderReference': [{'ID': {'value': str(sales_order)}}],
+        'OrderDateTime': '2021-09-01T08:00:00Z',
+        'DocumentReference': [
+            {'typeCode': 'PurchaseOrder', 'ID': {'value': 'PO-{}'.format(sales_order)}},
+            {'typeCode': 'OrderName', 'ID': {'value': 'Order {}'.format(sales_order)}},
+        ],
+        'ShipToParty': {
+            'Name': [{'value': 'Ship-To Site'}],
+            'Location': [{'Address': [{
+                'AddressLine': [{'value': 'Street 1'}, {'value': 'Building 2'}],
+                'CityName': {'value': 'Berlin'},
+                'CountryCode': {'value': 'DE'},
+            }]}],
+            'Contact': [{
+                'PersonName': [{'GivenName': {'value': 'Jane Doe'}}],
+                'TelephoneCommunication': [{'typeCode': 'Phone', 'ID': [{'value': '+49 30 1234567'}]}],
+                'EMailAddressCommunication': [{'ID': [{'value': 'jane.doe@example.com'}]}],
+            }],
+        },
+        'TotalAmount': {'value': 1234.5 * lines, 'currencyCode': 'USD'},
+    }
+    return {'PurchaseOrderHeader': header, 'PurchaseOrderLine': polines}
+
+
+def order_response(sales_orders, **kwargs):
+    """
+    Return checkOrderStatus response (dict) for one or more sales orders, kwargs as for purchase_order()
+    """
+    if isinstance(sales_orders, (str, int)):
+        sales_orders = [sales_orders]
+    return {
+        'ShowPurchaseOrder': {
+            'value': {
+                'ApplicationArea': {'CreationDateTime': '2021-09-21T10:00:00Z'},
+                'DataArea': {'PurchaseOrder': [purchase_order(so, **kwargs) for so in sales_orders]},
+            }
+        }
+    }
+
+
+def serial_response(sales_order, page, pages=1, lines=10, serials_per_unit=1):
+    """
+    Return getSerialNumbers response (dict) for one page. The major lines are distributed across the pages,
+    serial line numbers are reported like the real API does (1.1, 2.1, ...)
+    """
+    serial_lines = []
+    for major in range(1, lines + 1):
+        if (major - 1) % pages != page - 1:
+            continue
+        quantity = major % 5 + 1
+        serial_lines.append({
+            'lineNumber': '{}.1'.format(major),
+            'partNumber': 'SKU-{}-{}-0'.format(major, major),
+            'quantity': quantity,
+            'shipSetNumber': str(major),
+            'serialNumbers': [
+                {'serialNumber': 'SN{}{:04d}{:03d}'.format(sales_order, major, i)}
+                for i in range(quantity * serials_per_unit)
+            ],
+        })
+    return {
+        'serialNumberResponse': {
+            'responseHeader': {
+                'result': 'SUCCESS',
+                'totalPages': pages,
+                'pageNumber': page,
+            },
+            'serialDetails': {'lines': serial_lines},
+        }
+    }
+
+
+def estimate_response(estimate_id, lines=10, description_size=40, error=None):
+    """
+    Return acquireEstimate SOAP response (XML string)
+    """
+    if error:
+        header_extra = '<Message><Description>{}</Description></Message>'.format(error)
+    else:
+        header_extra = ''
+    quote_lines = []
+    for i in range(1, lines + 1):
+        quote_lines.append(
+            '<QuoteLine><LineNumberID>{i}</LineNumberID><Item>'
+            '<ID typeCode="Item">SKU-{i}</ID><Description>{descr}</Description>'
+            '<Extension><Quantity unitCode="EA">{qty}</Quantity></Extension>'
+            '<Specification><Property>'
+            '<NameValue name="CCWLineNumber">{i}.0</NameValue><NameValue name="ServiceDuration">36</NameValue>'
+            '</Property></Specification></Item></QuoteLine>'.format(
+                i=i, qty=i % 7 + 1, descr=('Estimate line {} '.format(i) * description_size)[:description_size])
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"><soapenv:Body>'
+        '<AcknowledgeQuote xmlns="http://www.openapplications.org/oagis/10"><DataArea><Quote>'
+        '<QuoteHeader><ID typeCode="Estimate ID">{id}</ID>{extra}<Status><Reason>VALID</Reason></Status>'
+        '<Extension><ValueText name="Estimate Name">Estimate {id}</ValueText></Extension></QuoteHeader>'
+        '{lines}</Quote></DataArea></AcknowledgeQuote></soapenv:Body></soapenv:Envelope>'
+    ).format(id=estimate_id, extra=header_extra, lines=''.join(quote_lines))
+
+
+def token_response(token='mock-token', expires_in=3599):
+    return json.dumps({'access_token': token, 'token_type': 'Bearer', 'expires_in': expires_in})
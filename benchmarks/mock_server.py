@@ -0,0 +1,207 @@
+"""
+Local stand-in for the Cisco SSO token endpoint and the CCW checkOrderStatus,
+getSerialNumbers and acquireEstimate APIs, serving synthetic responses (see
+fixtures.py) with configurable latency and size.
+
+    with MockCCWServer(latency=0.05, order_lines=50) as server:
+        ccw = CCW('user', 'pass', 'id', 'secret', base_url=server.base_url, sso_url=server.sso_url)
+
+It can also be started standalone:
+
+    python -m benchmarks.mock_server --port 8080 --latency 0.1
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks import fixtures
+
+
+class MockConfig(object):
+    '''
+    Mock server settings:
+    - latency/jitter: every response is delayed by latency plus a random 0..jitter seconds
+    - order_lines/order_sublines/closed_ratio/description_size: shape of the order responses
+    - serial_pages/serials_per_unit: shape of the serial responses
+    - estimate_lines: number of lines of an estimate
+    - error_rate: ratio of API requests answered with 503 (with Retry-After: 0)
+    - serial_error_status: if set, all getSerialNumbers requests are answered with this status
+    Sales orders starting with 'missing' are answered with 500, estimate IDs starting with
+    'missing' with an error message.
+    - token_expires_in: expires_in of the token responses
+    - revoked_tokens: API requests with one of these access tokens are answered with 401
+    '''
+    def __init__(self, latency=0.0, jitter=0.0, order_lines=10, order_sublines=2, closed_ratio=0.5,
+                 description_size=40, serial_pages=1, serials_per_unit=1, estimate_lines=20,
+                 error_rate=0.0, serial_error_status=None, token_expires_in=3599, revoked_tokens=()):
+        self.latency = latency
+        self.jitter = jitter
+        self.order_lines = order_lines
+        self.order_sublines = order_sublines
+        self.closed_ratio = closed_ratio
+        self.description_size = description_size
+        self.serial_pages = serial_pages
+        self.serials_per_unit = serials_per_unit
+        self.estimate_lines = estimate_lines
+        self.error_rate = error_rate
+        self.serial_error_status = serial_error_status
+        self.token_expires_in = token_expires_in
+        self.revoked_tokens = set(revoked_tokens)
+
+
+class MockCCWHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, avoid delayed ACK stalls on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, content_type='application/json', headers=None):
+        if isinstance(body, str):
+            body = body.encode()
+        # count before replying, so the client never sees a response which is not counted yet
+        self.server.count(self.path, len(body))
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.endswith('/hello'):
+            return self._reply(200, json.dumps({'hello': 'world'}))
+        self._reply(404, json.dumps({'error': 'not found'}))
+
+    def do_POST(self):
+        config = self.server.config
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if config.latency or config.jitter:
+            time.sleep(config.latency + random.uniform(0, config.jitter))
+
+        if self.path.endswith('/token.oauth2'):
+            self.server.tokens += 1
+            return self._reply(200, fixtures.token_response('mock-token-{}'.format(self.server.tokens),
+                                                            config.token_expires_in))
+
+        authorization = self.headers.get('Authorization', '')
+        if not authorization.startswith('Bearer ') or authorization[7:] in config.revoked_tokens:
+            return self._reply(401, json.dumps({'error': 'invalid_token'}))
+        if config.error_rate and random.random() < config.error_rate:
+            return self._reply(503, json.dumps({'error': 'service unavailable'}), headers={'Retry-After': '0'})
+
+        if self.path.endswith('/checkOrderStatus'):
+            return self._check_order_status(json.loads(body))
+        if self.path.endswith('/getSerialNumbers'):
+            return self._get_serial_numbers(json.loads(body))
+        if self.path.endswith('/acquireEstimate'):
+            return self._acquire_estimate(body.decode())
+        self._reply(404, json.dumps({'error': 'not found'}))
+
+    def _check_order_status(self, query):
+        config = self.server.config
+        sales_orders = [
+            po['PurchaseOrderHeader']['SalesOrderReference'][0]['ID']['value']
+            for po in query['GetPurchaseOrder']['value']['DataArea']['PurchaseOrder']
+        ]
+        if any(so.startswith('missing') for so in sales_orders):
+            return self._reply(500, json.dumps({'error': 'sales order not found'}))
+        response = fixtures.order_response(
+            sales_orders, lines=config.order_lines, sublines=config.order_sublines,
+            closed_ratio=config.closed_ratio, description_size=config.description_size
+        )
+        self._reply(200, json.dumps(response))
+
+    def _get_serial_numbers(self, query):
+        config = self.server.config
+        if config.serial_error_status:
+            return self._reply(config.serial_error_status, json.dumps({'error': 'service unavailable'}))
+        request = query['serialNumberRequest']
+        response = fixtures.serial_response(
+            request['salesOrderNumber'], int(request['pageNumber']), pages=config.serial_pages,
+            lines=config.order_lines, serials_per_unit=config.serials_per_unit
+        )
+        self._reply(200, json.dumps(response))
+
+    def _acquire_estimate(self, query):
+        config = self.server.config
+        m = re.search(r'<ID typeCode="Estimate ID">([^<]*)</ID>', query)
+        estimate_id = m.group(1) if m else ''
+        error = 'Estimate {} not found'.format(estimate_id) if estimate_id.startswith('missing') else None
+        self._reply(200, fixtures.estimate_response(estimate_id, lines=config.estimate_lines,
+                                                    description_size=config.description_size, error=error),
+                    content_type='application/xml')
+
+
+class MockCCWServer(ThreadingHTTPServer):
+    '''
+    Threaded mock server, listening on localhost (port 0: pick a free port).
+    Counts requests and bytes sent per endpoint in self.requests/self.bytes_sent.
+    '''
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, config=None, **kwargs):
+        super().__init__((host, port), MockCCWHandler)
+        self.config = config or MockConfig(**kwargs)
+        self.tokens = 0
+        self.requests = {}
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return 'http://{}:{}/'.format(*self.server_address[:2])
+
+    @property
+    def sso_url(self):
+        return self.base_url + 'as/token.oauth2'
+
+    def count(self, path, size):
+        endpoint = path.rstrip('/').rsplit('/', 1)[-1]
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.bytes_sent += size
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock CCW API server')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--order-lines', type=int, default=10)
+    parser.add_argument('--serial-pages', type=int, default=1)
+    parser.add_argument('--estimate-lines', type=int, default=20)
+    args = parser.parse_args()
+
+    server = MockCCWServer(port=args.port, latency=args.latency, order_lines=args.order_lines,
+                           serial_pages=args.serial_pages, estimate_lines=args.estimate_lines)
+    print('Mock CCW server listening on {} (SSO URL {})'.format(server.base_url, server.sso_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
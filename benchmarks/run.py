@@ -0,0 +1,213 @@
+"""
+Offline benchmarks of the CCW client against the local mock server.
+
+Scenarios:
+- single: orders retrieved one after another (CCW.get_order_status)
+- bulk: orders retrieved by a thread pool sharing one CCW object
+- bulk-async: orders retrieved with AsyncCCW (needs aiohttp)
+- estimate: large estimates retrieved one after another (CCW.get_estimate)
+
+For each scenario orders (or estimates) per second, p50/p99 latency, the time
+spent parsing a single response and the peak (Python) memory are reported.
+Run from the repository root:
+
+    python -m benchmarks.run --orders 200 --latency 0.02 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from CCW import CCW
+from Estimate import Estimate
+from Order import Order
+from benchmarks import fixtures
+from benchmarks.mock_server import MockCCWServer
+
+CREDENTIALS = {
+    'cco_username': 'bench',
+    'cco_password': 'bench',
+    'ccw_clientid': 'bench',
+    'ccw_clientsecret': 'bench',
+}
+
+
+def percentile(values, p):
+    '''
+    Return the p-th percentile (0..100) of values (nearest rank)
+    '''
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = max(int(math.ceil(p / 100.0 * len(values))) - 1, 0)
+    return values[min(k, len(values) - 1)]
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def order_parse_time(config, repeat=5):
+    '''
+    Average time to parse a checkOrderStatus response and add the serial data, without network
+    '''
+    data = fixtures.order_response('1', lines=config.order_lines, sublines=config.order_sublines,
+                                   closed_ratio=config.closed_ratio, description_size=config.description_size)
+    serials = {}
+    for page in range(1, config.serial_pages + 1):
+        CCW._add_serial_page(fixtures.serial_response('1', page, config.serial_pages, config.order_lines), serials)
+    text = json.dumps(data)
+
+    def parse():
+        order = Order(json.loads(text), toplevel_only=False)
+        order.add_serial_data(serials)
+    return sum(timed(parse) for _ in range(repeat)) / repeat
+
+
+def estimate_parse_time(config, repeat=3):
+    '''
+    Average time to parse an acquireEstimate response, without network
+    '''
+    text = fixtures.estimate_response('1', lines=config.estimate_lines, description_size=config.description_size)
+    return sum(timed(Estimate, text) for _ in range(repeat)) / repeat
+
+
+def run_single(server, args):
+    ccw = CCW(base_url=server.base_url, sso_url=server.sso_url, **CREDENTIALS)
+    latencies = [timed(ccw.get_order_status, str(so), toplevel_only=False) for so in range(args.orders)]
+    ccw.close()
+    return latencies
+
+
+def run_bulk(server, args):
+    ccw = CCW(base_url=server.base_url, sso_url=server.sso_url, pool_maxsize=args.concurrency * 2, **CREDENTIALS)
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        latencies = list(executor.map(
+            lambda so: timed(ccw.get_order_status, str(so), toplevel_only=False), range(args.orders)
+        ))
+    ccw.close()
+    return latencies
+
+
+def run_bulk_async(server, args):
+    from AsyncCCW import AsyncCCW
+
+    async def get_order(ccw, so):
+        start = time.perf_counter()
+        await ccw.get_order_status(str(so), toplevel_only=False)
+        return time.perf_counter() - start
+
+    async def main():
+        async with AsyncCCW(base_url=server.base_url, sso_url=server.sso_url, concurrency=args.concurrency,
+                            **CREDENTIALS) as ccw:
+            return await asyncio.gather(*[get_order(ccw, so) for so in range(args.orders)])
+    return asyncio.run(main())
+
+
+def run_estimate(server, args):
+    ccw = CCW(base_url=server.base_url, sso_url=server.sso_url, **CREDENTIALS)
+    latencies = [timed(ccw.get_estimate, str(e)) for e in range(args.estimates)]
+    ccw.close()
+    return latencies
+
+
+SCENARIOS = {
+    'single': (run_single, order_parse_time),
+    'bulk': (run_bulk, order_parse_time),
+    'bulk-async': (run_bulk_async, order_parse_time),
+    'estimate': (run_estimate, estimate_parse_time),
+}
+
+
+def run_scenario(name, args):
+    run, parse_time = SCENARIOS[name]
+    server_args = dict(latency=args.latency, jitter=args.jitter, order_lines=args.order_lines,
+                       order_sublines=args.order_sublines, serial_pages=args.serial_pages,
+                       estimate_lines=args.estimate_lines)
+
+    with MockCCWServer(**server_args) as server:
+        start = time.perf_counter()
+        latencies = run(server, args)
+        elapsed = time.perf_counter() - start
+        requests = sum(server.requests.values())
+        bytes_sent = server.bytes_sent
+
+    peak = None
+    if args.memory:
+        with MockCCWServer(**server_args) as server:
+            tracemalloc.start()
+            run(server, args)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    return {
+        'scenario': name,
+        'items': len(latencies),
+        'seconds': elapsed,
+        'items_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'parse_ms': parse_time(server.config) * 1000,
+        'peak_mem_kib': peak // 1024 if peak is not None else None,
+        'requests': requests,
+        'bytes': bytes_sent,
+    }
+
+
+def print_results(results):
+    format_string = '{:12} {:>7} {:>9} {:>10} {:>10} {:>10} {:>10} {:>12} {:>9}'
+    print(format_string.format('Scenario', 'Items', 'Items/s', 'p50 ms', 'p99 ms', 'Parse ms', 'Requests', 'Peak KiB', 'MB'))
+    for r in results:
+        print(format_string.format(
+            r['scenario'], r['items'], '{:.1f}'.format(r['items_per_sec']), '{:.1f}'.format(r['p50_ms']),
+            '{:.1f}'.format(r['p99_ms']), '{:.2f}'.format(r['parse_ms']), r['requests'],
+            r['peak_mem_kib'] if r['peak_mem_kib'] is not None else '-', '{:.1f}'.format(r['bytes'] / 1e6)
+        ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the CCW client against a local mock server')
+    parser.add_argument('scenarios', nargs='*', metavar='SCENARIO',
+                        help='scenarios to run: {} (default: all)'.format(', '.join(SCENARIOS)))
+    parser.add_argument('--orders', type=int, default=100, help='number of orders per order scenario')
+    parser.add_argument('--estimates', type=int, default=10, help='number of estimates in the estimate scenario')
+    parser.add_argument('--concurrency', type=int, default=10, help='workers/requests in flight for bulk scenarios')
+    parser.add_argument('--latency', type=float, default=0.01, help='mock server latency per request (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='additional random latency (seconds)')
+    parser.add_argument('--order-lines', type=int, default=20, help='major lines per order')
+    parser.add_argument('--order-sublines', type=int, default=3, help='sub lines per major line')
+    parser.add_argument('--serial-pages', type=int, default=2, help='getSerialNumbers pages per order')
+    parser.add_argument('--estimate-lines', type=int, default=5000, help='lines per estimate')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', default=True,
+                        help='skip the (slower) peak memory measurement')
+    parser.add_argument('--json', metavar='FILE', help='write results as JSON to FILE')
+    args = parser.parse_args(argv)
+
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error('unknown scenario {}'.format(name))
+
+    results = []
+    for name in args.scenarios or list(SCENARIOS):
+        if name == 'bulk-async':
+            try:
+                import aiohttp  # noqa: F401
+            except ImportError:
+                print('Skipping bulk-async, aiohttp is not installed', file=sys.stderr)
+                continue
+        results.append(run_scenario(name, args))
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
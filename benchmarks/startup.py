@@ -0,0 +1,116 @@
+"""
+Startup time benchmark: how long it takes until the CCW modules and the
+command line scripts are ready, and which heavy dependencies each of them
+loads. Every case runs in a fresh interpreter, the minimum and median of
+several runs are reported. Run from the repository root:
+
+    python -m benchmarks.startup --repeat 10 --json startup.json
+
+The 'parse' cases show that the dependencies are only imported by the
+features needing them (e.g. pandas for dateformat='pandas' or the Export
+module, lxml/natsort for estimates).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('pandas', 'numpy', 'lxml', 'xmltodict', 'natsort', 'aiohttp', 'asyncio')
+
+# name -> python code run in a fresh interpreter
+CASES = {
+    'python': 'pass',
+    'import CCW': 'import CCW',
+    'import AsyncCCW': 'import AsyncCCW',
+    'import Export': 'import Export',
+    'parse order': (
+        'from benchmarks import fixtures; from Order import Order; '
+        'Order(fixtures.order_response("1"))'
+    ),
+    'parse order (pandas dates)': (
+        'from benchmarks import fixtures; from Order import Order; '
+        'Order(fixtures.order_response("1")).return_order_details(dateformat="pandas")'
+    ),
+    'parse estimate': (
+        'from benchmarks import fixtures; from Estimate import Estimate; '
+        'Estimate(fixtures.estimate_response("1"))'
+    ),
+}
+
+# command line scripts, started with --help (argument parsing is the last step before authentication).
+# test_api.py has no options, its startup time is the one of 'import CCW'
+SCRIPTS = ('get_order_status.py', 'get_estimate_details.py', 'bulk_order_status.py')
+
+REPORT = "; import sys; print(' '.join(m for m in {!r} if m in sys.modules))".format(HEAVY_MODULES)
+
+
+def run_case(code, repeat):
+    '''
+    Run code repeat times in a new interpreter, return (list of seconds, loaded heavy modules)
+    '''
+    times = []
+    loaded = ''
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code + REPORT], cwd=ROOT, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True)
+        times.append(time.perf_counter() - start)
+        loaded = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ''
+    return times, loaded.split()
+
+
+def run_script(script, repeat):
+    '''
+    Run script --help repeat times, return list of seconds
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script, '--help'], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summary(times, loaded=None):
+    return {
+        'min_ms': min(times) * 1000,
+        'median_ms': statistics.median(times) * 1000,
+        'modules': loaded,
+    }
+
+
+def print_results(results):
+    format_string = '{:36} {:>9} {:>10}  {}'
+    print(format_string.format('Case', 'Min ms', 'Median ms', 'Heavy modules loaded'))
+    for name, result in results.items():
+        modules = ' '.join(result['modules']) if result['modules'] is not None else '-'
+        print(format_string.format(name, '{:.1f}'.format(result['min_ms']),
+                                   '{:.1f}'.format(result['median_ms']), modules))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the startup time of the CCW modules and scripts')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per case (default: 5)')
+    parser.add_argument('--json', metavar='FILE', help='write results as JSON to FILE')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, code in CASES.items():
+        times, loaded = run_case(code, args.repeat)
+        results[name] = summary(times, loaded)
+    for script in SCRIPTS:
+        results[script + ' --help'] = summary(run_script(script, args.repeat))
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
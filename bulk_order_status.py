@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+"""
+Retrieve the status of many orders with a pool of processes, e.g. for a nightly
+reconciliation of tens of thousands of sales orders.
+
+The sales orders (read from a file or stdin) are split into shards which are put
+into a work queue directory (see WorkQueue.py). Each worker process has its own
+CCW session and processes one shard after another, writing the order lines of
+each shard to its own output file (output/shard-NNNNNN.csv) and the orders which
+could not be retrieved to output/shard-NNNNNN.errors.txt. All workers share the
+access token through the token cache file. At the end the shard outputs are
+merged into a single file.
+
+    ./bulk_order_status.py --input orders.txt --output-dir run1 --processes 8 --merge report.csv
+
+As the queue only relies on atomic renames, workers on several hosts can share a
+queue directory on a shared file system:
+
+    host1$ ./bulk_order_status.py --input orders.txt --output-dir /shared/run1 --processes 0
+    hostN$ ./bulk_order_status.py --output-dir /shared/run1 --processes 8
+    host1$ ./bulk_order_status.py --output-dir /shared/run1 --processes 0 --merge report.csv
+
+An interrupted run is resumed by running the command again without --input.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
+
+from Metrics import Metrics, NULL_METRICS
+from RateLimit import RateLimiter, CircuitOpenError
+from WorkQueue import WorkQueue
+from utils import get_params
+
+# output format -> (writer class in Export.py, suffix of the shard output files). requests, CCW and
+# Export (pandas) are only imported by the functions using them, so --help and errors are quick
+WRITERS = {
+    'csv': ('CsvWriter', '.csv'),
+    'parquet': ('ParquetWriter', '.parquet'),
+}
+
+
+def read_orders(path):
+    """
+    read sales order numbers (one per line, # starts a comment) from a file or stdin ('-'),
+    return them without duplicates
+    """
+    f = sys.stdin if path == '-' else open(path)
+    try:
+        orders = [line.split('#', 1)[0].strip() for line in f]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return list(dict.fromkeys(so for so in orders if so))
+
+
+def is_retriable(e):
+    """
+    True for errors which might go away when the request is repeated
+    """
+    import requests
+
+    if isinstance(e, requests.HTTPError):
+        return e.response is not None and e.response.status_code >= 500
+    return isinstance(e, (requests.ConnectionError, requests.Timeout, CircuitOpenError))
+
+
+def get_order(ccw, so, options):
+    """
+    retrieve an order, retrying retriable errors options['retries'] times
+    """
+    for attempt in range(options['retries'] + 1):
+        try:
+            return ccw.get_order_status(so, toplevel_only=options['toplevel_only'], add_serials=True)
+        except Exception as e:
+            if attempt == options['retries'] or not is_retriable(e):
+                raise
+            time.sleep(min(2 ** attempt, 30))
+
+
+def get_orders(ccw, sales_orders, options):
+    """
+    retrieve orders (options['batch_size'] per request), yield (so, order or exception). Orders of
+    a batch which failed with a retriable error are retried one by one
+    """
+    if options['batch_size'] <= 1:
+        for so in sales_orders:
+            try:
+                yield so, get_order(ccw, so, options)
+            except Exception as e:
+                yield so, e
+        return
+
+    batches = ccw.get_order_statuses(sales_orders, toplevel_only=options['toplevel_only'], batch_size=options['batch_size'])
+    for so, order in batches:
+        if isinstance(order, Exception) and is_retriable(order) and options['retries']:
+            try:
+                order = get_order(ccw, so, dict(options, retries=options['retries'] - 1))
+            except Exception as e:
+                order = e
+        yield so, order
+
+
+def process_shard(ccw, queue, shard, options, metrics=NULL_METRICS):
+    """
+    retrieve all orders of a shard and write the shard output files, return (orders, errors)
+    """
+    import Export
+
+    writer_name, suffix = WRITERS[options['format']]
+    errors = []
+    with getattr(Export, writer_name)(queue.output_path(shard.name, suffix)) as writer:
+        for so, order in get_orders(ccw, shard.items, options):
+            if isinstance(order, Exception):
+                errors.append((so, order))
+                continue
+            with metrics.span('export'):
+                writer.write(Export.order_details_frame([order]))
+            queue.heartbeat(shard)
+
+    errors_file = queue.output_path(shard.name, '.errors.txt')
+    if errors:
+        with open(errors_file, 'w') as f:
+            f.writelines('{}\t{}: {}\n'.format(so, type(e).__name__, str(e).replace('\n', ' ')) for so, e in errors)
+    elif os.path.exists(errors_file):
+        os.remove(errors_file)
+    return len(shard.items) - len(errors), len(errors)
+
+
+def run_worker(queue_dir, params, options):
+    """
+    worker process: process shards until the queue is empty, return dict with totals
+    (and the metrics as dict if options['profile'] is set)
+    """
+    from CCW import CCW
+
+    queue = WorkQueue(queue_dir, max_attempts=options['shard_attempts'])
+    totals = {'shards': 0, 'orders': 0, 'errors': 0, 'failed_shards': 0}
+    metrics = Metrics() if options['profile'] else NULL_METRICS
+    params = dict(params, keep_response=False, metrics=metrics)
+    if options['rate_limit']:
+        params['rate_limiter'] = RateLimiter(requests_per_second=options['rate_limit'])
+    with CCW(**params) as ccw:
+        while True:
+            shard = queue.claim()
+            if shard is None:
+                if options['profile']:
+                    totals['metrics'] = metrics.as_dict()
+                return totals
+            try:
+                orders, errors = process_shard(ccw, queue, shard, options, metrics)
+            except Exception:
+                print('Error while processing {} (pid {}):\n{}'.format(shard.name, os.getpid(), traceback.format_exc()))
+                if queue.fail(shard) == 'failed':
+                    totals['failed_shards'] += 1
+                continue
+            queue.complete(shard)
+            totals['shards'] += 1
+            totals['orders'] += orders
+            totals['errors'] += errors
+
+
+def print_progress(queue, total, start):
+    status = queue.status()
+    done = status['done'] + status['failed']
+    elapsed = time.time() - start
+    rate = done / elapsed if elapsed else 0.0
+    eta = '{:.0f}s'.format((total - done) / rate) if rate and total > done else '-'
+    print('Progress: {}/{} shards done, {} running, {} failed, {:.2f} shards/s, ETA {}'.format(
+        status['done'], total, status['running'], status['failed'], rate, eta))
+
+
+def run_workers(queue, params, options, processes, progress_interval):
+    """
+    run the worker processes until the queue is empty, printing the progress, return totals
+    and the metrics of all workers (None unless options['profile'] is set)
+    """
+    status = queue.status()
+    total = sum(status.values())
+    start = time.time()
+    totals = {'shards': 0, 'orders': 0, 'errors': 0, 'failed_shards': 0}
+    metrics = Metrics() if options['profile'] else None
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(run_worker, queue.directory, params, options) for _ in range(processes)]
+        pending = futures
+        while pending:
+            _, pending = wait(pending, timeout=progress_interval, return_when=FIRST_EXCEPTION)
+            print_progress(queue, total, start)
+        for future in futures:
+            result = future.result()
+            if metrics is not None:
+                metrics.merge(result.pop('metrics'))
+            for key, value in result.items():
+                totals[key] += value
+    return totals, metrics
+
+
+def merge_outputs(queue, fmt, path):
+    """
+    merge the output files of all completed shards (in shard order) into path, and their
+    error files into <path without extension>.errors.txt. Return number of files merged
+    """
+    _, suffix = WRITERS[fmt]
+    files = [queue.output_path(name, suffix) for name in queue.done_shards()]
+    files = [f for f in files if os.path.exists(f)]
+    if fmt == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as out:
+            for i, name in enumerate(files):
+                with open(name, newline='', encoding='utf-8') as f:
+                    header = f.readline()
+                    if i == 0:
+                        out.write(header)
+                    shutil.copyfileobj(f, out)
+    else:
+        import pyarrow.parquet as pq
+        writer = None
+        for name in files:
+            table = pq.read_table(name)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+        if writer is not None:
+            writer.close()
+
+    errors = [queue.output_path(name, '.errors.txt') for name in queue.done_shards()]
+    errors = [f for f in errors if os.path.exists(f)]
+    if errors:
+        with open(os.path.splitext(path)[0] + '.errors.txt', 'w') as out:
+            for name in errors:
+                with open(name) as f:
+                    shutil.copyfileobj(f, out)
+    return len(files)
+
+
+def process_queue(queue, args):
+    """
+    authenticate once and run the worker processes, the workers pick up the token from the token cache
+    """
+    from CCW import CCW
+
+    options = {
+        'toplevel_only': not args.collect_sublevels,
+        'format': args.format,
+        'retries': args.retries,
+        'batch_size': args.batch_size,
+        'shard_attempts': args.shard_attempts,
+        'rate_limit': args.rate_limit / args.processes if args.rate_limit else None,
+        'profile': args.profile,
+    }
+    tmpdir = None
+    params = get_params()
+    if args.token_cache:
+        params['token_cache'] = args.token_cache
+    else:
+        tmpdir = tempfile.mkdtemp(prefix='ccw-')
+        params['token_cache'] = os.path.join(tmpdir, 'token.json')
+    try:
+        CCW(**params).close()
+        totals, metrics = run_workers(queue, params, options, args.processes, args.progress)
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    print('Retrieved {orders} order(s) in {shards} shard(s), {errors} order(s) failed, '
+          '{failed_shards} shard(s) failed'.format(**totals))
+    if metrics is not None:
+        print('Breakdown across all worker processes (times add up over the processes):')
+        print(metrics.report())
+
+
+def report_status(queue, args):
+    """
+    print the queue status and merge the shard outputs if requested
+    """
+    status = queue.status()
+    if status['pending'] or status['running']:
+        print('{pending} shard(s) pending, {running} running'.format(**status))
+    if status['failed']:
+        print('{} shard(s) failed, see {}'.format(status['failed'], os.path.join(args.output_dir, 'failed')))
+    if args.merge:
+        if status['pending'] or status['running']:
+            print('Warning: not all shards are completed yet, merging the completed ones')
+        print('Merged {} shard output(s) into {}'.format(merge_outputs(queue, args.format, args.merge), args.merge))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Get the status of many orders with multiple processes')
+    parser.add_argument('--input', metavar='FILE', type=str, default=None,
+                        help="file with sales order numbers (one per line, '-' for stdin) to add to the queue")
+    parser.add_argument('--output-dir', metavar='DIR', type=str, required=True,
+                        help='work queue and output directory (can be shared by several hosts)')
+    parser.add_argument('--processes', metavar='N', type=int, default=os.cpu_count(),
+                        help='number of worker processes (default: number of CPUs, 0: only add to the queue/merge)')
+    parser.add_argument('--shard-size', metavar='N', type=int, default=200,
+                        help='sales orders per shard (default: 200)')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv',
+                        help='format of the shard output files (default: csv, parquet requires pyarrow)')
+    parser.add_argument('--merge', metavar='FILE', type=str, default=None,
+                        help='merge the outputs of all completed shards into FILE at the end')
+    parser.add_argument('--collect-sublevels', action='store_true', default=False,
+                        help='collect and report non-toplevel items')
+    parser.add_argument('--retries', metavar='N', type=int, default=2,
+                        help='retries per order after connection/server errors (default: 2)')
+    parser.add_argument('--batch-size', metavar='N', type=int, default=1,
+                        help='sales orders per checkOrderStatus request (default: 1)')
+    parser.add_argument('--shard-attempts', metavar='N', type=int, default=3,
+                        help='attempts per shard before it is moved to failed/ (default: 3)')
+    parser.add_argument('--requeue-stale', metavar='SECONDS', type=int, default=None,
+                        help='put shards back to the queue which are running without progress for SECONDS '
+                             '(e.g. after a worker was killed)')
+    parser.add_argument('--progress', metavar='SECONDS', type=float, default=10,
+                        help='progress report interval (default: 10)')
+    parser.add_argument('--token-cache', metavar='FILE', type=str, default=os.environ.get('CCW_TOKEN_CACHE'),
+                        help='token cache shared by the worker processes (default: $CCW_TOKEN_CACHE, '
+                             'or a temporary file)')
+    parser.add_argument('--rate-limit', metavar='RPS', type=float, default=None,
+                        help='send at most RPS API requests per second in total (split across the processes)')
+    parser.add_argument('--profile', action='store_true', default=False,
+                        help='print a breakdown of the time spent in API calls, parsing and export')
+    args = parser.parse_args()
+
+    if args.format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error('--format parquet requires pyarrow')
+
+    queue = WorkQueue(args.output_dir, max_attempts=args.shard_attempts)
+    if args.input:
+        orders = read_orders(args.input)
+        print('Added {} order(s) in {} shard(s) to {}'.format(
+            len(orders), queue.add(orders, shard_size=args.shard_size), args.output_dir))
+    if args.requeue_stale is not None:
+        print('Requeued {} stale shard(s)'.format(queue.requeue_stale(args.requeue_stale)))
+
+    if args.processes > 0 and queue.status()['pending']:
+        process_queue(queue, args)
+
+    report_status(queue, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Run the local HTTP lookup service (see Service.py), e.g.
+
+    ./ccw_service.py --port 8000 --cache-size 256
+    curl http://127.0.0.1:8000/orders/1234567890
+    curl -d '{"orders": ["1234567890", "1234567891"]}' http://127.0.0.1:8000/batch
+
+With --mock, the service is backed by the local mock of the CCW APIs (see
+benchmarks/mock_server.py) instead, which needs no credentials or network access.
+"""
+import argparse
+import os
+
+from CCW import CCW
+from Cache import ResponseCache, MemoryCache, DiskCache
+from RateLimit import RateLimiter
+from Service import LookupService
+from utils import get_params
+
+parser = argparse.ArgumentParser(description='Serve CCW order, serial and estimate lookups as JSON over HTTP')
+parser.add_argument('--host', type=str, default='127.0.0.1',
+                    help='address to listen on (default: 127.0.0.1)')
+parser.add_argument('--port', type=int, default=8000,
+                    help='port to listen on (default: 8000)')
+parser.add_argument('--cache-size', metavar='MB', type=int, default=256,
+                    help='size of the in-memory response cache in MB (default: 256, 0 disables the cache)')
+parser.add_argument('--cache-dir', metavar='DIR', type=str, default=None,
+                    help='cache responses in DIR instead of memory (kept across restarts)')
+parser.add_argument('--batch-size', metavar='N', type=int, default=20,
+                    help='orders per checkOrderStatus request in batch lookups (default: 20)')
+parser.add_argument('--workers', metavar='N', type=int, default=8,
+                    help='concurrent serial/estimate lookups per batch (default: 8)')
+parser.add_argument('--token-cache', metavar='FILE', type=str, default=os.environ.get('CCW_TOKEN_CACHE'),
+                    help='cache the access token in FILE (default: $CCW_TOKEN_CACHE)')
+parser.add_argument('--rate-limit', metavar='RPS', type=float, default=None,
+                    help='send at most RPS API requests per second (throttled requests are retried in any case)')
+parser.add_argument('--mock', action='store_true', default=False,
+                    help='use a local mock of the CCW APIs instead of api.cisco.com')
+parser.add_argument('--verbose', action='store_true', default=False,
+                    help='log every request')
+
+
+def get_cache(args):
+    if args.cache_dir:
+        return ResponseCache(DiskCache(args.cache_dir))
+    if args.cache_size > 0:
+        return ResponseCache(MemoryCache(max_bytes=args.cache_size * 1024 * 1024))
+    return None
+
+
+args = parser.parse_args()
+
+mock = None
+if args.mock:
+    from benchmarks.mock_server import MockCCWServer
+    mock = MockCCWServer().start()
+    params = {'cco_username': 'mock', 'cco_password': 'mock', 'ccw_clientid': 'mock', 'ccw_clientsecret': 'mock',
+              'base_url': mock.base_url, 'sso_url': mock.sso_url}
+    print('Using mock CCW API at {}'.format(mock.base_url))
+else:
+    params = get_params()
+    params['token_cache'] = args.token_cache
+
+params['rate_limiter'] = RateLimiter(requests_per_second=args.rate_limit)
+params['cache'] = get_cache(args)
+params['keep_response'] = False
+# concurrent lookups of the same order/estimate share one API call
+params['coalesce'] = True
+# enough pooled connections for the request threads
+params['pool_maxsize'] = max(10, args.workers)
+
+try:
+    with CCW(**params) as ccw:
+        service = LookupService(ccw, host=args.host, port=args.port, batch_size=args.batch_size,
+                                max_workers=args.workers, verbose=args.verbose)
+        print('Serving on {}'.format(service.url))
+        try:
+            service.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.server_close()
+finally:
+    if mock is not None:
+        mock.stop()
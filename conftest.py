@@ -0,0 +1,2 @@
+# test_api.py is a script checking the API access with real credentials, not a test module
+collect_ignore = ['test_api.py']
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Look up serial numbers in a serial index file (see SerialIndex.py), without any API call, e.g.
+
+    ./get_order_status.py 1234567890 1234567891 --serial-index serials.idx
+    ./find_serial.py FOC12345678 FOC12345679 --index serials.idx
+
+The index is written (and updated) by get_order_status.py --serial-index, or built
+from a local order store with --from-store.
+"""
+import argparse
+import os
+import sys
+
+from SerialIndex import SerialIndex
+
+parser = argparse.ArgumentParser(description='Find the sales order lines of serial numbers')
+parser.add_argument('serials', metavar='SERIAL', type=str, nargs='*',
+                    help='one or more serial numbers')
+parser.add_argument('--index', metavar='FILE', type=str, default=os.environ.get('CCW_SERIAL_INDEX', 'serials.idx'),
+                    help='serial index file (default: $CCW_SERIAL_INDEX or serials.idx)')
+parser.add_argument('--input', metavar='FILE', type=str, default=None,
+                    help='read serial numbers from FILE (one per line, - for stdin)')
+parser.add_argument('--from-store', metavar='DBFILE', type=str, default=None,
+                    help='add all orders of a local SQLite order store to the index and save it')
+parser.add_argument('--json', action='store_true', default=False,
+                    help='output JSON lines')
+
+
+def read_serials(path):
+    f = sys.stdin if path == '-' else open(path)
+    try:
+        return [line.strip() for line in f if line.strip()]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def build_from_store(index, path):
+    from OrderStore import OrderStore
+
+    with OrderStore(path) as store:
+        for so in store.sales_orders():
+            index.add_order(store.get_order(so))
+
+
+args = parser.parse_args()
+
+serials = list(args.serials)
+if args.input:
+    serials += read_serials(args.input)
+if not serials and not args.from_store:
+    parser.error('no serial numbers given')
+
+if os.path.exists(args.index):
+    index = SerialIndex.load(args.index)
+elif args.from_store:
+    index = SerialIndex()
+else:
+    print('Error: serial index {} not found'.format(args.index))
+    sys.exit(1)
+
+if args.from_store:
+    build_from_store(index, args.from_store)
+    index.save(args.index)
+    print('Saved {} serial number(s) of {} order(s) to {}'.format(len(index), len(index.sales_orders()), args.index))
+
+if args.json:
+    from utils import json_dumps
+
+missing = 0
+for serial in serials:
+    locations = index.lookup(serial)
+    if not locations:
+        missing += 1
+    if args.json:
+        print(json_dumps({'serial': serial, 'locations': [location._asdict() for location in locations]}))
+        continue
+    if not locations:
+        print('{:20}  not found'.format(serial))
+    for location in locations:
+        print('{:20}  {:12} {:8} {:20} {}'.format(serial, *location))
+
+sys.exit(1 if missing else 0)
@@ -1,25 +1,85 @@
 #!/usr/bin/env python
 import argparse
-import traceback
+import asyncio
+import os
 
 from CCW import CCW
-from utils import get_params
+from Metrics import Metrics
+from RateLimit import RateLimiter
+from utils import get_params, format_exception
 from Estimate import EstimateError
 
 parser = argparse.ArgumentParser(description='Get Estimate Details')
 parser.add_argument('estimates', metavar='ID#', nargs='+',
                     help='one or more CCW estimate IDs')
+parser.add_argument('--token-cache', metavar='FILE', type=str, default=os.environ.get('CCW_TOKEN_CACHE'),
+                    help='cache the access token in FILE to skip authentication on subsequent runs '
+                         '(default: $CCW_TOKEN_CACHE)')
+parser.add_argument('--rate-limit', metavar='RPS', type=float, default=None,
+                    help='send at most RPS API requests per second (throttled requests are retried in any case)')
+parser.add_argument('--concurrency', metavar='N', type=int, default=None,
+                    help='retrieve estimates concurrently, with at most N API requests in flight')
+parser.add_argument('--workers', metavar='N', type=int, default=None,
+                    help='retrieve estimates with N threads, showing each estimate as soon as it is retrieved')
+parser.add_argument('--profile', action='store_true', default=False,
+                    help='print a breakdown of the time spent in API calls and parsing')
+
+
+def fetch_estimates(params, estimates):
+    """
+    retrieve estimates one by one, yield (id, estimate or exception)
+    """
+    ccw = CCW(**params)
+    for estimate in estimates:
+        print('Checking for order {}'.format(estimate))
+        try:
+            yield estimate, ccw.get_estimate(estimate)
+        except Exception as e:
+            yield estimate, e
+
+
+def fetch_estimates_concurrently(params, estimates, workers):
+    """
+    retrieve estimates with a pool of threads, yield (id, estimate or exception) as they complete
+    """
+    print('Checking {} estimate(s), {} workers'.format(len(estimates), workers))
+    with CCW(**params, pool_maxsize=max(workers, 10)) as ccw:
+        yield from ccw.get_estimates(estimates, max_workers=workers)
+
+
+async def fetch_estimates_async(params, estimates, concurrency):
+    """
+    retrieve all estimates concurrently, return list of (id, estimate or exception) in the order given
+    """
+    from AsyncCCW import AsyncCCW
+
+    print('Checking {} estimate(s), concurrency {}'.format(len(estimates), concurrency))
+    async with AsyncCCW(**params, concurrency=concurrency) as ccw:
+        results = await asyncio.gather(*[ccw.get_estimate(e) for e in estimates], return_exceptions=True)
+    return list(zip(estimates, results))
+
 
 args = parser.parse_args()
 params = get_params()
-ccw = CCW(**params)
+params['token_cache'] = args.token_cache
+params['rate_limiter'] = RateLimiter(requests_per_second=args.rate_limit)
+params['metrics'] = metrics = Metrics() if args.profile else None
 
-for estimate in args.estimates:
-    try:
-        print('Checking for order {}'.format(estimate))
-        ccw.get_estimate(estimate).display_estimate_detail()
-    except EstimateError as e:
-        print('Error retrieving {}: {}'.format(estimate, str(e)))
-    except Exception as e:
-        print('Error processing {}: {}'.format(estimate, str(e)))
-        print(traceback.format_exc())
+if args.concurrency:
+    results = asyncio.run(fetch_estimates_async(params, args.estimates, args.concurrency))
+elif args.workers:
+    results = fetch_estimates_concurrently(params, args.estimates, args.workers)
+else:
+    results = fetch_estimates(params, args.estimates)
+
+for estimate, result in results:
+    if isinstance(result, EstimateError):
+        print('Error retrieving {}: {}'.format(estimate, str(result)))
+    elif isinstance(result, Exception):
+        print('Error processing {}: {}'.format(estimate, str(result)))
+        print(format_exception(result))
+    else:
+        result.display_estimate_detail()
+
+if metrics is not None:
+    print(metrics.report())
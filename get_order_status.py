@@ -1,14 +1,18 @@
 #!/usr/bin/env python
 import argparse
+import asyncio
+import os
 import sys
 import traceback
-import pandas as pd
+from itertools import islice
 
 from CCW import CCW
-from utils import get_params
+from Metrics import Metrics, NULL_METRICS
+from RateLimit import RateLimiter
+from utils import get_params, format_exception
 
 parser = argparse.ArgumentParser(description='Get Order Status')
-parser.add_argument('orders', metavar='SO#', type=str, nargs='+',
+parser.add_argument('orders', metavar='SO#', type=str, nargs='*',
                     help='one or more sales order numbers')
 parser.add_argument('--collect-sublevels', action='store_true', default=False,
                     help='collect and report non-toplevel items')
@@ -16,34 +20,221 @@ parser.add_argument('--show-serials', action='store_true', default=False,
                     help='show serial numbers')
 parser.add_argument('--excel-output', type=str, default=None,
                     help='output as excel')
+parser.add_argument('--csv', metavar='FILE', type=str, default=None,
+                    help='output as CSV')
+parser.add_argument('--parquet', metavar='FILE', type=str, default=None,
+                    help='output as Parquet (requires pyarrow)')
+parser.add_argument('--store', metavar='DBFILE', type=str, default=None,
+                    help='save retrieved orders in a local SQLite order store')
+parser.add_argument('--refresh', action='store_true', default=False,
+                    help='also re-query all orders in the store which still have open line items')
+parser.add_argument('--offline', action='store_true', default=False,
+                    help='report orders from the store only (all stored orders if none given), no API calls')
+parser.add_argument('--serial-index', metavar='FILE', type=str, default=None,
+                    help='add the serial numbers of the retrieved orders to a serial index file (see find_serial.py)')
+parser.add_argument('--no-pipelining', action='store_true', default=False,
+                    help='retrieve serial numbers only after the order details were received')
+parser.add_argument('--token-cache', metavar='FILE', type=str, default=os.environ.get('CCW_TOKEN_CACHE'),
+                    help='cache the access token in FILE to skip authentication on subsequent runs '
+                         '(default: $CCW_TOKEN_CACHE)')
+parser.add_argument('--rate-limit', metavar='RPS', type=float, default=None,
+                    help='send at most RPS API requests per second (throttled requests are retried in any case)')
+parser.add_argument('--concurrency', metavar='N', type=int, default=None,
+                    help='retrieve orders concurrently, with at most N API requests in flight')
+parser.add_argument('--batch-size', metavar='N', type=int, default=1,
+                    help='retrieve N orders per checkOrderStatus request (not with --concurrency)')
+parser.add_argument('--profile', action='store_true', default=False,
+                    help='print a breakdown of the time spent in API calls, parsing and export')
+
+
+def fetch_orders(params, orders, toplevel_only, pipelined, batch_size=1):
+    """
+    retrieve orders one by one (or batch_size orders per request), yield (so, order or exception)
+    """
+    ccw = CCW(**params, pipelined=pipelined)
+    if batch_size > 1:
+        print('Checking {} order(s), {} per request'.format(len(orders), batch_size))
+        yield from ccw.get_order_statuses(orders, toplevel_only=toplevel_only, batch_size=batch_size)
+        return
+    for so in orders:
+        print('Checking for order {}'.format(so))
+        try:
+            yield so, ccw.get_order_status(sales_order=so, toplevel_only=toplevel_only, add_serials=True)
+        except Exception as e:
+            yield so, e
+
+
+async def fetch_orders_async(params, orders, toplevel_only, pipelined, concurrency):
+    """
+    retrieve orders concurrently, async generator yielding (so, order or exception) as the orders
+    are retrieved. At most concurrency orders are in progress (and kept) at a time
+    """
+    from AsyncCCW import AsyncCCW
+
+    print('Checking {} order(s), concurrency {}'.format(len(orders), concurrency))
+    async with AsyncCCW(**params, concurrency=concurrency, pipelined=pipelined) as ccw:
+        async def get_order(so):
+            try:
+                return so, await ccw.get_order_status(sales_order=so, toplevel_only=toplevel_only, add_serials=True)
+            except Exception as e:
+                return so, e
+
+        remaining = iter(orders)
+        pending = set()
+        try:
+            while True:
+                pending.update(asyncio.ensure_future(get_order(so))
+                               for so in islice(remaining, concurrency - len(pending)))
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+async def process_async(results, process):
+    """
+    call process(so, order or exception) for every result of an async generator
+    """
+    async for so, order in results:
+        process(so, order)
+
+
+def load_orders(store, orders):
+    """
+    load orders from the local store, yield (so, order or exception)
+    """
+    for so in orders:
+        try:
+            yield so, store.get_order(so)
+        except KeyError as e:
+            yield so, e
+
+
+def report_order(order, writers, display_serials=False, metrics=NULL_METRICS):
+    """
+    display the order, or append its lines to the output files
+    """
+    if not writers:
+        order.display_order_detail(display_serials=display_serials)
+        return
+    from Export import order_details_frame
+
+    with metrics.span('export'):
+        frame = order_details_frame([order])
+        for writer in writers:
+            writer.write(frame)
+    print(f'Collected {writers[0].rows} line(s)')
+
 
 args = parser.parse_args()
-params = get_params()
-ccw = CCW(**params)
+if args.concurrency and args.batch_size > 1:
+    # the asyncio client retrieves one order per request
+    parser.error('--batch-size cannot be combined with --concurrency')
 
 toplevel_only = args.collect_sublevels is False
+pipelined = args.no_pipelining is False
+metrics = Metrics() if args.profile else NULL_METRICS
 
 if args.excel_output and not args.excel_output.endswith('.xlsx'):
     print('Error: excel output file must end with .xslx')
     sys.exit(1)
 
-excel_lines = []
-for so in args.orders:
+if (args.refresh or args.offline) and not args.store:
+    print('Error: --refresh and --offline require --store')
+    sys.exit(1)
+
+store = None
+orders = list(args.orders)
+if args.store:
+    from OrderStore import OrderStore
+    store = OrderStore(args.store)
+    if args.offline and not orders:
+        orders = store.sales_orders()
+    if args.refresh:
+        orders += [so for so in store.open_orders() if so not in orders]
+        print('Refreshing {} open order(s) from the store'.format(len(orders) - len(args.orders)))
+
+if not orders:
+    parser.error('no sales orders given')
+
+serial_index = None
+if args.serial_index:
+    from SerialIndex import SerialIndex
+    serial_index = SerialIndex.load(args.serial_index) if os.path.exists(args.serial_index) else SerialIndex()
+
+# the lines of each order are appended to the output files as soon as the order is retrieved.
+# Export (and pandas) is only imported if there are output files
+writers = []
+try:
+    if args.excel_output or args.csv or args.parquet:
+        from Export import CsvWriter, ExcelWriter, ParquetWriter
+    if args.excel_output:
+        writers.append(ExcelWriter(args.excel_output))
+    if args.csv:
+        writers.append(CsvWriter(args.csv))
+    if args.parquet:
+        writers.append(ParquetWriter(args.parquet))
+except ImportError as e:
+    print('Error: {}'.format(e))
+    sys.exit(1)
+
+if args.offline:
+    results = load_orders(store, orders)
+else:
+    params = get_params()
+    params['token_cache'] = args.token_cache
+    params['rate_limiter'] = RateLimiter(requests_per_second=args.rate_limit)
+    # the raw responses are not used here, don't keep them around for all orders
+    params['keep_response'] = False
+    params['metrics'] = metrics
+    if args.concurrency:
+        results = fetch_orders_async(params, orders, toplevel_only, pipelined, args.concurrency)
+    else:
+        results = fetch_orders(params, orders, toplevel_only, pipelined, args.batch_size)
+
+
+def process_order(so, order):
+    """
+    save and report an order as soon as it is retrieved
+    """
+    if isinstance(order, Exception):
+        print('Error while processing {}: {}'.format(so, str(order)))
+        print(format_exception(order))
+        return
     try:
-        print('Checking for order {}'.format(so))
-        order = ccw.get_order_status(sales_order=so, toplevel_only=toplevel_only, add_serials=True)
-        if not args.excel_output:
-            order.display_order_detail(display_serials=args.show_serials)
-        else:
-            excel_lines += order.return_order_details(dateformat='pandas')
-            print(f'Collected {len(excel_lines)} line(s)')
+        if store is not None and not args.offline:
+            with metrics.span('store'):
+                store.save(order)
+        if serial_index is not None:
+            serial_index.add_order(order)
+        report_order(order, writers, display_serials=args.show_serials, metrics=metrics)
     except Exception as e:
         print('Error while processing {}: {}'.format(so, str(e)))
         print(traceback.format_exc())
 
-if args.excel_output:
-    if len(excel_lines):
-        pd.DataFrame(excel_lines).to_excel(args.excel_output, index=False)
-        print(f'Created Excel file {args.excel_output}')
+
+try:
+    if hasattr(results, '__aiter__'):
+        asyncio.run(process_async(results, process_order))
     else:
-        print('No lines collected, excel file not created')
+        for so, order in results:
+            process_order(so, order)
+finally:
+    with metrics.span('export'):
+        for writer in writers:
+            writer.close()
+    if serial_index is not None:
+        serial_index.save(args.serial_index)
+
+for writer in writers:
+    if writer.rows:
+        print(f'Created {writer.path}')
+    else:
+        print(f'No lines collected, {writer.path} not created')
+
+if args.profile:
+    print(metrics.report())
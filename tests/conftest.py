@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# the modules are imported from the repository root, as in the scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_server import MockCCWServer  # noqa: E402
+
+
+@pytest.fixture
+def mock_server():
+    with MockCCWServer() as server:
+        yield server
+
+
+@pytest.fixture
+def ccw_params(mock_server):
+    return {'cco_username': 'mock', 'cco_password': 'mock', 'ccw_clientid': 'mock', 'ccw_clientsecret': 'mock',
+            'base_url': mock_server.base_url, 'sso_url': mock_server.sso_url}
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+
+from AsyncCCW import AsyncCCW
+from CCW import CCW
+
+SALES_ORDERS = ['1000000001', '1000000002', '1000000003']
+
+
+def details(order):
+    return order.return_order_details(), order.lineitems
+
+
+def run(ccw_params, coroutine_function, **kwargs):
+    async def main():
+        async with AsyncCCW(**ccw_params, **kwargs) as ccw:
+            return await coroutine_function(ccw)
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize('pipelined', [True, False])
+@pytest.mark.parametrize('toplevel_only', [True, False])
+def test_orders_equal_blocking_client(mock_server, ccw_params, pipelined, toplevel_only):
+    async def get_orders(ccw):
+        return await asyncio.gather(*[ccw.get_order_status(so, toplevel_only=toplevel_only) for so in SALES_ORDERS])
+    orders = run(ccw_params, get_orders, pipelined=pipelined)
+    with CCW(**ccw_params) as ccw:
+        expected = [ccw.get_order_status(so, toplevel_only=toplevel_only) for so in SALES_ORDERS]
+    assert [details(order) for order in orders] == [details(order) for order in expected]
+
+
+def test_estimates_equal_blocking_client(mock_server, ccw_params):
+    async def get_estimates(ccw):
+        return [result async for result in ccw.get_estimates(['1000001', 'missing1', '1000002'])]
+    results = dict(run(ccw_params, get_estimates))
+    with CCW(**ccw_params) as ccw:
+        expected = dict(ccw.get_estimates(['1000001', 'missing1', '1000002']))
+    assert sorted(results) == sorted(expected)
+    for estimate_id, estimate in results.items():
+        if estimate_id == 'missing1':
+            assert str(estimate) == str(expected[estimate_id])
+        else:
+            assert estimate.quotelines == expected[estimate_id].quotelines
+
+
+def test_order_error(mock_server, ccw_params):
+    async def get_order(ccw):
+        return await ccw.get_order_status('missing1')
+    with pytest.raises(aiohttp.ClientResponseError) as e:
+        run(ccw_params, get_order)
+    assert e.value.status == 500
+
+
+def test_concurrency_limits_requests_in_flight(mock_server, ccw_params):
+    mock_server.config.latency = 0.2
+    sales_orders = [str(1000000001 + i) for i in range(6)]
+
+    async def get_orders(ccw):
+        start = time.perf_counter()
+        await asyncio.gather(*[ccw.get_order_status(so, add_serials=False) for so in sales_orders])
+        return time.perf_counter() - start
+    # 6 requests, at most 2 at a time
+    assert 3 * 0.2 <= run(ccw_params, get_orders, concurrency=2) < 6 * 0.2
+    assert mock_server.requests['checkOrderStatus'] == 6
+    with pytest.raises(ValueError):
+        AsyncCCW(**ccw_params, concurrency=0)
@@ -0,0 +1,48 @@
+import json
+
+import requests
+
+from benchmarks import fixtures, run
+
+
+def test_percentile():
+    assert run.percentile([], 50) == 0.0
+    values = list(range(1, 101))
+    assert run.percentile(values, 50) == 50
+    assert run.percentile(values, 99) == 99
+    assert run.percentile(values, 100) == 100
+
+
+def test_serial_pages_cover_all_lines():
+    lines = []
+    for page in range(1, 4):
+        data = fixtures.serial_response('1', page, pages=3, lines=10)
+        lines += [line['lineNumber'] for line in data['serialNumberResponse']['serialDetails']['lines']]
+    assert sorted(lines, key=float) == ['{}.1'.format(i) for i in range(1, 11)]
+
+
+def test_mock_server_errors(mock_server):
+    url = mock_server.base_url + 'api/customerservice/order/v1.0/checkOrderStatus'
+    assert requests.post(url, json={}).status_code == 401
+    headers = {'Authorization': 'Bearer mock-token'}
+    mock_server.config.error_rate = 1.0
+    response = requests.post(url, json={}, headers=headers)
+    assert response.status_code == 503 and response.headers['Retry-After'] == '0'
+    mock_server.config.error_rate = 0.0
+    assert requests.post(mock_server.base_url + 'unknown', headers=headers).status_code == 404
+    assert mock_server.requests == {'checkOrderStatus': 2, 'unknown': 1}
+
+
+def test_run_scenarios(tmp_path, capsys):
+    path = tmp_path / 'results.json'
+    run.main(['--orders', '4', '--estimates', '2', '--estimate-lines', '10', '--latency', '0', '--serial-pages', '2',
+              '--no-memory', '--json', str(path)])
+    results = {r['scenario']: r for r in json.loads(path.read_text())['results']}
+    assert set(results) == set(run.SCENARIOS)
+    for name in ('single', 'bulk', 'bulk-async'):
+        assert results[name]['items'] == 4
+        # token, then one checkOrderStatus and two getSerialNumbers requests per order
+        assert results[name]['requests'] == 1 + 4 * 3
+    assert results['estimate']['items'] == 2
+    assert results['estimate']['peak_mem_kib'] is None
+    assert 'bulk-async' in capsys.readouterr().out
@@ -0,0 +1,38 @@
+import csv
+import os
+import runpy
+import sys
+
+import pytest
+
+import utils
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bulk_order_status.py')
+
+
+def run_script(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['bulk_order_status.py'] + list(args))
+    runpy.run_path(SCRIPT, run_name='__main__')
+
+
+@pytest.mark.parametrize('batch_size', ['1', '2'])
+def test_bulk_order_status(mock_server, ccw_params, monkeypatch, tmp_path, capsys, batch_size):
+    monkeypatch.setattr(utils, 'get_params', lambda: dict(ccw_params))
+    orders = ['1000000001', '1000000002', 'missing1', '1000000003', '1000000004']
+    input_file = tmp_path / 'orders.txt'
+    input_file.write_text('\n'.join(orders + ['1000000001  # duplicate']) + '\n')
+    output_dir, report = str(tmp_path / 'run'), str(tmp_path / 'report.csv')
+    run_script(monkeypatch, '--input', str(input_file), '--output-dir', output_dir, '--processes', '2',
+               '--shard-size', '2', '--retries', '0', '--batch-size', batch_size, '--merge', report)
+    out = capsys.readouterr().out
+    assert 'Retrieved 4 order(s) in 3 shard(s), 1 order(s) failed, 0 shard(s) failed' in out
+    assert 'Merged 3 shard output(s)' in out
+
+    with open(report, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    # the shard outputs are merged in shard order, with one header
+    assert list(dict.fromkeys(row['SO Number'] for row in rows)) == [so for so in orders if so != 'missing1']
+    with open(str(tmp_path / 'report.errors.txt')) as f:
+        assert f.read().startswith('missing1\tHTTPError')
+    # one token for all worker processes
+    assert mock_server.tokens == 1
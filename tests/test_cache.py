@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from CCW import CCW
+from Cache import DiskCache, MemoryCache, ResponseCache
+
+SALES_ORDER = '1000000001'
+
+
+@pytest.fixture(params=['memory', 'disk'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCache()
+    return DiskCache(str(tmp_path / 'cache'))
+
+
+def test_ttl_expiry(backend):
+    backend.set('a', 'value', 60)
+    backend.set('b', 'value', -1)
+    assert backend.get('a') == 'value'
+    assert backend.get('b') is None
+    assert len(backend) == 1
+    backend.delete('a')
+    assert backend.get('a') is None
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_bytes=10)
+    cache.set('a', 'aaaa', 60)
+    cache.set('b', 'bbbb', 60)
+    assert cache.get('a') == 'aaaa'
+    cache.set('c', 'cccc', 60)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'aaaa' and cache.get('c') == 'cccc'
+    assert cache.size == 8 and cache.evictions == 1
+    # sizes are counted in UTF-8 bytes, values larger than the cache are not stored
+    cache.set('d', 'äää', 60)
+    assert cache.size == 10 and cache.get('d') == 'äää'
+    cache.set('e', 'x' * 11, 60)
+    assert cache.get('e') is None
+    cache.clear()
+    assert cache.size == 0 and len(cache) == 0
+
+
+def test_disk_cache_evicts_oldest(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=150)
+    cache.set('a', 'a' * 40, 60)
+    cache.set('b', 'b' * 40, 60)
+    # make 'b' the least recently used entry
+    time.sleep(0.01)
+    assert cache.get('a') == 'a' * 40
+    cache.set('c', 'c' * 40, 60)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'a' * 40 and cache.get('c') == 'c' * 40
+    assert cache.evictions == 1 and cache.size <= 150
+    # a new instance picks up the existing entries
+    assert len(DiskCache(str(tmp_path))) == 2
+
+
+def test_response_cache_ttls_and_stats():
+    cache = ResponseCache(ttls={'estimate': 0})
+    cache.set('order', '1', 'open')
+    cache.set('order', '2', 'closed', 'order_closed')
+    cache.set_json('serials', '1', {'serials': []})
+    cache.set('estimate', '1', 'not cached')
+    assert cache.get('order', '1') == 'open'
+    assert cache.get_json('serials', '1') == {'serials': []}
+    assert cache.get('estimate', '1') is None
+    cache.invalidate('order', '1')
+    assert cache.get('order', '1') is None
+    stats = cache.stats
+    assert stats['order'] == {'hits': 1, 'misses': 1}
+    assert stats['total']['hits'] == 2 and stats['total']['misses'] == 2
+    assert stats['total']['hit_ratio'] == 0.5
+    assert stats['total']['entries'] == 2
+
+
+@pytest.mark.parametrize('closed_ratio,ttl', [(0.0, 60), (1.0, 3600)])
+def test_ccw_uses_cache(mock_server, ccw_params, closed_ratio, ttl):
+    mock_server.config.closed_ratio = closed_ratio
+    cache = ResponseCache(ttls={'order': 60, 'order_closed': 3600})
+    with CCW(cache=cache, **ccw_params) as ccw:
+        orders = [ccw.get_order_status(SALES_ORDER) for _ in range(2)]
+    assert orders[0].lineitems == orders[1].lineitems
+    assert mock_server.requests['checkOrderStatus'] == 1
+    assert mock_server.requests['getSerialNumbers'] == 1
+    assert cache.stats['order'] == {'hits': 1, 'misses': 1}
+    # closed orders are kept longer
+    expires_at = cache.backend._entries['order:' + SALES_ORDER][0]
+    assert ttl - 5 < expires_at - time.time() <= ttl
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+from AsyncCCW import AsyncCCW
+from CCW import CCW
+
+SALES_ORDER = '1000000001'
+
+
+def test_serial_error_is_kept_on_order(mock_server, ccw_params):
+    with CCW(**ccw_params) as ccw:
+        assert ccw.get_order_status(SALES_ORDER).serials_error is None
+        mock_server.config.serial_error_status = 503
+        for pipelined in (True, False):
+            order = ccw.get_order_status(SALES_ORDER, pipelined=pipelined)
+            assert order.serials_error is not None
+            assert not any(item['serials'] for item in order.lineitems.values())
+
+
+def test_async_serial_error_is_kept_on_order(mock_server, ccw_params):
+    mock_server.config.serial_error_status = 503
+
+    async def main():
+        async with AsyncCCW(**ccw_params) as ccw:
+            return await ccw.get_order_status(SALES_ORDER)
+    order = asyncio.run(main())
+    assert order.serials_error is not None
+    assert not any(item['serials'] for item in order.lineitems.values())
+
+
+def details(order):
+    return order.return_order_details(), order.lineitems
+
+
+@pytest.mark.parametrize('toplevel_only', [True, False])
+def test_pipelined_order_equals_sequential_order(mock_server, ccw_params, toplevel_only):
+    with CCW(**ccw_params) as ccw:
+        orders = [ccw.get_order_status(SALES_ORDER, toplevel_only=toplevel_only, pipelined=pipelined)
+                  for pipelined in (True, False)]
+    assert details(orders[0]) == details(orders[1])
+    assert any(item['serials'] for item in orders[0].lineitems.values())
+
+
+def test_pipelined_requests_overlap(mock_server, ccw_params):
+    with CCW(**ccw_params) as ccw:
+        ccw.get_token()
+        mock_server.config.latency = 0.2
+        elapsed = []
+        for pipelined in (True, False):
+            start = time.perf_counter()
+            ccw.get_order_status(SALES_ORDER, pipelined=pipelined)
+            elapsed.append(time.perf_counter() - start)
+    assert elapsed[0] < 2 * 0.2 <= elapsed[1]
+
+
+def test_pipelined_order_error(mock_server, ccw_params):
+    with CCW(**ccw_params) as ccw:
+        with pytest.raises(requests.HTTPError):
+            ccw.get_order_status('missing1', pipelined=True)
+        # no serial request without serials
+        ccw.get_order_status(SALES_ORDER, add_serials=False)
+    assert mock_server.requests['checkOrderStatus'] == 2
+    assert mock_server.requests['getSerialNumbers'] == 1
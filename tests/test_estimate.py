@@ -0,0 +1,112 @@
+import asyncio
+import os
+import runpy
+import sys
+import time
+
+import pytest
+
+import utils
+from AsyncCCW import AsyncCCW
+from benchmarks import fixtures
+from Cache import ResponseCache
+from CCW import CCW
+from Estimate import Estimate, EstimateError
+
+
+def parsed(estimate):
+    return {
+        'estimate_id': estimate.estimate_id,
+        'estimate_name': estimate.estimate_name,
+        'status': estimate.status,
+        'quotelines': [(k, dict(v)) for k, v in estimate.quotelines.items()],
+    }
+
+
+def responses():
+    yield fixtures.estimate_response('1000001', lines=1)
+    yield fixtures.estimate_response('1000002', lines=25)
+    response = fixtures.estimate_response('1000003', lines=3)
+    # a line without description, one without CCW line number and an escaped description
+    response = response.replace('<Description>Estimate line 1 ', '<Description>R&amp;D 1 ', 1)
+    response = response.replace('<Description>{}</Description>'.format(('Estimate line 2 ' * 40)[:40]), '', 1)
+    yield response.replace('<NameValue name="CCWLineNumber">3.0</NameValue>', '', 1)
+
+
+@pytest.mark.parametrize('response', list(responses()))
+def test_stream_and_tree_parsing_are_equal(response):
+    assert parsed(Estimate(response)) == parsed(Estimate(response, keep_raw=True))
+
+
+def test_stream_and_tree_parsing_raise_the_same_error():
+    response = fixtures.estimate_response('missing1', error='Estimate missing1 not found')
+    messages = []
+    for keep_raw in (False, True):
+        with pytest.raises(EstimateError) as e:
+            Estimate(response, keep_raw=keep_raw, estimate_id='missing1')
+        messages.append(str(e.value))
+    assert messages[0] == messages[1]
+
+
+def test_get_estimate_keeps_raw_response(mock_server, ccw_params):
+    with CCW(cache=ResponseCache(), **ccw_params) as ccw:
+        assert ccw.get_estimate('1000001')._estimate_response is None
+        # the second and third lookups are answered from the cache
+        estimate = ccw.get_estimate('1000001', keep_raw=True)
+        assert estimate._estimate_response['soapenv:Envelope']['soapenv:Body']['AcknowledgeQuote']
+        assert ccw.get_estimate('1000001')._estimate_response is None
+        assert [e._estimate_response is not None for _, e in ccw.get_estimates(['1000002'], keep_raw=True)] == [True]
+    assert mock_server.requests['acquireEstimate'] == 2
+    assert parsed(estimate) == parsed(Estimate(fixtures.estimate_response('1000001', lines=20)))
+
+
+def test_async_get_estimate_keeps_raw_response(mock_server, ccw_params):
+    async def main():
+        async with AsyncCCW(**ccw_params) as ccw:
+            return await ccw.get_estimate('1000001', keep_raw=True), await ccw.get_estimate('1000001')
+    raw, streamed = asyncio.run(main())
+    assert raw._estimate_response is not None
+    assert streamed._estimate_response is None
+    assert parsed(raw) == parsed(streamed)
+
+
+def test_get_estimates(mock_server, ccw_params):
+    ids = ['1000001', 'missing1', '1000002', '1000003', '1000001']
+    with CCW(**ccw_params) as ccw:
+        ccw.get_token()
+        mock_server.config.latency = 0.2
+        start = time.perf_counter()
+        results = dict(ccw.get_estimates(ids, max_workers=4))
+        elapsed = time.perf_counter() - start
+    assert elapsed < 2 * 0.2
+    assert mock_server.requests['acquireEstimate'] == 4
+    assert isinstance(results.pop('missing1'), EstimateError)
+    assert {k: v.estimate_id for k, v in results.items()} == {'1000001': '1000001', '1000002': '1000002', '1000003': '1000003'}
+
+
+def test_get_estimates_stops_early(mock_server, ccw_params):
+    with CCW(**ccw_params) as ccw:
+        for _ in ccw.get_estimates(['1000001', '1000002', '1000003', '1000004'], max_workers=1):
+            break
+    # the lookups not yet started are cancelled
+    assert mock_server.requests['acquireEstimate'] <= 2
+
+
+def test_async_get_estimates(mock_server, ccw_params):
+    async def main():
+        async with AsyncCCW(concurrency=4, **ccw_params) as ccw:
+            return [r async for r in ccw.get_estimates(['1000001', 'missing1', '1000002'])]
+    results = dict(asyncio.run(main()))
+    assert isinstance(results.pop('missing1'), EstimateError)
+    assert sorted(results) == ['1000001', '1000002']
+
+
+@pytest.mark.parametrize('mode', [[], ['--workers', '2'], ['--concurrency', '2']])
+def test_get_estimate_details(mock_server, ccw_params, monkeypatch, capsys, mode):
+    monkeypatch.setattr(utils, 'get_params', lambda: dict(ccw_params))
+    monkeypatch.setattr(sys, 'argv', ['get_estimate_details.py', '1000001', 'missing1', '1000002'] + mode)
+    runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'get_estimate_details.py'),
+                   run_name='__main__')
+    out = capsys.readouterr().out
+    assert 'Error retrieving missing1' in out
+    assert 'Estimate ID  : 1000001' in out and 'Estimate ID  : 1000002' in out
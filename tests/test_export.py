@@ -0,0 +1,98 @@
+import pandas as pd
+import pytest
+
+from benchmarks import fixtures
+from CCW import CCW
+from Export import CsvWriter, ExcelWriter, ParquetWriter, order_details_frame
+from Order import Order, HEADER_ATTRIBUTES
+
+
+def fixture_orders():
+    response = fixtures.order_response(['1000000001', '1000000002'], lines=5, sublines=2)
+    orders = []
+    for i, po in enumerate(response['ShowPurchaseOrder']['value']['DataArea']['PurchaseOrder']):
+        order = Order({'ShowPurchaseOrder': {'value': {'DataArea': {'PurchaseOrder': [po]}}}}, toplevel_only=bool(i))
+        orders.append(order)
+    serialdata = {}
+    CCW._add_serial_page(fixtures.serial_response('1000000001', 1, lines=5), serialdata)
+    orders[0].add_serial_data(serialdata)
+    assert any(item['serials'] for item in orders[0].lineitems.values())
+    return orders
+
+
+def stored_order():
+    header = dict.fromkeys(HEADER_ATTRIBUTES, '')
+    header.update(salesorder='1000000003', orderdate='invalid')
+    lineitems = {
+        '1.0': {'sku': 'SKU-1', 'description': 'one', 'quantity': 1, 'status': 'Booked', 'requesteddelivery': '',
+                'promiseddelivery': None, 'shipdate': '2021-09-20T10:00:00Z', 'serials': ['S1', 'S2'], 'shipset': '1',
+                'Extra': 'x'},
+        '2.0': {'sku': 'SKU-2', 'description': 'two', 'quantity': 2, 'status': 'Closed', 'requesteddelivery': '2021-09-10T00:00:00',
+                'promiseddelivery': '2021-09-14T06:11:16Z', 'shipdate': '', 'serials': [], 'shipset': ''},
+    }
+    return Order.from_stored(header, lineitems)
+
+
+@pytest.mark.parametrize('dateformat', ['text', 'datetime', 'pandas'])
+def test_frame_equals_order_details(dateformat):
+    orders = fixture_orders() + [stored_order(), Order.from_stored(dict.fromkeys(HEADER_ATTRIBUTES, ''), {})]
+    expected = pd.DataFrame([line for order in orders for line in order.return_order_details(dateformat=dateformat)])
+    pd.testing.assert_frame_equal(order_details_frame(orders, dateformat=dateformat), expected)
+
+
+def write_orders(writer, orders):
+    # one frame per order, the stored order's extra column is not in the first frame
+    with writer:
+        for order in orders:
+            writer.write_orders([order])
+    assert writer.rows == sum(len(order.lineitems) for order in orders)
+    return order_details_frame(orders).reindex(columns=writer.columns)
+
+
+def test_csv_writer(tmp_path):
+    path = str(tmp_path / 'orders.csv')
+    expected = write_orders(CsvWriter(path), fixture_orders() + [stored_order()])
+    assert 'Extra' not in expected.columns
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == expected.to_csv(index=False)
+
+
+def test_excel_writer(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    path = str(tmp_path / 'orders.xlsx')
+    expected = write_orders(ExcelWriter(path), fixture_orders() + [stored_order()])
+    rows = [tuple(expected.columns)] + [
+        tuple(None if pd.isna(v) or v == '' else v.to_pydatetime() if isinstance(v, pd.Timestamp) else v for v in row)
+        for row in expected.astype(object).itertuples(index=False)
+    ]
+    assert list(openpyxl.load_workbook(path).active.values) == rows
+
+
+def test_parquet_writer(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'orders.parquet')
+    # small row groups, so the frames are written in several row groups
+    expected = write_orders(ParquetWriter(path, row_group_size=10), fixture_orders() + [stored_order()])
+    pd.testing.assert_frame_equal(pd.read_parquet(path), expected)
+
+
+@pytest.mark.parametrize('writer_class, suffix', [(CsvWriter, '.csv'), (ExcelWriter, '.xlsx'), (ParquetWriter, '.parquet')])
+def test_writer_columns_are_not_fixed_by_first_order(tmp_path, writer_class, suffix):
+    pytest.importorskip({'.xlsx': 'openpyxl', '.parquet': 'pyarrow'}.get(suffix, 'pandas'))
+    # an order without lines, then one without amount and tracking columns
+    orders = [Order.from_stored(dict.fromkeys(HEADER_ATTRIBUTES, ''), {}), stored_order()] + fixture_orders()
+    path = str(tmp_path / ('orders' + suffix))
+    writer = writer_class(path)
+    write_orders(writer, orders)
+    assert {'amount', 'Tracking Number', 'Tracking URL', 'Extra'} <= set(writer.columns)
+
+    if suffix == '.csv':
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    elif suffix == '.xlsx':
+        frame = pd.read_excel(path, dtype=str).fillna('')
+    else:
+        frame = pd.read_parquet(path).astype(object).fillna('')
+    expected = [line['Tracking Number'] for order in orders for line in order.lineitems.values() if 'Tracking Number' in line]
+    assert expected and any(expected)
+    assert list(frame['Tracking Number'])[-len(expected):] == expected
+    assert list(frame['Tracking Number'])[:len(stored_order().lineitems)] == [''] * len(stored_order().lineitems)
@@ -0,0 +1,63 @@
+import json
+import pickle
+from collections.abc import Mapping
+
+from benchmarks import fixtures
+from CCW import CCW
+from Estimate import Estimate
+from LineItem import OrderLine, QuoteLine
+from Order import Order
+
+VALUES = {'sku': 'SKU-1', 'description': 'one', 'quantity': 1, 'status': 'Booked', 'serials': ['S1'], 'shipset': '1',
+          'Extra': 'x'}
+
+
+def test_line_item_behaves_like_dict():
+    line = OrderLine(VALUES)
+    assert isinstance(line, Mapping)
+    assert line == VALUES and len(line) == len(VALUES)
+    assert line['sku'] == line.sku == 'SKU-1'
+    assert line.get('shipdate', '') == '' and 'shipdate' not in line and 'Extra' in line
+    line['shipdate'] = '2021-09-20'
+    del line['Extra']
+    assert sorted(line) == sorted(set(VALUES) - {'Extra'} | {'shipdate'})
+
+
+def test_to_dict():
+    line = OrderLine(VALUES)
+    result = line.to_dict()
+    assert type(result) is dict and result == VALUES
+    # the order of the known fields, then the extra keys
+    assert list(result) == ['sku', 'description', 'quantity', 'status', 'serials', 'shipset', 'Extra']
+    assert QuoteLine(sku='SKU-1', quantity='2').to_dict() == {'sku': 'SKU-1', 'quantity': '2'}
+
+
+def test_line_items_encode_as_json_via_to_dict():
+    order = Order(fixtures.order_response(['1000000001'], lines=3), toplevel_only=False)
+    estimate = Estimate(fixtures.estimate_response('1000001', lines=3))
+    for lines in (order.lineitems, estimate.quotelines):
+        encoded = json.dumps({k: v.to_dict() for k, v in lines.items()})
+        assert json.loads(encoded) == {k: dict(v) for k, v in lines.items()}
+
+
+def test_pickle():
+    line = pickle.loads(pickle.dumps(OrderLine(VALUES)))
+    assert type(line) is OrderLine and line == VALUES
+
+
+def test_line_items_have_no_instance_dict():
+    line = OrderLine(VALUES)
+    assert not hasattr(line, '__dict__')
+    assert not hasattr(QuoteLine(sku='SKU-1'), '__dict__')
+
+
+def test_keep_response(mock_server, ccw_params):
+    response = fixtures.order_response(['1000000001'], lines=3)
+    assert Order(response).checkorder_response is response
+    assert Order(response, keep_response=False).checkorder_response is None
+    with CCW(keep_response=False, **ccw_params) as ccw:
+        orders = [ccw.get_order_status('1000000001')]
+        ccw.keep_response = True
+        orders.append(ccw.get_order_status('1000000001'))
+    assert orders[0].checkorder_response is None and orders[1].checkorder_response is not None
+    assert orders[0].lineitems == orders[1].lineitems
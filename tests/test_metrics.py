@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+from AsyncCCW import AsyncCCW
+from CCW import CCW
+from Metrics import Metrics, NULL_METRICS
+
+
+def test_spans_and_counters():
+    events = []
+    metrics = Metrics(callback=lambda *event: events.append(event))
+    with metrics.span('outer'):
+        with metrics.span('inner'):
+            pass
+    metrics.observe('inner', 0.5)
+    metrics.add('requests')
+    metrics.add('requests', 2)
+    data = metrics.as_dict()
+    assert data['spans']['outer']['count'] == 1
+    assert data['spans']['inner']['count'] == 2 and data['spans']['inner']['max'] == 0.5
+    assert data['spans']['inner']['avg'] == data['spans']['inner']['total'] / 2
+    assert data['counters'] == {'requests': 3}
+    assert [(kind, name) for kind, name, _ in events] == [
+        ('span', 'inner'), ('span', 'outer'), ('span', 'inner'), ('counter', 'requests'), ('counter', 'requests')
+    ]
+    assert json.loads(metrics.to_json()) == data
+    assert 'inner' in metrics.report() and 'requests' in metrics.report()
+    metrics.reset()
+    assert metrics.as_dict() == {'spans': {}, 'counters': {}}
+    # the null metrics record nothing
+    with NULL_METRICS.span('outer'):
+        NULL_METRICS.add('requests')
+
+
+def test_merge():
+    metrics, other = Metrics(), Metrics()
+    metrics.observe('http', 1.0)
+    metrics.add('requests')
+    other.observe('http', 3.0)
+    other.observe('parse', 0.5)
+    other.add('requests', 2)
+    metrics.merge(other.as_dict())
+    data = metrics.as_dict()
+    assert data['spans']['http'] == {'count': 2, 'total': 4.0, 'max': 3.0, 'avg': 2.0}
+    assert data['spans']['parse']['count'] == 1
+    assert data['counters'] == {'requests': 3}
+
+
+def test_to_prometheus():
+    metrics = Metrics()
+    metrics.observe('http.checkOrderStatus', 0.25)
+    metrics.add('requests.checkOrderStatus', 2)
+    lines = metrics.to_prometheus().splitlines()
+    assert 'ccw_span_seconds_count{span="http.checkOrderStatus"} 1' in lines
+    assert 'ccw_span_seconds_sum{span="http.checkOrderStatus"} 0.250000' in lines
+    assert 'ccw_span_max_seconds{span="http.checkOrderStatus"} 0.250000' in lines
+    assert '# TYPE ccw_requests_checkOrderStatus_total counter' in lines
+    assert 'ccw_requests_checkOrderStatus_total 2' in lines
+
+
+def check_client_metrics(mock_server, metrics):
+    data = metrics.as_dict()
+    for endpoint in ('token.oauth2', 'checkOrderStatus', 'getSerialNumbers'):
+        assert data['counters']['requests.' + endpoint] == mock_server.requests[endpoint]
+        assert data['spans']['http.' + endpoint]['count'] == mock_server.requests[endpoint]
+    assert data['counters']['requests'] == sum(mock_server.requests.values())
+    assert data['counters']['serial_pages'] == 2
+    assert data['counters']['token_refreshes'] == 1
+    assert data['spans']['parse.order']['count'] == 1
+
+
+def test_client_metrics(mock_server, ccw_params):
+    mock_server.config.serial_pages = 2
+    metrics = Metrics()
+    with CCW(metrics=metrics, **ccw_params) as ccw:
+        ccw.get_order_status('1000000001')
+    check_client_metrics(mock_server, metrics)
+    assert metrics.counters['bytes_received'] == mock_server.bytes_sent
+
+
+def test_async_client_metrics(mock_server, ccw_params):
+    mock_server.config.serial_pages = 2
+    metrics = Metrics()
+
+    async def main():
+        async with AsyncCCW(metrics=metrics, **ccw_params) as ccw:
+            await ccw.get_order_status('1000000001')
+    asyncio.run(main())
+    check_client_metrics(mock_server, metrics)
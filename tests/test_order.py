@@ -0,0 +1,87 @@
+import itertools
+import re
+
+import pytest
+
+from benchmarks import fixtures
+from CCW import CCW
+from Order import Order, HEADER_ATTRIBUTES
+
+# line items with duplicate (sku, quantity) pairs, within and across major lines
+LINES = [
+    ('1.0', 'SKU-A', 1),
+    ('1.1', 'SKU-B', 2),
+    ('1.2', 'SKU-B', 2),
+    ('2.0', 'SKU-A', 1),
+    ('2.0.1', 'SKU-B', 2),
+    ('11.0', 'SKU-C', '3'),
+    ('1.3', 'SKU-C', 3),
+    ('X.1', 'SKU-D', 1),
+    ('X.2', 'SKU-D', 1),
+]
+
+
+def linear_search(order, linenumber, sku, quantity):
+    # the first-match scan used before the line index
+    m = re.match(r'(\d+\.)', linenumber)
+    start_match = m.group(1) if m else ''
+    for k, v in order.lineitems.items():
+        if k.startswith(start_match) and v['sku'] == sku and str(v['quantity']) == str(quantity):
+            return k
+    return None
+
+
+def stored_order(lines):
+    lineitems = {linenumber: {'sku': sku, 'quantity': quantity, 'status': 'Booked', 'serials': [], 'shipset': ''}
+                 for linenumber, sku, quantity in lines}
+    return Order.from_stored(dict.fromkeys(HEADER_ATTRIBUTES, ''), lineitems, toplevel_only=False)
+
+
+def test_search_lineitem_matches_linear_scan():
+    order = stored_order(LINES)
+    linenumbers = ['1.1', '1.5', '2.1', '11.2', '3.1', 'X.1', '', 'nomajor']
+    skus = ['SKU-A', 'SKU-B', 'SKU-C', 'SKU-D', 'SKU-E']
+    quantities = [1, '1', 2, 3, '3', 4]
+    for linenumber, sku, quantity in itertools.product(linenumbers, skus, quantities):
+        assert order._search_lineitem(linenumber, sku, quantity) == linear_search(order, linenumber, sku, quantity), \
+            (linenumber, sku, quantity)
+
+
+def test_search_lineitem_matches_linear_scan_for_fixture_orders():
+    response = fixtures.order_response(['1000000001'], lines=12, sublines=3)
+    for toplevel_only in (True, False):
+        order = Order(response, toplevel_only=toplevel_only)
+        for linenumber, item in order.lineitems.items():
+            for query in ((linenumber, item['sku'], item['quantity']), (linenumber[:2] + '9', item['sku'], item['quantity'])):
+                assert order._search_lineitem(*query) == linear_search(order, *query)
+
+
+def test_reassigned_lineitems_are_searched():
+    order = stored_order(LINES)
+    assert order._search_lineitem('1.1', 'SKU-B', 2) == '1.1'
+    order.lineitems = stored_order([('1.7', 'SKU-B', 2)]).lineitems
+    assert order._search_lineitem('1.1', 'SKU-B', 2) == '1.7'
+
+
+@pytest.mark.parametrize('toplevel_only', [True, False])
+def test_lazy_order_equals_eager_order(toplevel_only):
+    response = fixtures.order_response('1000000001', lines=5, sublines=2, closed_ratio=1.0)
+    eager = Order(response, toplevel_only=toplevel_only)
+    lazy = Order(response, toplevel_only=toplevel_only, lazy=True)
+    # the header is available without parsing the line items
+    assert lazy.is_closed and lazy.amount == eager.amount
+    assert lazy._lineitems is None
+    assert list(lazy.iter_lineitems()) == list(eager.iter_lineitems())
+    assert lazy._lineitems is None
+    assert lazy.lineitems == eager.lineitems
+    assert list(lazy.iter_lineitems()) == list(lazy.lineitems.items())
+    assert lazy.return_order_details() == eager.return_order_details()
+
+
+def test_lazy_order_with_serials(mock_server, ccw_params):
+    with CCW(**ccw_params) as ccw:
+        eager = ccw.get_order_status('1000000001')
+        ccw.lazy_orders = True
+        lazy = ccw.get_order_status('1000000001')
+    assert lazy.lineitems == eager.lineitems
+    assert any(item['serials'] for item in lazy.lineitems.values())
@@ -0,0 +1,61 @@
+import os
+import runpy
+import sys
+
+import pytest
+
+from CCW import CCW
+from Metrics import Metrics
+
+SALES_ORDERS = ['1000000001', '1000000002', '1000000003', '1000000004', '1000000005']
+
+
+def details(order):
+    return order.return_order_details(), order.lineitems
+
+
+def single_results(ccw_params, sales_orders, **kwargs):
+    results = {}
+    with CCW(**ccw_params) as ccw:
+        for so in sales_orders:
+            try:
+                results[so] = details(ccw.get_order_status(so, **kwargs))
+            except Exception as e:
+                results[so] = type(e)
+    return results
+
+
+@pytest.mark.parametrize('pipelined', [True, False])
+@pytest.mark.parametrize('toplevel_only', [True, False])
+def test_batches_equal_single_requests(mock_server, ccw_params, pipelined, toplevel_only):
+    with CCW(pipelined=pipelined, **ccw_params) as ccw:
+        results = list(ccw.get_order_statuses(SALES_ORDERS, toplevel_only=toplevel_only, batch_size=2))
+    assert mock_server.requests['checkOrderStatus'] == 3
+    assert [so for so, _ in results] == SALES_ORDERS
+    assert {so: details(order) for so, order in results} == single_results(ccw_params, SALES_ORDERS,
+                                                                           toplevel_only=toplevel_only)
+
+
+def test_failed_batch_is_retrieved_one_by_one(mock_server, ccw_params):
+    sales_orders = ['1000000001', 'missing1', '1000000002', '1000000003']
+    metrics = Metrics()
+    with CCW(metrics=metrics, **ccw_params) as ccw:
+        results = list(ccw.get_order_statuses(sales_orders, batch_size=3))
+    # the first batch fails and is retrieved order by order, the second one is a single order
+    assert metrics.counters['batch_fallbacks'] == 1
+    assert mock_server.requests['checkOrderStatus'] == 1 + 3 + 1
+    assert [so for so, _ in results] == sales_orders
+
+    assert isinstance(results[1][1], Exception)
+    expected = single_results(ccw_params, sales_orders)
+    assert expected['missing1'] is type(results[1][1])
+    assert {so: details(order) for so, order in results if so != 'missing1'} == \
+        {so: result for so, result in expected.items() if so != 'missing1'}
+
+
+def test_batch_size_is_rejected_with_concurrency(monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['get_order_status.py', '1000000001', '--concurrency', '4', '--batch-size', '20'])
+    with pytest.raises(SystemExit) as e:
+        runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'get_order_status.py'), run_name='__main__')
+    assert e.value.code == 2
+    assert '--batch-size cannot be combined with --concurrency' in capsys.readouterr().err
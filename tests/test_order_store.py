@@ -0,0 +1,23 @@
+from CCW import CCW
+from OrderStore import OrderStore
+
+SALES_ORDER = '1000000001'
+
+
+def test_refresh_keeps_serials_if_serial_lookup_fails(tmp_path, mock_server, ccw_params):
+    mock_server.config.closed_ratio = 0
+    with CCW(**ccw_params) as ccw, OrderStore(str(tmp_path / 'orders.db')) as store:
+        order = ccw.get_order_status(SALES_ORDER)
+        store.save(order)
+        serials = {linenumber: (item['serials'], item['shipset']) for linenumber, item in order.lineitems.items()}
+        serial = next(s for s, _ in serials.values() if s)[0]
+        found = store.find_serial(serial)
+        assert found
+
+        mock_server.config.serial_error_status = 503
+        [(so, refreshed)] = store.refresh(ccw)
+        assert refreshed.serials_error is not None
+
+        assert store.find_serial(serial) == found
+        stored = store.get_order(SALES_ORDER)
+        assert {linenumber: (item['serials'], item['shipset']) for linenumber, item in stored.lineitems.items()} == serials
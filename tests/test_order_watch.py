@@ -0,0 +1,60 @@
+import functools
+import json
+import os
+import runpy
+import sys
+
+from CCW import CCW
+from OrderWatch import OrderWatcher
+
+SALES_ORDER = '1000000001'
+
+
+def watch(ccw, events):
+    watcher = OrderWatcher(ccw, callback=events.append, fields=('status', 'serials', 'shipset'))
+    watcher.add([SALES_ORDER])
+    return watcher
+
+
+def test_failed_serial_lookup_emits_no_changes(mock_server, ccw_params):
+    mock_server.config.closed_ratio = 0
+    events = []
+    with CCW(**ccw_params) as ccw:
+        watcher = watch(ccw, events)
+        order = watcher.poll_order(SALES_ORDER)
+        assert any(item['serials'] for item in order.lineitems.values())
+
+        mock_server.config.serial_error_status = 503
+        assert watcher.poll_order(SALES_ORDER).serials_error is not None
+        mock_server.config.serial_error_status = None
+        watcher.poll_order(SALES_ORDER)
+    assert events == []
+
+
+def test_serials_missing_on_first_poll_are_not_reported_as_changed(mock_server, ccw_params):
+    mock_server.config.closed_ratio = 0
+    mock_server.config.serial_error_status = 503
+    events = []
+    with CCW(**ccw_params) as ccw:
+        watcher = watch(ccw, events)
+        watcher.poll_order(SALES_ORDER)
+        mock_server.config.serial_error_status = None
+        watcher.poll_order(SALES_ORDER)
+    assert events == []
+
+
+def test_watch_script_prints_only_events(mock_server, ccw_params, monkeypatch, capsys):
+    import RateLimit
+    import utils
+    mock_server.config.closed_ratio = 0
+    mock_server.config.serial_error_status = 503
+    monkeypatch.setattr(utils, 'get_params', lambda: dict(ccw_params))
+    # retry the 503 responses without waiting
+    monkeypatch.setattr(RateLimit, 'RateLimiter', functools.partial(RateLimit.RateLimiter, backoff_base=0))
+    monkeypatch.setattr(sys, 'argv', ['watch_orders.py', SALES_ORDER, 'missing1', '--once'])
+    runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'watch_orders.py'), run_name='__main__')
+
+    out, err = capsys.readouterr()
+    events = [json.loads(line) for line in out.splitlines()]
+    assert [(event['event'], event['salesorder']) for event in events] == [('error', 'missing1')]
+    assert 'ERROR adding serial number information' in err
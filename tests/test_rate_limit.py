@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import pytest
+
+from RateLimit import RateLimiter, CircuitOpenError
+
+
+class Response(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+def limiter(**kwargs):
+    return RateLimiter(backoff_base=0, reset_timeout=0.05, **kwargs)
+
+
+def open_circuit(rate_limiter):
+    for _ in range(rate_limiter.breaker.failure_threshold):
+        rate_limiter.call(Response, 503)
+    with pytest.raises(CircuitOpenError):
+        rate_limiter.call(Response, 200)
+
+
+def test_failure_is_counted_once_per_request():
+    rate_limiter = limiter()
+    assert rate_limiter.call(Response, 503).status_code == 503
+    assert rate_limiter.stats['requests'] == rate_limiter.max_retries + 1
+    assert rate_limiter.breaker.failures == 1
+    assert rate_limiter.breaker.state == 'closed'
+
+
+def test_circuit_opens_after_failed_requests():
+    rate_limiter = limiter()
+    open_circuit(rate_limiter)
+    assert rate_limiter.breaker.failures == rate_limiter.breaker.failure_threshold
+
+
+def test_trial_request_error_does_not_keep_circuit_open():
+    rate_limiter = limiter()
+    open_circuit(rate_limiter)
+
+    def fail():
+        raise ValueError('unexpected')
+    time.sleep(0.06)
+    assert rate_limiter.breaker.state == 'half-open'
+    with pytest.raises(ValueError):
+        rate_limiter.call(fail)
+    assert not rate_limiter.breaker.trial_running
+    assert rate_limiter.call(Response, 200).status_code == 200
+    assert rate_limiter.breaker.state == 'closed'
+
+
+def test_cancelled_async_trial_request_does_not_keep_circuit_open():
+    rate_limiter = limiter()
+    open_circuit(rate_limiter)
+
+    async def send(status_code):
+        await asyncio.sleep(0.01 if status_code == 200 else 10)
+        return Response(status_code)
+
+    async def main():
+        await asyncio.sleep(0.06)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(rate_limiter.acall(send, 503), 0.01)
+        return await rate_limiter.acall(send, 200)
+    assert asyncio.run(main()).status_code == 200
+    assert rate_limiter.breaker.state == 'closed'
+
+
+def test_server_errors_count_as_failures_without_retry():
+    rate_limiter = limiter()
+    for status in (500, 501, 500, 505):
+        assert rate_limiter.call(Response, status).status_code == status
+    assert rate_limiter.stats['requests'] == 4
+    assert rate_limiter.breaker.failures == 4
+    rate_limiter.call(Response, 404)
+    assert rate_limiter.breaker.failures == 0
+    open_circuit(rate_limiter)
+
+
+def test_async_connection_errors_are_retried():
+    aiohttp = pytest.importorskip('aiohttp')
+    rate_limiter = limiter()
+    errors = [aiohttp.ServerDisconnectedError(), aiohttp.ClientConnectionError('reset')]
+
+    async def send():
+        if errors:
+            raise errors.pop(0)
+        return Response(200)
+    assert asyncio.run(rate_limiter.acall(send)).status_code == 200
+    assert rate_limiter.stats['retries'] == 2
+    assert rate_limiter.breaker.failures == 0
@@ -0,0 +1,34 @@
+from CCW import CCW
+from SerialIndex import SerialIndex, SerialLocation
+
+SALES_ORDER = '1000000001'
+
+
+def test_failed_serial_lookup_keeps_indexed_serials(mock_server, ccw_params):
+    index = SerialIndex()
+    with CCW(**ccw_params) as ccw:
+        index.add_order(ccw.get_order_status(SALES_ORDER))
+        serials = {serial: index.lookup(serial) for serial in list(index._serials)}
+        assert serials
+
+        mock_server.config.serial_error_status = 503
+        order = ccw.get_order_status(SALES_ORDER)
+        assert order.serials_error is not None
+        index.add_order(order)
+    assert {serial: index.lookup(serial) for serial in serials} == serials
+
+
+def test_save_and_load(tmp_path):
+    index = SerialIndex()
+    index._add(('A', '1.0', 'SKU-1', '1'), ['S1', 'S2'])
+    index._add(('B', '2.0', 'SKU-2', ''), ['S1', 'S3'])
+    for name in ('serials.idx', 'serials.idx.gz'):
+        index.save(str(tmp_path / name))
+        loaded = SerialIndex.load(str(tmp_path / name))
+        assert loaded.lookup('S1') == [SerialLocation('A', '1.0', 'SKU-1', '1'), SerialLocation('B', '2.0', 'SKU-2', '')]
+        assert loaded.lookup('S3') == [SerialLocation('B', '2.0', 'SKU-2', '')]
+        assert loaded.lookup('S4') == []
+
+    index.remove_order('A')
+    assert index.lookup('S1') == [SerialLocation('B', '2.0', 'SKU-2', '')]
+    assert 'S2' not in index and len(index) == 2
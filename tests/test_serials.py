@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+import pytest
+
+from AsyncCCW import AsyncCCW
+from benchmarks import fixtures
+from CCW import CCW
+
+SALES_ORDER = '1000000001'
+
+
+def merged_pages(pages, lines=10):
+    results = {}
+    for page in range(1, pages + 1):
+        CCW._add_serial_page(fixtures.serial_response(SALES_ORDER, page, pages=pages, lines=lines), results)
+    return results
+
+
+@pytest.mark.parametrize('pages', [1, 2, 5])
+def test_parallel_pages_equal_sequential_pages(mock_server, ccw_params, pages):
+    mock_server.config.serial_pages = pages
+    expected = merged_pages(pages)
+    with CCW(**ccw_params) as ccw:
+        for page_workers in (1, 4):
+            assert list(ccw.get_serials(SALES_ORDER, page_workers=page_workers).items()) == list(expected.items())
+    assert mock_server.requests['getSerialNumbers'] == 2 * pages
+
+
+def test_async_pages_equal_blocking_client(mock_server, ccw_params):
+    mock_server.config.serial_pages = 5
+
+    async def get_serials():
+        async with AsyncCCW(**ccw_params) as ccw:
+            return await ccw.get_serials(SALES_ORDER)
+    assert list(asyncio.run(get_serials()).items()) == list(merged_pages(5).items())
+
+
+def test_pages_are_fetched_in_parallel(mock_server, ccw_params):
+    mock_server.config.serial_pages = 5
+    with CCW(**ccw_params) as ccw:
+        ccw.get_token()
+        mock_server.config.latency = 0.1
+        elapsed = []
+        for page_workers in (1, 4):
+            start = time.perf_counter()
+            ccw.get_serials(SALES_ORDER, page_workers=page_workers)
+            elapsed.append(time.perf_counter() - start)
+    # first page, then the other 4 one after another or all at once
+    assert elapsed[0] >= 5 * 0.1
+    assert elapsed[1] < 4 * 0.1
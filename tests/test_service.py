@@ -0,0 +1,119 @@
+import json
+import time
+
+import pytest
+import requests
+
+from Cache import ResponseCache
+from CCW import CCW
+from Service import LookupService, RequestError, error_status, estimate_json, json_default, order_json
+from Estimate import EstimateError
+
+
+def as_json(data):
+    return json.loads(json.dumps(data, default=json_default))
+
+
+@pytest.fixture
+def ccw(ccw_params):
+    with CCW(coalesce=True, cache=ResponseCache(), **ccw_params) as ccw:
+        yield ccw
+
+
+@pytest.fixture
+def service(ccw):
+    with LookupService(ccw, port=0, max_workers=8) as service:
+        yield service
+
+
+def test_batch_serials_are_retrieved_concurrently(mock_server, service):
+    mock_server.config.latency = 0.2
+    sales_orders = [str(1000000001 + i) for i in range(8)]
+    start = time.perf_counter()
+    response = requests.post(service.url + 'batch', json={'serials': sales_orders})
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200
+    assert list(response.json()['serials']) == sales_orders
+    assert mock_server.requests['getSerialNumbers'] == 8
+    assert elapsed < 4 * 0.2
+
+
+def test_order(service, ccw):
+    response = requests.get(service.url + 'orders/1000000001')
+    assert response.status_code == 200
+    order = response.json()
+    assert order == as_json(order_json(ccw.get_order_status('1000000001')))
+    assert any(line['Serial Numers'] for line in order['lines'])
+
+    sublevels = requests.get(service.url + 'orders/1000000001', params={'sublevels': 1, 'serials': 0}).json()
+    assert len(sublevels['lines']) > len(order['lines'])
+    assert not any(line['Serial Numers'] for line in sublevels['lines'])
+
+
+def test_serials(service, ccw):
+    response = requests.get(service.url + 'orders/1000000001/serials')
+    assert response.status_code == 200
+    assert response.json() == as_json(ccw.get_serials('1000000001'))
+
+
+def test_estimate(service, ccw):
+    response = requests.get(service.url + 'estimates/1000001')
+    assert response.status_code == 200
+    assert response.json() == as_json(estimate_json(ccw.get_estimate('1000001')))
+    assert len(response.json()['lines']) == 20
+
+
+def test_batch_with_failing_ids(mock_server, service, ccw):
+    response = requests.post(service.url + 'batch', json={
+        'orders': ['1000000001', 'missing1', '1000000002'],
+        'serials': ['1000000001'],
+        'estimates': ['1000001', 'missing1'],
+    })
+    assert response.status_code == 200
+    result = response.json()
+    assert list(result['orders']) == ['1000000001', 'missing1', '1000000002']
+    assert result['orders']['1000000002'] == as_json(order_json(ccw.get_order_status('1000000002')))
+    assert '500 Server Error' in result['orders']['missing1']['error']
+    assert result['serials']['1000000001'] == as_json(ccw.get_serials('1000000001'))
+    assert result['estimates']['1000001'] == as_json(estimate_json(ccw.get_estimate('1000001')))
+    assert 'missing1' in result['estimates']['missing1']['error']
+
+
+def test_health(service, ccw):
+    requests.get(service.url + 'orders/1000000001')
+    health = requests.get(service.url + 'health').json()
+    assert health['status'] == 'ok'
+    assert health['cache']['order']['misses'] == 1
+    assert health['connections'] == as_json(ccw.connection_stats)
+
+
+ERRORS = [
+    ('GET', 'orders/missing1', None, 502),
+    ('GET', 'estimates/missing1', None, 404),
+    ('GET', 'unknown', None, 404),
+    ('GET', 'orders/1/serials/1', None, 404),
+    ('POST', 'batch', b'not json', 400),
+    ('POST', 'batch', b'[]', 400),
+    ('POST', 'batch', b'{"orders": "1000000001"}', 400),
+    ('POST', 'batch', json.dumps({'orders': list(range(1001))}).encode(), 400),
+    ('POST', 'orders/1000000001', None, 405),
+    ('DELETE', 'estimates/1000001', None, 405),
+    ('GET', 'batch', None, 405),
+]
+
+
+def test_errors(service):
+    for method, path, body, status in ERRORS:
+        response = requests.request(method, service.url + path, data=body)
+        assert (method, path, response.status_code) == (method, path, status)
+        assert 'error' in response.json()
+        if status == 405:
+            assert response.headers['Allow'] == ('POST' if method == 'GET' else 'GET')
+
+
+def test_error_status():
+    assert error_status(RequestError('invalid')) == 400
+    assert error_status(RequestError('gone', status=410)) == 410
+    assert error_status(EstimateError('not found')) == 404
+    assert error_status(requests.HTTPError('500 Server Error')) == 502
+    assert error_status(ValueError('unexpected')) == 502
@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from CCW import CCW
+from Session import ConnectionStats, PooledSession
+
+
+def test_connection_stats():
+    stats = ConnectionStats()
+    for _ in range(5):
+        stats.count_request()
+    stats.count_connection()
+    assert stats.reused == 4
+    assert stats.as_dict() == {'requests': 5, 'connections_created': 1, 'connections_reused': 4}
+
+
+def test_calls_reuse_connections(mock_server, ccw_params):
+    with CCW(**ccw_params) as ccw:
+        for so in ('1000000001', '1000000002', '1000000003'):
+            ccw.get_order_status(so, pipelined=False)
+        stats = ccw.connection_stats
+    # token, then order and serial request per order, all to the same mock server
+    assert stats['requests'] == 1 + 3 * 2 == sum(mock_server.requests.values())
+    assert stats['connections_created'] == 1
+    assert stats['connections_reused'] == 6
+
+
+def test_blocking_pool_limits_connections(mock_server):
+    mock_server.config.latency = 0.05
+    session = PooledSession(pool_maxsize=2, pool_block=True)
+    url = mock_server.base_url + 'hello'
+    with ThreadPoolExecutor(8) as executor:
+        assert all(r.ok for r in executor.map(lambda _: session.get(url), range(16)))
+    assert session.stats.requests == 16
+    assert session.stats.connections == 2
+    session.close()
+
+
+def test_default_timeout(mock_server):
+    mock_server.config.latency = 0.5
+    session = PooledSession(read_timeout=0.1)
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        session.post(mock_server.sso_url)
+    # a timeout passed to the request overrides the default
+    assert session.post(mock_server.sso_url, timeout=5).ok
+    session.close()
+
+
+def test_own_session(mock_server, ccw_params):
+    with CCW(session=requests.Session(), **ccw_params) as ccw:
+        ccw.get_order_status('1000000001')
+        assert ccw.connection_stats == {}
@@ -0,0 +1,187 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from AsyncCCW import AsyncCCW
+from CCW import CCW
+from SingleFlight import SingleFlight
+
+N = 10
+
+
+class Call(object):
+    '''
+    Function blocking until released, counting its calls
+    '''
+    def __init__(self, result='result', error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.released = threading.Event()
+
+    def __call__(self, *args):
+        self.calls += 1
+        self.released.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result, args
+
+
+def run_threads(flight, key, func, n=N):
+    # the first call is the leader, the others start while it is blocked
+    def call(*args):
+        try:
+            return flight.do(key, func, *args)
+        except Exception as e:
+            return e
+    with ThreadPoolExecutor(n) as executor:
+        futures = [executor.submit(call, i) for i in range(n)]
+        time.sleep(0.2)
+        func.released.set()
+        return [future.result() for future in futures]
+
+
+def test_threads_share_one_call():
+    func = Call()
+    results = run_threads(SingleFlight(), 'key', func)
+    assert func.calls == 1
+    assert len({result for result, _ in results}) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * (N - 1)
+
+
+def test_exception_reaches_every_thread():
+    error = ValueError('failed')
+    func = Call(error=error)
+    assert run_threads(SingleFlight(), 'key', func) == [error] * N
+    assert func.calls == 1
+
+
+def test_distinct_keys_are_not_coalesced():
+    flight = SingleFlight()
+    func = Call()
+    with ThreadPoolExecutor(2) as executor:
+        futures = [executor.submit(flight.do, key, func, key) for key in (('order', '1', True), ('order', '1', False))]
+        time.sleep(0.1)
+        func.released.set()
+        results = [future.result() for future in futures]
+    assert func.calls == 2
+    assert [shared for _, shared in results] == [False, False]
+
+
+def test_key_is_released_after_call():
+    flight = SingleFlight()
+    func = Call(error=ValueError('failed'))
+    func.released.set()
+    with pytest.raises(ValueError):
+        flight.do('key', func)
+    func.error = None
+    assert flight.do('key', func) == (('result', ()), False)
+    assert func.calls == 2
+    assert flight._calls == {}
+
+
+class AsyncCall(object):
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+        self.released = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        await self.released.wait()
+        if self.error is not None:
+            raise self.error
+        return call
+
+
+def test_tasks_share_one_call():
+    async def main():
+        flight = SingleFlight()
+        func = AsyncCall()
+        tasks = [asyncio.create_task(flight.ado('key', func)) for _ in range(N)]
+        await asyncio.sleep(0)
+        func.released.set()
+        return func, await asyncio.gather(*tasks)
+    func, results = asyncio.run(main())
+    assert func.calls == 1
+    assert results == [(1, False)] + [(1, True)] * (N - 1)
+
+
+def test_exception_reaches_every_task():
+    error = ValueError('failed')
+
+    async def main():
+        flight = SingleFlight()
+        func = AsyncCall(error=error)
+        tasks = [asyncio.create_task(flight.ado('key', func)) for _ in range(N)]
+        await asyncio.sleep(0)
+        func.released.set()
+        return func, flight, await asyncio.gather(*tasks, return_exceptions=True)
+    func, flight, results = asyncio.run(main())
+    assert func.calls == 1
+    assert results == [error] * N
+    assert flight._async_calls == {}
+
+
+def test_waiter_takes_over_cancelled_leader():
+    async def main():
+        flight = SingleFlight()
+        func = AsyncCall()
+        tasks = [asyncio.create_task(flight.ado('key', func)) for _ in range(N)]
+        await asyncio.sleep(0)
+        tasks[0].cancel()
+        # let the waiters see the cancellation, one of them calls func again
+        for _ in range(3):
+            await asyncio.sleep(0)
+        func.released.set()
+        return func, await asyncio.gather(*tasks, return_exceptions=True)
+    func, results = asyncio.run(main())
+    assert func.calls == 2
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1:] == [(2, False)] + [(2, True)] * (N - 2)
+
+
+def test_cancelled_waiter_does_not_cancel_call():
+    async def main():
+        flight = SingleFlight()
+        func = AsyncCall()
+        tasks = [asyncio.create_task(flight.ado('key', func)) for _ in range(3)]
+        await asyncio.sleep(0)
+        tasks[1].cancel()
+        await asyncio.sleep(0)
+        func.released.set()
+        return func, await asyncio.gather(*tasks, return_exceptions=True)
+    func, results = asyncio.run(main())
+    assert func.calls == 1
+    assert results[0] == (1, False)
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert results[2] == (1, True)
+
+
+def test_ccw_coalesces_order_lookups(mock_server, ccw_params):
+    mock_server.config.latency = 0.2
+    with CCW(coalesce=True, **ccw_params) as ccw:
+        with ThreadPoolExecutor(N) as executor:
+            # the same sales order as int and str, and with other arguments
+            orders = list(executor.map(ccw.get_order_status, [1000000001] * (N // 2) + ['1000000001'] * (N // 2)))
+            executor.submit(ccw.get_order_status, '1000000001', toplevel_only=False).result()
+    assert len(set(map(id, orders))) == 1
+    assert mock_server.requests['checkOrderStatus'] == 2
+
+
+def test_async_ccw_coalesces_order_lookups(mock_server, ccw_params):
+    mock_server.config.latency = 0.2
+
+    async def main():
+        async with AsyncCCW(coalesce=True, **ccw_params) as ccw:
+            orders = await asyncio.gather(*[ccw.get_order_status('1000000001') for _ in range(N)],
+                                          ccw.get_order_status('1000000001', add_serials=False))
+        return orders
+    orders = asyncio.run(main())
+    assert len(set(map(id, orders[:N]))) == 1
+    assert orders[N] is not orders[0]
+    assert mock_server.requests['checkOrderStatus'] == 2
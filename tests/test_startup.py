@@ -0,0 +1,44 @@
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks import startup
+
+# heavy modules each case may load, all others must not be imported
+EXPECTED = {
+    'python': set(),
+    'import CCW': set(),
+    'import AsyncCCW': {'aiohttp', 'asyncio'},
+    'import Export': {'pandas', 'numpy'},
+    'parse order': set(),
+    'parse order (pandas dates)': {'pandas', 'numpy'},
+    'parse estimate': {'lxml', 'natsort'},
+}
+
+HELP = '''import runpy, sys
+sys.argv = [{0!r}, '--help']
+try:
+    runpy.run_path({0!r}, run_name='__main__')
+except SystemExit:
+    pass
+'''
+
+
+def test_cases_are_checked():
+    assert set(EXPECTED) == set(startup.CASES)
+
+
+@pytest.mark.parametrize('name', list(EXPECTED))
+def test_heavy_modules_are_loaded_lazily(name):
+    _, loaded = startup.run_case(startup.CASES[name], 1)
+    assert set(loaded) == EXPECTED[name]
+
+
+@pytest.mark.parametrize('script', startup.SCRIPTS)
+def test_script_help_loads_no_heavy_modules(script):
+    result = subprocess.run([sys.executable, '-c', HELP.format(script) + startup.REPORT[2:]], cwd=startup.ROOT, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True)
+    assert 'usage:' in result.stdout
+    # asyncio is imported by the scripts for --concurrency
+    assert set(result.stdout.splitlines()[-1].split()) <= {'asyncio'}
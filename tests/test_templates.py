@@ -0,0 +1,58 @@
+import copy
+import datetime
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import utils
+from CCW import CCW, ORDER_STATUS_QUERY
+from utils import BytesTemplate, json_value, xml_value
+
+SALES_ORDER = '1000"0001\\'
+
+
+def order_query(*sales_orders):
+    query = copy.deepcopy(ORDER_STATUS_QUERY)
+    purchase_orders = query['GetPurchaseOrder']['value']['DataArea']['PurchaseOrder']
+    template = purchase_orders.pop()
+    for so in sales_orders:
+        purchase_order = copy.deepcopy(template)
+        purchase_order['PurchaseOrderHeader']['SalesOrderReference'][0]['ID']['value'] = so
+        purchase_orders.append(purchase_order)
+    return query
+
+
+def test_bytes_template():
+    template = BytesTemplate('{"a": "{a}", "ab": "{ab}", "a2": "{a}"}', a='"{a}"', ab='"{ab}"')
+    assert template.render(a=json_value('x"'), ab='1') == b'{"a": "x\\"", "ab": 1, "a2": "x\\""}'
+    assert BytesTemplate('<ID>{id}</ID>', id='{id}').render(id=xml_value('<&>')) == b'<ID>&lt;&amp;&gt;</ID>'
+
+
+def test_request_bodies_equal_encoded_queries(mock_server, ccw_params):
+    with CCW(**ccw_params) as ccw:
+        _, headers, body = ccw._order_status_request(SALES_ORDER)
+        assert headers['Content-Type'] == 'application/json'
+        assert json.loads(body) == order_query(SALES_ORDER)
+        _, _, body = ccw._order_statuses_request(['1', SALES_ORDER])
+        assert json.loads(body) == order_query('1', SALES_ORDER)
+        _, _, body = ccw._serials_request(SALES_ORDER, '2')
+        assert json.loads(body) == {'serialNumberRequest': {'salesOrderNumber': SALES_ORDER, 'pageNumber': 2}}
+        _, headers, body = ccw._estimate_request('<1 & 2>')
+    assert headers['Content-Type'] == 'application/xml'
+    root = ET.fromstring(body)
+    assert root.find('.//{http://www.openapplications.org/oagis/10}ID').text == '<1 & 2>'
+    timestamp = root.find('.//{http://docs.oasis-open.org/ebxml-msg/ebms/v3.0/ns/core/200704/}Timestamp').text
+    assert timestamp and timestamp != '{timestamp}'
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_json_helpers(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(utils, 'orjson', None)
+    data = {'a': [1, 2.5, None, True], 'b': 'ä"'}
+    assert json.loads(utils.json_dumps(data)) == data
+    assert utils.json_loads(json.dumps(data)) == utils.json_loads(json.dumps(data).encode()) == data
+    assert json.loads(utils.json_dumps({'d': datetime.date(2021, 9, 20)}, default=str)) == {'d': '2021-09-20'}
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from AsyncCCW import AsyncCCW
+from CCW import CCW
+from Metrics import Metrics
+from Token import TokenManager
+
+
+class Fetch(object):
+    '''
+    Token fetch function counting its calls
+    '''
+    def __init__(self, expires_in=3600, delay=0):
+        self.expires_in = expires_in
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {'access_token': 'token-{}'.format(self.calls), 'expires_in': self.expires_in}
+
+
+def test_refresh_margin():
+    tokens = TokenManager(refresh_margin=60)
+    assert not tokens.valid
+    tokens.set_token('a', expires_in=30)
+    assert not tokens.valid
+    tokens.set_token('a', expires_in=3600)
+    assert tokens.valid
+    # without expiry, the token is used until it is rejected
+    tokens.set_token('a')
+    assert tokens.valid
+    tokens.invalidate('a')
+    assert not tokens.valid
+
+
+def test_get_fetches_only_when_needed():
+    tokens = TokenManager(refresh_margin=60)
+    fetch = Fetch()
+    assert tokens.get(fetch) == tokens.get(fetch) == 'token-1'
+    # a token which was already replaced is not invalidated again
+    tokens.invalidate('token-0')
+    assert tokens.get(fetch) == 'token-1'
+    tokens.invalidate('token-1')
+    assert tokens.get(fetch) == 'token-2'
+    assert tokens.refresh(fetch) == 'token-3'
+    assert fetch.calls == 3
+
+
+def test_concurrent_callers_share_one_refresh():
+    tokens = TokenManager()
+    fetch = Fetch(delay=0.1)
+    with ThreadPoolExecutor(8) as executor:
+        assert set(executor.map(lambda _: tokens.get(fetch), range(8))) == {'token-1'}
+    assert fetch.calls == 1
+
+    async_fetch = Fetch()
+
+    async def fetch_coroutine():
+        await asyncio.sleep(0.05)
+        return async_fetch()
+
+    async def main():
+        tokens.invalidate('token-1')
+        return await asyncio.gather(*[tokens.aget(fetch_coroutine) for _ in range(8)])
+    assert set(asyncio.run(main())) == {'token-1'}
+    assert async_fetch.calls == 1
+
+
+def test_cache_file(tmp_path):
+    path = str(tmp_path / 'token.json')
+    tokens = TokenManager(cache_file=path, cache_id='user')
+    tokens.get(Fetch())
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+    assert TokenManager(cache_file=path, cache_id='user').token == 'token-1'
+    # a token of other credentials is not used
+    assert TokenManager(cache_file=path, cache_id='other').token is None
+    # nor one about to expire
+    TokenManager(cache_file=path, cache_id='user', refresh_margin=0).update({'access_token': 'x', 'expires_in': 30})
+    assert TokenManager(cache_file=path, cache_id='user', refresh_margin=60).token is None
+
+
+def test_cache_file_readable_by_others_is_ignored(tmp_path, capsys):
+    path = str(tmp_path / 'token.json')
+    TokenManager(cache_file=path).get(Fetch())
+    os.chmod(path, 0o644)
+    assert TokenManager(cache_file=path).token is None
+    assert 'accessible by other users' in capsys.readouterr().err
+
+
+def test_token_refreshed_by_other_process_is_used(tmp_path):
+    path = str(tmp_path / 'token.json')
+    first = TokenManager(cache_file=path)
+    first.get(Fetch())
+    second = TokenManager(cache_file=path)
+    second.invalidate('token-1')
+    second.get(lambda: {'access_token': 'new', 'expires_in': 3600})
+
+    first.invalidate('token-1')
+    fetch = Fetch()
+    assert first.get(fetch) == 'new'
+    assert fetch.calls == 0
+    with open(path) as f:
+        assert json.load(f)['access_token'] == 'new'
+
+
+def test_clients_use_token_cache(mock_server, ccw_params, tmp_path):
+    path = str(tmp_path / 'token.json')
+    with CCW(token_cache=path, **ccw_params) as ccw:
+        ccw.get_order_status('1000000001')
+
+    async def main():
+        async with AsyncCCW(token_cache=path, **ccw_params) as ccw:
+            await ccw.get_order_status('1000000001')
+    asyncio.run(main())
+    with CCW(token_cache=path, **ccw_params) as ccw:
+        ccw.get_order_status('1000000001')
+    assert mock_server.tokens == 1
+
+
+def test_rejected_token_is_refreshed_once(mock_server, ccw_params):
+    metrics = Metrics()
+    with CCW(metrics=metrics, **ccw_params) as ccw:
+        mock_server.config.revoked_tokens.add(ccw.token)
+        ccw.get_order_status('1000000001')
+        ccw.get_order_status('1000000002')
+    assert mock_server.tokens == 2
+    assert metrics.counters['retries.401'] == 2
+
+    async def main():
+        async with AsyncCCW(**ccw_params) as ccw:
+            mock_server.config.revoked_tokens.add(ccw.token)
+            return await ccw.get_order_status('1000000001')
+    assert asyncio.run(main()).salesorder == '1000000001'
+    assert mock_server.tokens == 4
+
+
+def test_token_is_refreshed_before_expiry(mock_server, ccw_params):
+    mock_server.config.token_expires_in = 61
+    with CCW(refresh_margin=60, **ccw_params) as ccw:
+        ccw.get_order_status('1000000001', add_serials=False)
+        assert mock_server.tokens == 1
+        time.sleep(1.1)
+        ccw.get_order_status('1000000001', add_serials=False)
+    assert mock_server.tokens == 2
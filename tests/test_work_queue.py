@@ -0,0 +1,43 @@
+import os
+import time
+
+from WorkQueue import WorkQueue
+
+
+def test_add_and_claim(tmp_path):
+    queue = WorkQueue(str(tmp_path), max_attempts=2)
+    assert queue.add(['1', '2', '3', '4', '5'], shard_size=2) == 3
+    # shards added later are numbered after the existing ones
+    assert queue.add(['6'], shard_size=2) == 1
+    assert queue.status() == {'pending': 4, 'running': 0, 'done': 0, 'failed': 0}
+    shard = queue.claim()
+    assert shard.name == 'shard-000001' and shard.items == ['1', '2'] and shard.attempts == 0
+    assert queue.claim().name == 'shard-000002'
+    queue.complete(shard)
+    assert queue.status() == {'pending': 2, 'running': 1, 'done': 1, 'failed': 0}
+    assert queue.done_shards() == ['shard-000001']
+    assert queue.output_path(shard.name, '.csv') == os.path.join(str(tmp_path), 'output', 'shard-000001.csv')
+
+
+def test_fail_retries_until_max_attempts(tmp_path):
+    queue = WorkQueue(str(tmp_path), max_attempts=2)
+    queue.add(['1', '2'])
+    shard = queue.claim()
+    assert queue.fail(shard) == 'pending'
+    shard = queue.claim()
+    assert shard.attempts == 1 and shard.items == ['1', '2']
+    assert queue.fail(shard) == 'failed'
+    assert queue.claim() is None
+    assert queue.status() == {'pending': 0, 'running': 0, 'done': 0, 'failed': 1}
+
+
+def test_requeue_stale(tmp_path):
+    queue = WorkQueue(str(tmp_path))
+    queue.add(['1', '2'], shard_size=1)
+    stale, alive = queue.claim(), queue.claim()
+    past = time.time() - 120
+    os.utime(stale.path, (past, past))
+    os.utime(alive.path, (past, past))
+    queue.heartbeat(alive)
+    assert queue.requeue_stale(60) == 1
+    assert queue.claim().name == stale.name
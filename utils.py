@@ -1,5 +1,15 @@
 import getpass
+import json
 import os
+import re
+import traceback
+from xml.sax.saxutils import escape
+
+# orjson is used for JSON encoding/decoding if it is installed (it is considerably faster)
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 PARAMS = {
@@ -28,3 +38,75 @@ def get_params(interactive=True):
                 value = input_func('Please enter {}: '.format(params['descr']))
         result[var] = value
     return result
+
+
+def format_exception(exc):
+    '''
+    Return the traceback of an exception object as string (like traceback.format_exc()
+    does for the exception currently handled)
+    '''
+    return ''.join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+
+
+def json_loads(data):
+    '''
+    Decode JSON from str or bytes, using orjson if available
+    '''
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj, default=None):
+    '''
+    Encode obj as JSON str, using orjson if available. default is called for objects which
+    can't be encoded otherwise (as for json.dumps)
+    '''
+    if orjson is not None:
+        return orjson.dumps(obj, default=default).decode()
+    return json.dumps(obj, default=default)
+
+
+def json_value(value):
+    '''
+    Return value encoded as JSON string literal (bytes), for use in a BytesTemplate
+    '''
+    return json.dumps(str(value)).encode()
+
+
+def xml_value(value):
+    '''
+    Return value XML escaped (bytes), for use in a BytesTemplate
+    '''
+    return escape(str(value)).encode()
+
+
+class BytesTemplate(object):
+    '''
+    Request body which is encoded once, only the variable fields are substituted per request.
+    text contains a marker string for each field, passed as field name=marker, e.g.
+
+        t = BytesTemplate('{"salesOrderNumber": "{so}"}', so='"{so}"')
+        t.render(so=json_value('123'))      # b'{"salesOrderNumber": "123"}'
+
+    render() takes the already encoded/escaped field values (bytes or str)
+    '''
+    def __init__(self, text, **markers):
+        names = {marker: name for name, marker in markers.items()}
+        pattern = re.compile('|'.join(re.escape(marker) for marker in sorted(names, key=len, reverse=True)))
+        self._literals = []
+        self._names = []
+        pos = 0
+        for m in pattern.finditer(text):
+            self._literals.append(text[pos:m.start()].encode())
+            self._names.append(names[m.group()])
+            pos = m.end()
+        self._literals.append(text[pos:].encode())
+
+    def render(self, **values):
+        parts = [self._literals[0]]
+        for name, literal in zip(self._names, self._literals[1:]):
+            value = values[name]
+            parts.append(value if isinstance(value, bytes) else value.encode())
+            parts.append(literal)
+        return b''.join(parts)
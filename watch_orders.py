@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Watch orders for changes of status, ship date, tracking number and serials and
+print one JSON line per change (see OrderWatch.py), e.g.
+
+    ./watch_orders.py 1234567890 1234567891 --output events.jsonl
+    ./watch_orders.py --store orders.db     # all open orders in the store
+
+Orders with a promised delivery date within two days are polled every
+--min-interval seconds, those within two weeks every --interval seconds and
+the others every --max-interval seconds. The script ends when all orders are
+closed (or after one round with --once).
+"""
+import argparse
+import os
+import sys
+
+from CCW import CCW
+from OrderWatch import OrderWatcher
+from RateLimit import RateLimiter
+from utils import get_params, json_dumps
+
+parser = argparse.ArgumentParser(description='Watch orders for changes')
+parser.add_argument('orders', metavar='SO#', type=str, nargs='*',
+                    help='one or more sales order numbers')
+parser.add_argument('--input', metavar='FILE', type=str, default=None,
+                    help='file with sales order numbers to watch (one per line)')
+parser.add_argument('--store', metavar='DBFILE', type=str, default=None,
+                    help='compare with and save to a local SQLite order store (all its open orders are '
+                         'watched if no orders are given)')
+parser.add_argument('--output', metavar='FILE', type=str, default=None,
+                    help='append the events to FILE instead of printing them')
+parser.add_argument('--interval', metavar='SECONDS', type=float, default=900,
+                    help='poll interval of orders due within two weeks or without delivery date (default: 900)')
+parser.add_argument('--min-interval', metavar='SECONDS', type=float, default=300,
+                    help='poll interval of orders due within two days or overdue (default: 300)')
+parser.add_argument('--max-interval', metavar='SECONDS', type=float, default=4 * 3600,
+                    help='poll interval of orders due later (default: 14400)')
+parser.add_argument('--once', action='store_true', default=False,
+                    help='poll every order once and exit (e.g. from cron together with --store)')
+parser.add_argument('--collect-sublevels', action='store_true', default=False,
+                    help='also watch non-toplevel items')
+parser.add_argument('--token-cache', metavar='FILE', type=str, default=os.environ.get('CCW_TOKEN_CACHE'),
+                    help='cache the access token in FILE to skip authentication on subsequent runs '
+                         '(default: $CCW_TOKEN_CACHE)')
+parser.add_argument('--rate-limit', metavar='RPS', type=float, default=None,
+                    help='send at most RPS API requests per second (throttled requests are retried in any case)')
+
+
+def read_orders(path):
+    """
+    read sales order numbers (one per line, # starts a comment) from a file
+    """
+    with open(path) as f:
+        return [so for so in (line.split('#', 1)[0].strip() for line in f) if so]
+
+
+def event_printer(f):
+    """
+    return callback writing each event as JSON line to f
+    """
+    def print_event(event):
+        f.write(json_dumps(event) + '\n')
+        f.flush()
+    return print_event
+
+
+args = parser.parse_args()
+
+store = None
+orders = list(args.orders)
+if args.input:
+    orders += read_orders(args.input)
+if args.store:
+    from OrderStore import OrderStore
+    store = OrderStore(args.store)
+    if not orders:
+        orders = store.open_orders()
+if not orders:
+    parser.error('no sales orders given')
+
+output = open(args.output, 'a', encoding='utf-8') if args.output else sys.stdout
+params = get_params()
+params['token_cache'] = args.token_cache
+params['rate_limiter'] = RateLimiter(requests_per_second=args.rate_limit)
+params['keep_response'] = False
+
+try:
+    with CCW(**params) as ccw:
+        watcher = OrderWatcher(ccw, event_printer(output), interval=args.interval, min_interval=args.min_interval,
+                               max_interval=args.max_interval, toplevel_only=not args.collect_sublevels, store=store)
+        watcher.add(dict.fromkeys(orders))
+        print('Watching {} order(s)'.format(len(watcher)), file=sys.stderr)
+        if args.once:
+            watcher.poll()
+        else:
+            watcher.run()
+except KeyboardInterrupt:
+    pass
+finally:
+    if output is not sys.stdout:
+        output.close()
+    if store is not None:
+        store.close()